@@ -1,19 +1,25 @@
 import os
 import yaml
-import cohere
 from langchain_community.vectorstores.faiss import FAISS
-from langchain_cohere import CohereEmbeddings
-from dotenv import load_dotenv
-from typing import List, Dict, Optional
+from embeddings import check_store, get_embeddings
+import chunk_store
+from llm import get_cohere_client
+import threading
+import time
+from typing import Callable, List, Dict, Optional, Tuple
 
-# Load environment variables from .env file (optional)
-load_dotenv()
+import numpy as np
+from langchain_core.documents import Document
+
+import chat_budget
+import coalescer
+from chunker import section_filter
+from retrieval import chunk_matrix, estimate_tokens, load_query_cache, score_matrix
+from tender_schema import SECTION_KEYWORDS
+
+# A topic chat only searches its own sections if at least this many chunks match
+MIN_SCOPED_CHUNKS = 3
 
-# Initialize Cohere Client
-COHERE_API_KEY = os.getenv('COHERE_API_KEY')  # Ensure this environment variable is set
-if not COHERE_API_KEY:
-    raise ValueError("COHERE_API_KEY environment variable not set.")
-cohere_client = cohere.Client(COHERE_API_KEY)
 
 # Load the YAML structured data
 def load_yaml(yaml_path: str) -> Dict:
@@ -27,16 +33,87 @@ def load_yaml(yaml_path: str) -> Dict:
 def load_vector_store(save_path: str, embedding_model: str) -> FAISS:
     if not os.path.exists(save_path):
         raise FileNotFoundError(f"Vector store not found at path: {save_path}")
-    embedding = CohereEmbeddings(model=embedding_model)
-    # Removed allow_dangerous_deserialization=True for security reasons
-    db = FAISS.load_local(save_path, embeddings=embedding, allow_dangerous_deserialization=True)
-    return db
+    check_store(save_path, embedding_model)
+    embedding = get_embeddings(embedding_model)
+    return chunk_store.load(save_path, embedding)
+
+# Loaded vector stores keyed by (path, model), together with the index mtime they were read at
+_vector_store_cache: Dict[Tuple[str, str], Tuple[float, FAISS]] = {}
+_vector_store_lock = threading.Lock()
+
+def get_vector_store(save_path: str, embedding_model: str) -> FAISS:
+    """
+    Return a cached vector store, reloading it only when the index on disk has changed.
+    """
+    if not chunk_store.index_exists(save_path):
+        raise FileNotFoundError(f"Vector store not found at path: {save_path}")
+    mtime = chunk_store.index_mtime(save_path)
+    key = (save_path, embedding_model)
+    with _vector_store_lock:
+        cached = _vector_store_cache.get(key)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        db = load_vector_store(save_path, embedding_model)
+        _vector_store_cache[key] = (mtime, db)
+        return db
+
+def evict_vector_store(save_path: str) -> int:
+    """
+    Drop the cached vector stores of ``save_path`` (e.g. its tender was deleted). Returns
+    the approximate memory they held: vectors plus chunk texts, in bytes.
+    """
+    with _vector_store_lock:
+        evicted = [_vector_store_cache.pop(key)[1] for key in list(_vector_store_cache) if key[0] == save_path]
+    freed = 0
+    for db in evicted:
+        freed += db.index.ntotal * db.index.d * 4
+        freed += sum(len(db.docstore.search(docstore_id).page_content.encode("utf-8"))
+                     for docstore_id in db.index_to_docstore_id.values())
+    return freed
+
+def build_scope(vectors: np.ndarray, documents: List[Document], section_filter: Callable[[Dict], bool]):
+    """The rows of a chunk matrix that belong to the filtered sections, or None to search everything."""
+    keep = [i for i, doc in enumerate(documents) if section_filter(doc.metadata)]
+    # Too few matching sections (or an index without section metadata): search everything
+    if len(keep) < MIN_SCOPED_CHUNKS:
+        return None
+    return vectors[keep], [documents[i] for i in keep]
 
 class Conversation:
-    def __init__(self, topic: str, initial_context: str, db: FAISS):
+    def __init__(self, topic: str, initial_context: str, db: FAISS,
+                 section_filter: Optional[Callable[[Dict], bool]] = None,
+                 scope: Optional[Tuple[np.ndarray, List[Document]]] = None):
         self.topic = topic
         self.context: List[str] = [f"Topic: {topic}", f"Initial Context: {initial_context}"]
         self.db = db
+        # Chunk matrix restricted to the topic's sections, or None to search the whole index
+        self.scope = scope if scope is not None else self._build_scope(section_filter)
+
+    def _build_scope(self, section_filter: Optional[Callable[[Dict], bool]]):
+        if section_filter is None:
+            return None
+        vectors, documents = chunk_matrix(self.db)
+        return build_scope(vectors, documents, section_filter)
+
+    def search(self, query: str, k: int = 5) -> List[Document]:
+        # Embedding and index search are coalesced with concurrent chat turns
+        if self.scope is None:
+            return coalescer.similarity_search(self.db, query, k=k)
+        vectors, documents = self.scope
+        query_vector = coalescer.embed_query(self.db.embedding_function, query)
+        scores = score_matrix(np.asarray([query_vector], dtype=np.float32), vectors)[0]
+        top = np.argsort(-scores)[:k]
+        return [documents[i] for i in top]
+
+    def rerank(self, query: str, documents: List[Document], k: int) -> List[Document]:
+        """Order retrieved candidates with the rerank model and keep the best ``k``."""
+        try:
+            response = get_cohere_client().rerank(model=chat_budget.RERANK_MODEL, query=query,
+                                                  documents=[doc.page_content for doc in documents], top_n=k)
+        except Exception as e:
+            print(f"Error reranking, keeping the retrieval order: {e}")
+            return documents[:k]
+        return [documents[result.index] for result in response.results]
 
     def add_to_context(self, message: str):
         self.context.append(message)
@@ -44,29 +121,46 @@ class Conversation:
         if len(self.context) > 20:
             self.context = self.context[-20:]
 
-    def get_full_context(self) -> str:
-        return "\n".join(self.context)
+    def get_full_context(self, last: Optional[int] = None) -> str:
+        return "\n".join(self.context[-last:] if last else self.context)
 
-    def generate_response(self, user_query: str) -> Dict:
+    def generate_response(self, user_query: str, deadline_ms: Optional[float] = None) -> Dict:
         """
         Generate a response based on the user's query and retrieve reference lines from the vector database.
         Returns a structured response containing the AI's response and reference lines.
+
+        With ``deadline_ms``, retrieval depth, conversation context, reranking and answer
+        length are reduced as needed to fit the deadline (see chat_budget), and the
+        response carries a "budget" entry listing the degradations applied.
         """
+        started = time.perf_counter()
+        estimator = chat_budget.estimator
+
         # Add user query to context
         self.add_to_context(f"User: {user_query}")
+        plan, estimated_ms = chat_budget.plan_turn(deadline_ms, self.context)
 
         # Retrieve relevant documents based on the user query
         search_query = user_query  # Only use the latest user query for retrieval
-        results = self.db.similarity_search(search_query, k=5)
-        retrieved_texts = [doc.page_content for doc in results]
+        stage_started = time.perf_counter()
+        if plan["rerank"]:
+            candidates = self.search(search_query, k=plan["k"] * chat_budget.RERANK_FANOUT)
+            estimator.observe("retrieve_ms", (time.perf_counter() - stage_started) * 1000)
+            stage_started = time.perf_counter()
+            results = self.rerank(search_query, candidates, plan["k"])
+            estimator.observe("rerank_ms", (time.perf_counter() - stage_started) * 1000)
+        else:
+            results = self.search(search_query, k=plan["k"])
+            estimator.observe("retrieve_ms", (time.perf_counter() - stage_started) * 1000)
+        for doc in results:
+            estimator.observe("chunk_tokens", estimate_tokens(doc.page_content))
+        retrieved_texts = [f"[{idx + 1}] {doc.page_content}" for idx, doc in enumerate(results)]
 
-        # Assign page numbers based on the order of retrieved documents
-        # This assumes that the first result is Page 1, second is Page 2, etc.
+        # Cite the page span and section stored with each chunk
         references = []
         for idx, doc in enumerate(results):
-            page_number = idx + 1
             snippet = self.extract_snippet(doc.page_content)
-            references.append(f"Page {page_number}: {snippet}")
+            references.append(f"[{idx + 1}] {self.format_location(doc, idx)}: {snippet}")
 
         # Format retrieved texts with separation
         formatted_retrieved_texts = '\n---\n'.join(retrieved_texts)
@@ -86,21 +180,30 @@ class Conversation:
 {formatted_retrieved_texts}
 
 ### Conversation Context:
-{self.get_full_context()}
+{self.get_full_context(plan["context_messages"])}
 
 ### Response:
 """
 
+        prompt_tokens = estimate_tokens(prompt)
+        if deadline_ms is not None:
+            # Retrieval may have taken longer than planned; the answer length absorbs it
+            remaining_ms = deadline_ms - (time.perf_counter() - started) * 1000
+            plan["max_tokens"] = chat_budget.fit_max_tokens(plan["max_tokens"], remaining_ms, prompt_tokens)
+
         try:
             # Generate the response using the Cohere API
-            response = cohere_client.generate(
+            stage_started = time.perf_counter()
+            response = get_cohere_client().generate(
                 model='command-xlarge-nightly',  # Ensure this model is correct and accessible
                 prompt=prompt,
-                max_tokens=500,
+                max_tokens=plan["max_tokens"],
                 temperature=0.3,
                 stop_sequences=["\nUser:", "\nAI:"]
             )
             ai_response = response.generations[0].text.strip()
+            estimator.observe_generation((time.perf_counter() - stage_started) * 1000, prompt_tokens,
+                                         estimate_tokens(ai_response))
 
             # Add AI response to context
             self.add_to_context(f"AI: {ai_response}")
@@ -111,15 +214,40 @@ class Conversation:
                 "references": formatted_references  # Formatted references as a string
             }
 
-            return response_data
-
         except Exception as e:
             print(f"Error generating response: {e}")
-            return {
+            response_data = {
                 "ai_response": "I'm sorry, I couldn't process your request at the moment.",
                 "references": ""
             }
 
+        budget = None
+        if deadline_ms is not None:
+            budget = {
+                "deadline_ms": deadline_ms,
+                "estimated_ms": round(estimated_ms, 1),
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+                "plan": plan,
+                "degradations": chat_budget.degradations(plan),
+            }
+            response_data["budget"] = budget
+        estimator.record_turn(budget)
+        return response_data
+
+    def format_location(self, doc: Document, idx: int) -> str:
+        """
+        Describe where a chunk comes from, e.g. "Page 3-4, 2.1 Technische Anforderungen".
+        Indices built before chunks carried metadata fall back to the result position.
+        """
+        metadata = doc.metadata or {}
+        if "page_start" not in metadata:
+            return f"Page {idx + 1}"
+        start, end = metadata["page_start"], metadata.get("page_end", metadata["page_start"])
+        location = f"Page {start}" if start == end else f"Page {start}-{end}"
+        if metadata.get("section"):
+            location += f", {metadata['section']}"
+        return location
+
     def extract_snippet(self, text: str, max_length: int = 100) -> str:
         """
         Extract a snippet from the text for referencing.
@@ -133,10 +261,40 @@ class Conversation:
             return snippet + '...'
 
 class ChatManager:
-    def __init__(self, vector_store_path: str, embedding_model: str, yaml_path: str):
-        self.db = load_vector_store(vector_store_path, embedding_model)
-        self.yaml_data = load_yaml(yaml_path)
+    def __init__(self, vector_store_path: str, embedding_model: str, yaml_path: Optional[str] = None,
+                 yaml_data: Optional[Dict] = None):
+        self.db = get_vector_store(vector_store_path, embedding_model)
+        # Topic data can be passed directly (e.g. a tender's stored extraction) instead of a YAML file
+        self.yaml_data = yaml_data if yaml_data is not None else load_yaml(yaml_path)
         self.conversations: Dict[str, Conversation] = {}  # key: topic, value: Conversation instance
+        # Search scope per topic, cut once from the index's chunk matrix
+        self._scopes: Dict[str, Optional[Tuple[np.ndarray, List[Document]]]] = {}
+        self._scopes_lock = threading.Lock()
+
+    def topic_scope(self, topic_key: str) -> Optional[Tuple[np.ndarray, List[Document]]]:
+        keywords = SECTION_KEYWORDS.get(topic_key)
+        if not keywords:
+            return None
+        with self._scopes_lock:
+            if topic_key in self._scopes:
+                return self._scopes[topic_key]
+        scope = build_scope(*chunk_matrix(self.db), section_filter(keywords))
+        with self._scopes_lock:
+            self._scopes[topic_key] = scope
+        return scope
+
+    def prepare(self) -> "ChatManager":
+        """
+        Do the work of starting topic chats ahead of time: cut every topic's search scope
+        from the index (reading its chunk matrix once) and load the cached query embeddings.
+        """
+        vectors, documents = chunk_matrix(self.db)
+        scopes = {topic_key: build_scope(vectors, documents, section_filter(SECTION_KEYWORDS[topic_key]))
+                  for topic_key in self.yaml_data if SECTION_KEYWORDS.get(topic_key)}
+        with self._scopes_lock:
+            self._scopes.update(scopes)
+        load_query_cache()
+        return self
 
     def start_conversation(self, topic_key: str) -> str:
         if topic_key not in self.yaml_data:
@@ -151,16 +309,17 @@ class ChatManager:
         else:
             initial_context = str(initial_context)
 
-        conversation = Conversation(topic=topic_key, initial_context=initial_context, db=self.db)
+        conversation = Conversation(topic=topic_key, initial_context=initial_context, db=self.db,
+                                    scope=self.topic_scope(topic_key))
         self.conversations[topic_key] = conversation
         return f"Conversation started on topic: {topic_key}"
 
-    def send_message(self, topic_key: str, user_message: str) -> Dict[str, str]:
+    def send_message(self, topic_key: str, user_message: str, deadline_ms: Optional[float] = None) -> Dict:
         if topic_key not in self.conversations:
             return {"error": f"No active conversation for topic '{topic_key}'. Please start a conversation first."}
 
         conversation = self.conversations[topic_key]
-        response_data = conversation.generate_response(user_message)
+        response_data = conversation.generate_response(user_message, deadline_ms)
         ai_response = response_data.get('ai_response', '')
         references = response_data.get('references', '')
 
@@ -170,7 +329,10 @@ class ChatManager:
         else:
             references_string = 'No references available.'
 
-        return {"ai_response": ai_response, "references": references_string}
+        result = {"ai_response": ai_response, "references": references_string}
+        if "budget" in response_data:
+            result["budget"] = response_data["budget"]
+        return result
 
     def end_conversation(self, topic_key: str) -> str:
         if topic_key in self.conversations:
@@ -190,21 +352,24 @@ class ChatManager:
 class ChatWithoutTopic:
     """Class for conversations without specifying a topic."""
     def __init__(self, vector_store_path: str, embedding_model: str):
-        self.db = load_vector_store(vector_store_path, embedding_model)
+        self.db = get_vector_store(vector_store_path, embedding_model)
         self.conversation = Conversation(topic="general", initial_context="This is a general conversation.", db=self.db)
 
     def start_conversation(self) -> str:
         return "Conversation started on general topic."
 
-    def send_message(self, user_message: str) -> Dict[str, str]:
-        response_data = self.conversation.generate_response(user_message)
+    def send_message(self, user_message: str, deadline_ms: Optional[float] = None) -> Dict:
+        response_data = self.conversation.generate_response(user_message, deadline_ms)
         ai_response = response_data.get('ai_response', '')
         references = response_data.get('references', '')
         if references:
             references_string = references
         else:
             references_string = 'No references available.'
-        return {"ai_response": ai_response, "references": references_string}
+        result = {"ai_response": ai_response, "references": references_string}
+        if "budget" in response_data:
+            result["budget"] = response_data["budget"]
+        return result
 
     def end_conversation(self) -> str:
         # Reset the conversation to initial state
@@ -1,23 +1,25 @@
-import os
 import requests
-import cohere
 import yaml
-import re
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.vectorstores.faiss import FAISS
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_cohere import CohereEmbeddings
-from dotenv import load_dotenv
-import os.path
+from embeddings import check_store, get_embeddings
+import chunk_store
+import artifacts
+import near_duplicates
+import pdf_workers
+from llm import get_cohere_client
+from chunker import chunk_pages
+from text_preprocessing import preprocess_text
+from json_repair import parse_json_lenient
+from retrieval import (CONTEXT_TOKEN_BUDGET, MAX_CHUNKS_PER_SECTION, build_context, context_key, load_context,
+                       plan_sections, save_context)
+from rule_extraction import apply_findings, documents_of, extract_fields, load_findings, save_findings
+from tender_schema import (SCHEMA_VERSION, SECTION_QUERIES, conform, get_field, iter_field_paths, missing_fields,
+                           schema_template, set_field)
+
+# Bump when the extraction prompts change; stored with every tender together with the
+# schema version, so backfill.py can re-run stale extractions
+EXTRACTION_PROMPT_VERSION = 1
+EXTRACTION_VERSION = f"{EXTRACTION_PROMPT_VERSION}.{SCHEMA_VERSION}"
 
-# Load environment variables from .env file (optional)
-load_dotenv()
-
-# Initialize Cohere Client
-COHERE_API_KEY = os.getenv('COHERE_API_KEY')
-if not COHERE_API_KEY:
-    raise ValueError("COHERE_API_KEY environment variable not set.")
-cohere_client = cohere.Client(COHERE_API_KEY)
 
 
 def download_file(url, save_path='downloaded_file.pdf'):
@@ -28,77 +30,48 @@ def download_file(url, save_path='downloaded_file.pdf'):
     print("File downloaded successfully!")
     return save_path
 
-def preprocess_text(text):
+def convert_to_vector_store(file_path):
     """
-    Preprocess text to remove unnecessary line breaks and improve context understanding.
+    Parse, chunk and embed a document. Returns the vector store and the MinHash signature
+    of its preprocessed pages (None for a document without text). Raises
+    ``pdf_workers.PDFParseError`` for a document that cannot be parsed within the limits.
     """
-    # Remove multiple newlines and extra spaces
-    text = re.sub(r'\n+', ' ', text)  # Replace multiple newlines with a single space
-    text = re.sub(r'\s+', ' ', text).strip()  # Remove extra spaces
+    # Use an embedding model suitable for German (if available)
+    embedding = get_embeddings()  # configured backend, see embeddings.py
 
-    # Remove common headers or footers (e.g., "Page 1", "Ausschreibungsdokument", etc.)
-    text = re.sub(r'Page \d+', '', text)
-    text = re.sub(r'Ausschreibungsdokument.*', '', text)
+    # Parsed in a worker process with time and memory limits (raises pdf_workers.PDFParseError);
+    # the raw page text keeps its line breaks so headings can still be detected
+    raw_pages = pdf_workers.load_pages(file_path)
 
-    # Fix sentence-breaking by handling cases where a sentence is split across lines without a period
-    text = re.sub(r'([a-z])-\s+([a-z])', r'\1\2', text)  # Fix hyphenated word breaks
-    text = re.sub(r'(\S)- (\S)', r'\1\2', text)  # Handle more hyphen breaks in German
-    text = re.sub(r'([a-zA-Z])\s*\n\s*([a-zA-Z])', r'\1 \2', text)  # Remove line breaks within sentences
+    # Preprocessed pages are kept as a debug artifact, rendered on the artifact writer thread
+    artifacts.save(artifacts.namespace_for(file_path), "pages_preprocessed.txt",
+                   lambda: format_pages(raw_pages))
 
-    return text
+    # Split by detected sections; every chunk carries its page span and section path
+    chunks = chunk_pages(raw_pages, preprocess=preprocess_text)
 
+    # Fingerprint for finding republished and related tenders (see near_duplicates.py)
+    signature = near_duplicates.signature(preprocess_text(content) for _, content in raw_pages)
 
-def convert_to_vector_store(file_path):
-    loader = PyPDFLoader(file_path)
-    # Use an embedding model suitable for German (if available)
-    embedding = CohereEmbeddings(model="embed-multilingual-v2.0")  # Updated to a multilingual model
-    pages = loader.load()
-
-    # Preprocess each page's content before saving to the database
-    preprocessed_pages = []
-    for page in pages:
-        preprocessed_content = preprocess_text(page.page_content)
-        preprocessed_pages.append(preprocessed_content)
-
-    # Save preprocessed pages to a text file for debugging purposes
-    pages_text_path = "uploads/pages_preprocessed.txt"
-    os.makedirs(os.path.dirname(pages_text_path), exist_ok=True)
-
-    with open(pages_text_path, 'w', encoding='utf-8') as f:
-        for i, content in enumerate(preprocessed_pages):
-            f.write(f"Page {i + 1}:\n")
-            f.write(content)
-            f.write("\n\n" + "-" * 50 + "\n\n")  # Adding a separator between pages
-
-    print(f"Preprocessed pages content saved for debugging at {pages_text_path}")
-
-    # Initialize the RecursiveCharacterTextSplitter
-    split_text = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=10,
-        length_function=len,
-        is_separator_regex=False,
-    )
+    # Create vector store from the chunks; boilerplate already embedded for other tenders is reused
+    db = chunk_store.build_vector_store([c.text for c in chunks], [c.metadata for c in chunks], embedding)
 
-    # Split the preprocessed pages and store them in the vector store
-    split_pages = []
-    for content in preprocessed_pages:
-        split_pages.extend(split_text.split_text(content))  # Splitting each page individually
+    return db, signature
 
-    # Create vector store from split pages
-    db = FAISS.from_texts(split_pages, embedding=embedding)
 
-    return db
+def format_pages(pages):
+    return "".join(f"Page {page_number}:\n{preprocess_text(content)}\n\n{'-' * 50}\n\n"
+                   for page_number, content in pages)
 
 
 def save_vector_store(db, save_path):
-    db.save_local(folder_path=save_path)
+    chunk_store.save(db, save_path)
     print(f"Vector store saved successfully at {save_path}")
 
 
 def load_vector_store(save_path, embedding):
-    db = FAISS.load_local(save_path, embeddings=embedding, allow_dangerous_deserialization=True)
-    return db
+    check_store(save_path, embedding)
+    return chunk_store.load(save_path, embedding)
 
 
 def query_vector_store(db, query, top_k=5):
@@ -106,81 +79,101 @@ def query_vector_store(db, query, top_k=5):
     return results
 
 
-def generate_structured_yaml(retrieved_text):
-    prompt = f"""
-   extrahieren Sie die folgenden Informationen aus dem bereitgestellten Text und strukturieren Sie sie gemäß dem angegebenen YAML-Format. Achten Sie besonders darauf, die **Projektphasen mit Zeitangaben**, den **Namen der ausschreibenden Firma** und den **Ausschreibungstitel** zu extrahieren. Geben Sie das Ergebnis ohne zusätzliche Formatierung oder Codeblöcke aus. Wenn ein Feld nicht verfügbar ist, setzen Sie seinen Wert auf "Nicht angegeben"
+EXTRACTION_PROMPT = """
+   extrahieren Sie die folgenden Informationen aus dem bereitgestellten Text und strukturieren Sie sie gemäß dem angegebenen JSON-Schema. Achten Sie besonders darauf, die **Projektphasen mit Zeitangaben**, den **Namen der ausschreibenden Firma** und den **Ausschreibungstitel** zu extrahieren. Geben Sie ausschließlich ein JSON-Objekt ohne zusätzliche Formatierung oder Codeblöcke aus. Jeder Wert ist ein String. Wenn ein Feld nicht verfügbar ist, setzen Sie seinen Wert auf "Nicht angegeben"
     Please suggest a possible revenue potential in USD, based on the document and your prior knowledge on budgeting. Give a specific number and put it into estimated Revenue_Potential.
     ### Auszugsweiser Text:
     {retrieved_text}
 
-    ### YAML-Struktur:
-
-    Übersicht:
-      Ausschreibungstitel: "value"
-      Ausschreibende Firma: "value"
-      Abgabefrist: "value"
-      Referenznummer: "value"
-    Kosteninformationen:
-        
-      Budgetinformationen: "value"
-      Zahlungsbedingungen: "value"
-      Kostenaufgliederung: "value"
-    Hauptziele: "value"
-    Allgemeine Anforderungen: "value"
-    Besondere Anforderungen: "value"
-    Phasen und Meilensteine: "value"
-    Einreichungsrichtlinien: "value"
-    Technische Spezifikationen: "value"
-    Rechtliche und Compliance-Anforderungen: "value"
-    Support und Wartung: "value"
-
-    . und Qualifikationen: "value"
-    Kontaktinformationen:
-      Name: "value"
-      E-Mail: "value"
-      Telefon: "value"
-      Adresse: "value"
-    Revenue_Potential: "value"
+    ### JSON-Schema:
+    {schema}
+    """
+
+FOLLOW_UP_PROMPT = """
+   Ergänzen Sie nur die folgenden Felder aus dem bereitgestellten Text. Geben Sie ausschließlich ein JSON-Objekt mit genau diesen Feldern aus. Wenn ein Feld nicht verfügbar ist, setzen Sie seinen Wert auf "Nicht angegeben"
+    ### Auszugsweiser Text:
+    {retrieved_text}
+
+    ### JSON-Schema:
+    {schema}
+    """
+
+
+def _generate(prompt, max_tokens):
+    response = get_cohere_client().generate(
+        model='command-xlarge-nightly',
+        prompt=prompt,
+        max_tokens=max_tokens,
+        temperature=0.3,
+        k=25,
+    )
+    return response.generations[0].text.strip()
+
+
+def request_missing_fields(data, retrieved_text):
+    """
+    Ask the model again for just the fields that are still missing from ``data``.
+
+    The follow-up prompt only carries the skeleton of the missing fields, so it is much
+    smaller and cheaper than regenerating the whole document.
+    """
+    missing = missing_fields(data)
+    if not missing:
+        return data
+
+    print(f"Re-requesting {len(missing)} missing field(s): {[' / '.join(p) for p in missing]}")
+    prompt = FOLLOW_UP_PROMPT.format(retrieved_text=retrieved_text, schema=schema_template(missing))
+    try:
+        follow_up = parse_json_lenient(_generate(prompt, max_tokens=150 + 60 * len(missing))).value
+    except Exception as e:
+        print(f"Error requesting missing fields: {e}")
+        return data
+
+    if isinstance(follow_up, dict):
+        for path in missing:
+            value = get_field(follow_up, path)
+            if value is not None:
+                set_field(data, path, value)
+    return data
+
+
+def generate_structured_data(retrieved_text, namespace=None, known=None):
     """
+    Extract the tender fields as JSON following ``TENDER_SCHEMA``.
+
+    Fields in ``known`` (rule-based findings, see ``rule_extraction``) are left out of the
+    prompt and filled in from there.
+
+    Truncated or slightly malformed output is repaired locally; fields that are still
+    missing afterwards are filled by one small follow-up request.
+    Returns (data, generated_text, is_success). The raw output is kept as a debug
+    artifact under ``namespace``.
+    """
+    known = known or {}
+    remaining = [path for path in iter_field_paths() if path not in known]
+    prompt = EXTRACTION_PROMPT.format(retrieved_text=retrieved_text, schema=schema_template(remaining))
 
     try:
-        response = cohere_client.generate(
-            model='command-xlarge-nightly',
-            prompt=prompt,
-            max_tokens=2000,
-            temperature=0.3,
-            k=25,
-            stop_sequences=["}"]
-        )
-        generated_text = response.generations[0].text.strip()
-
-        # Remove code block delimiters if present
-        if generated_text.startswith("```yaml"):
-            generated_text = generated_text[len("```yaml"):].strip()
-        if generated_text.endswith("```"):
-            generated_text = generated_text[:-len("```")].strip()
-
-        # Saving raw YAML to a file while handling UTF-8 characters correctly
-        raw_yaml_path = "uploads/raw_generated_yaml.yaml"
-        os.makedirs(os.path.dirname(raw_yaml_path), exist_ok=True)
-        with open(raw_yaml_path, 'w', encoding='utf-8') as f:
-            f.write(generated_text)
-        print(f"Raw YAML saved at {raw_yaml_path}")
-
-        try:
-            structured_yaml = yaml.safe_load(generated_text)
-            return structured_yaml, generated_text, True
-        except yaml.YAMLError as ye:
-            print(f"YAMLDecodeError: {ye}")
-            malformed_yaml_path = "uploads/malformed_yaml.yaml"
-            with open(malformed_yaml_path, 'w', encoding='utf-8') as f:
-                f.write(generated_text)
-            print(f"Malformed YAML saved at {malformed_yaml_path}")
-            return {}, generated_text, False
+        generated_text = _generate(prompt, max_tokens=2000)
     except Exception as e:
-        print(f"Error generating YAML: {e}")
+        print(f"Error generating structured data: {e}")
         return {}, '', False
 
+    artifacts.save(namespace, "raw_generated_output.json", generated_text)
+
+    result = parse_json_lenient(generated_text)
+    data = result.value
+    if isinstance(data, list) and data and isinstance(data[0], dict):
+        data = data[0]
+    if not isinstance(data, dict):
+        data = {}
+    if result.repaired:
+        print("Model output was not valid JSON; repaired locally.")
+
+    data = apply_findings(data, known)
+    data = request_missing_fields(data, retrieved_text)
+    return data, generated_text, bool(data)
+
 
 def save_yaml_to_file(structured_data, output_path):
     """
@@ -194,42 +187,69 @@ def save_yaml_to_file(structured_data, output_path):
         print(f"Error saving structured YAML to file: {e}")
 
 
-def get_RAG(file_path):
+def build_index(file_path, save_path):
+    """
+    Parse, chunk and embed a document and save its vector store.
+    """
+    db, signature = convert_to_vector_store(file_path)
+    save_vector_store(db, save_path)
+    near_duplicates.save_signature(save_path, signature)
+
+    # Deadline, reference number and contact details are read off the chunks directly
+    save_findings(save_path, extract_fields(documents_of(db)))
+
+
+def extract_from_index(file_path, save_path, strict=False):
+    """
+    Run the structured extraction against an existing vector store.
+
+    The retrieved context is stored next to the index, so re-running the extraction
+    (e.g. after a prompt change) does not load the index again. With ``strict``, a
+    failed generation raises instead of returning an empty extraction.
+    """
+    embedding = get_embeddings()
+    check_store(save_path, embedding)
+    db = None
+
+    # Retrieve evidence per schema section under one token budget
+    key = context_key(save_path, embedding, SECTION_QUERIES, CONTEXT_TOKEN_BUDGET, MAX_CHUNKS_PER_SECTION)
+    retrieved_text = load_context(save_path, "extraction", key)
+    if retrieved_text is None:
+        db = load_vector_store(save_path, embedding)
+        plan = plan_sections(db, embedding)
+        retrieved_text = build_context(plan)
+        save_context(save_path, "extraction", key, retrieved_text)
+
+    # Rule-based findings from ingestion; stores built before they existed are scanned now
+    findings = load_findings(save_path)
+    if findings is None:
+        db = db or load_vector_store(save_path, embedding)
+        findings = extract_fields(documents_of(db))
+        save_findings(save_path, findings)
+
+    # Generate structured data for the remaining fields
+    namespace = artifacts.namespace_for(file_path)
+    structured_data, generated_text, is_success = generate_structured_data(retrieved_text, namespace,
+                                                                           known=findings)
+
+    if not is_success:
+        if strict:
+            raise RuntimeError(f"Structured extraction failed for {file_path}")
+        print("Failed to generate structured data.")
+    structured_data = conform(structured_data)
+
+    artifacts.save(namespace, "structured_tender.yaml",
+                   lambda: yaml.dump(structured_data, allow_unicode=True, sort_keys=False, indent=4))
+    return structured_data
+
+
+def get_RAG(file_path, save_path="store/vectorstore"):
     print(f"Processing file: {file_path}")
 
     # Convert PDF to vector store
-    db = convert_to_vector_store(file_path)
-    save_path = "store/vectorstore"
-    save_vector_store(db, save_path)
+    build_index(file_path, save_path)
+    return extract_from_index(file_path, save_path)
 
-    # Load the vector store
-    embedding = CohereEmbeddings(model="embed-multilingual-v2.0")
-    db = load_vector_store(save_path, embedding)
-
-    # Query the vector store
-    query="Was sind wichtige Punkte in der Ausschreibung, insbesondere Firmenname, Projektphasen und titel?"
-    results = query_vector_store(db, query, top_k=10)
-
-    # Combine retrieved texts
-    retrieved_text = "\n".join([doc.page_content for doc in results])
-
-    # Generate structured YAML
-    structured_data, generated_text, is_success = generate_structured_yaml(retrieved_text)
-
-    if is_success:
-        # Return the structured YAML as a string, not a list
-        structured_yaml_str = yaml.dump(structured_data, sort_keys=False, indent=4, allow_unicode=True)
-        print(structured_yaml_str)
-
-        # Save the structured YAML to a file
-        output_yaml_path = f"uploads/structured_tender_{os.path.basename(file_path)}.yaml"
-        save_yaml_to_file(structured_data, output_yaml_path)
-        return structured_yaml_str
-    else:
-        # Parsing failed
-        print("Failed to generate structured YAML.")
-        return "Failed to generate structured YAML."
-    
 
 
 if __name__ == "__main__":
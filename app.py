@@ -1,110 +1,289 @@
+import datetime
 import os
-from flask import Flask, request, redirect, url_for, render_template, jsonify
-from werkzeug.utils import secure_filename
+from flask import Blueprint, Flask, current_app, request, redirect, url_for, render_template, jsonify
 import json
-
-from RAG_21 import get_RAG
-from Conv_RAG import ChatManager, Conversation,ChatWithoutTopic
-
-import yaml
-
-from complexity import get_assesment
-
-from flask_sqlalchemy import SQLAlchemy
-
-
-
-import re
-
-# Initialize the Flask app
-app = Flask(__name__)
-
-# Configure the app and set the upload folder
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///tenders.db'  # Correct database URI
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False  # Disable SQLAlchemy event system for performance
-
-# Initialize SQLAlchemy
-db = SQLAlchemy(app)
-
-# Define the Tender model
-class Tender(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    json_data = db.Column(db.Text, nullable=False)  # Store JSON data as text
-    metrics = db.Column(db.Text, nullable=True)  # Any metrics stored as text
-
-# Initialize the database and create tables if they don't exist
-def init_db():
-    with app.app_context():
-        db.create_all()
-
-# Call init_db() to create tables
-init_db()
-
-
-@app.route("/",  methods=['GET', 'POST'])
+import math
+import sys
+import threading
+import time
+
+import sqlalchemy as sa
+
+import database
+import near_duplicates
+import portfolio
+import warmup
+from extensions import db
+from models import ChatLog, Tender
+from rule_extraction import apply_findings, load_findings
+from storage import index_path_for, save_upload
+from tender_schema import fill_nulls
+
+# The AI modules (RAG_21, Conv_RAG, complexity) pull in LangChain, FAISS, pypdf and the
+# Cohere SDK. They are imported inside the functions that use them so that importing the
+# app, booting a worker or running a test only pays for Flask and SQLAlchemy.
+
+VECTOR_STORE_PATH = "store/vectorstore"
+# Embedding backend spec used for chats, see embeddings.py (read here to keep the app import light)
+EMBEDDING_MODEL = os.getenv("TENDERMIND_EMBEDDINGS", "cohere:embed-multilingual-v2.0")
+
+bp = Blueprint('main', __name__)
+
+# Conversation state shared by the chat endpoints
+current_chat_manager = None
+current_conversation_type = None
+current_topic = None
+current_tender_id = None
+
+
+def create_app(config=None):
+    """
+    Application factory.
+
+    Heavy AI modules are not imported here; pass PREWARM (or set TENDERMIND_PREWARM to
+    "1" or "background") to load them and the vector store before the first request.
+    """
+    app = Flask(__name__)
+
+    # Configure the app and set the upload folder
+    app.config['UPLOAD_FOLDER'] = 'uploads'
+    app.config['PREWARM'] = os.getenv('TENDERMIND_PREWARM', '0')
+    if config:
+        app.config.update(config)
+
+    # Initialize SQLAlchemy (WAL mode, connection pool and write queue, see database.py)
+    database.configure(app)
+    db.init_app(app)
+    database.init_db(app)
+
+    app.register_blueprint(bp)
+
+    @app.cli.command('rebuild-portfolio')
+    def rebuild_portfolio_command():
+        """Recompute the portfolio aggregates from all tenders."""
+        portfolio.rebuild()
+
+    @app.cli.command('rebuild-similarity')
+    def rebuild_similarity_command():
+        """Compute missing MinHash signatures and rebuild the near-duplicate index."""
+        print(f"Signatures computed for {near_duplicates.rebuild()} tender(s).")
+
+    @app.cli.command('prewarm')
+    def prewarm_command():
+        """Import the AI modules and load the vector store."""
+        prewarm(app)
+
+    mode = str(app.config['PREWARM']).lower()
+    if mode == 'background':
+        threading.Thread(target=prewarm, args=(app,), daemon=True).start()
+    elif mode in ('1', 'true', 'yes'):
+        prewarm(app)
+
+    return app
+
+
+def prewarm(app):
+    """
+    Import the AI modules, create the Cohere client and load the shared vector store so the
+    first upload or chat request does not pay for it. Failures are reported, not raised.
+    """
+    import RAG_21  # noqa: F401
+    import complexity  # noqa: F401
+    from Conv_RAG import get_vector_store
+    from llm import get_cohere_client
+
+    try:
+        get_cohere_client()
+    except Exception as e:
+        print(f"Prewarm: Cohere client not available: {e}")
+
+    if os.path.exists(VECTOR_STORE_PATH):
+        try:
+            get_vector_store(VECTOR_STORE_PATH, EMBEDDING_MODEL)
+        except Exception as e:
+            print(f"Prewarm: could not load vector store: {e}")
+    print("Prewarm finished.")
+
+
+@bp.route("/",  methods=['GET', 'POST'])
 def dashboard():
     tenders = Tender.query.all()
     return render_template('dashboard.html', tenders=tenders)
 
-@app.route('/create_tender', methods=['POST'])
+@bp.route('/create_tender', methods=['POST'])
 def create_tender():
     name = request.form['name']
     file = request.files['file']
+    # The upload form offers reusing the analysis of a near-identical earlier tender (on by default);
+    # its checkbox follows a hidden "0", so the last value wins
+    reuse_similar = (request.form.getlist('reuse_similar') or ['1'])[-1] not in ('0', 'false', 'off')
 
     if file:
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        # The write lock is held from storing the upload until a row referencing it is
+        # committed, so a concurrent /delete_tender of a tender with the same document keeps
+        # the file and index (see deletion.py)
+        database.begin_immediate()
+        digest, file_path = save_upload(file, current_app.config['UPLOAD_FOLDER'])
+
+        # An identical document was analysed before: reuse its index, extraction and metrics
+        existing = (Tender.query.filter_by(content_hash=digest).filter(Tender.status.is_(None))
+                    .order_by(Tender.id).first())
+        if existing is not None:
+            print(f"Document {digest[:12]} already ingested as tender {existing.id}; reusing its analysis.")
+            new_tender = Tender(name=name, json_data=existing.json_data, metrics=existing.metrics,
+                                content_hash=digest, file_path=file_path, index_path=existing.index_path,
+                                extraction_version=existing.extraction_version,
+                                assessment_version=existing.assessment_version, minhash=existing.minhash)
+            db.session.add(new_tender)
+            db.session.commit()
+        else:
+            # The analysis runs without the lock: a placeholder row holds on to the file and
+            # index meanwhile, and is filled in once the analysis is done
+            new_tender = Tender(name=name, json_data='{}', metrics='{}', content_hash=digest,
+                                file_path=file_path, index_path=index_path_for(digest), status='analysing')
+            db.session.add(new_tender)
+            db.session.commit()
+            finish_analysis(new_tender, reuse_similar)
+
+
+    return redirect(url_for('main.dashboard'))
+
+
+def finish_analysis(tender, reuse_similar=True):
+    """
+    Analyse the document of ``tender``, a committed placeholder (status ``analysing``), and
+    commit the result. A document that cannot be parsed marks it failed; any other error
+    removes it. If the tender was deleted in the meantime, the result is discarded.
+    """
+    from pdf_workers import PDFParseError
+
+    tender_id = sa.inspect(tender).identity[0]  # without reloading the expired row
+    # Nothing is flushed until the end, so the write lock is only taken to store the result
+    with db.session.no_autoflush:
+        try:
+            analyse_document(tender, reuse_similar)
+            tender.status = None
+        except PDFParseError as e:
+            # Kept with the reason, so the dashboard shows why the document has no analysis
+            tender.json_data, tender.metrics, tender.index_path, tender.minhash = '{}', '{}', None, None
+            tender.status, tender.error = 'failed', f"{e.reason}: {e}"
+        except Exception:
+            db.session.rollback()
+            placeholder = db.session.get(Tender, tender_id)
+            if placeholder is None:
+                # Deleted meanwhile, which removes the files the analysis was reading
+                print(f"Tender {tender_id} was deleted during its analysis.")
+                return None
+            db.session.delete(placeholder)
+            db.session.commit()
+            raise
+        database.begin_immediate()
+        deleted = db.session.query(Tender.id).filter_by(id=tender_id).first() is None
+    if deleted:
+        db.session.rollback()
+        print(f"Tender {tender_id} was deleted during its analysis; discarding the result.")
+        return None
+    db.session.commit()
+    return tender
 
-        # Ensure the uploads directory exists
-        if not os.path.exists(app.config['UPLOAD_FOLDER']):
-            os.makedirs(app.config['UPLOAD_FOLDER'])
 
-        file.save(file_path)
+def analyse_document(tender, reuse_similar=True):
+    """
+    Run extraction and assessment for the document of ``tender`` and fill in its analysis.
 
-        # Send file to RAG and get response (simulate here)
-        rag_output = send_to_rag_application(file_path)
+    If an earlier tender's document is near-identical (``near_duplicates.REUSE_THRESHOLD``)
+    and ``reuse_similar`` is set, its extraction and assessment are reused instead of
+    calling the model; the fields found by rule in the new document still apply.
+    """
+    from RAG_21 import build_index
 
-        json_string = json.dumps(rag_output)
-        json_data_string = re.sub(r'\bnull\b', '"Not Provided"', json_string)
+    digest, file_path, index_path = tender.content_hash, tender.file_path, tender.index_path
+    build_index(file_path, index_path)
+    signature = near_duplicates.load_signature(index_path)
 
-        rag_graph_output = get_assesment(file_path)
-        #parsed_graph_yaml = yaml.safe_load(rag_graph_output)        
+    similar = near_duplicates.find_similar(signature, limit=1, min_similarity=near_duplicates.REUSE_THRESHOLD,
+                                           exclude=tender.id)
+    # The similar tender may have been deleted since find_similar saw it
+    source = db.session.get(Tender, similar[0].id) if reuse_similar and similar else None
+    if source is not None:
+        print(f"Document {digest[:12]} is {similar[0].similarity:.0%} similar to tender {source.id}; "
+              f"reusing its analysis.")
+        data = apply_findings(json.loads(source.json_data), load_findings(index_path) or {})
+        tender.json_data, tender.metrics = json.dumps(data, ensure_ascii=False), source.metrics
+        tender.extraction_version, tender.assessment_version = source.extraction_version, source.assessment_version
+        tender.minhash, tender.reused_from_id, tender.reuse_similarity = signature, source.id, similar[0].similarity
+        return tender
 
-        # Update the tender with the RAG output (json data)
-        json_graph_string = json.dumps(rag_graph_output)
-        json_graph_string = re.sub(r'\bnull\b', '"Not Provided"', json_graph_string)
+    tender.minhash = signature
+    return run_analysis(tender)
 
-        # Create new Tender object with the parsed data
-        new_tender = Tender(name=name, json_data=json_data_string, metrics=json_graph_string)
 
-        # Save to database
-        db.session.add(new_tender)
-        db.session.commit()
+def run_analysis(tender):
+    """Run the model extraction and assessment for a tender whose index is built."""
+    from RAG_21 import EXTRACTION_VERSION
+    from complexity import ASSESSMENT_VERSION, get_assesment
 
+    file_path, index_path = tender.file_path, tender.index_path
 
-    return redirect(url_for('dashboard'))
+    # Send file to RAG and get response
+    rag_output = send_to_rag_application(file_path, index_path)
 
+    # Missing values are already filled in by the schema, so no string patching is needed
+    json_data_string = json.dumps(rag_output, ensure_ascii=False)
 
+    rag_graph_output = get_assesment(file_path, index_path)
 
-def send_to_rag_application(filename):
-    # Get the YAML content (from RAG)
-    yaml_string = get_RAG(filename)
-    data = yaml.safe_load(yaml_string)
+    # Update the tender with the RAG output (json data)
+    json_graph_string = json.dumps(fill_nulls(rag_graph_output), ensure_ascii=False)
 
-    if isinstance(data, list):
-        data = data[0]
+    # Update the tender with the parsed data
+    tender.json_data, tender.metrics = json_data_string, json_graph_string
+    tender.extraction_version, tender.assessment_version = EXTRACTION_VERSION, ASSESSMENT_VERSION
+    tender.reused_from_id = tender.reuse_similarity = None
+    return tender
 
-    return data
 
-"""def yaml_to_json_html(yaml_input):
-    parsed_yaml = yaml.safe_load(yaml_input)
-    json_string = json.dumps(json_content)
+def send_to_rag_application(filename, index_path=VECTOR_STORE_PATH):
+    from RAG_21 import extract_from_index
 
-    json_string = re.sub(r'\bnull\b', '"Not Provided"', json_string)
+    # Structured data following tender_schema.TENDER_SCHEMA, from the index built on upload
+    return extract_from_index(filename, index_path)
 
-    return json_string"""
+
+@bp.route('/reanalyse/<int:tender_id>', methods=['POST'])
+def reanalyse(tender_id):
+    """Run the model analysis for a tender whose analysis was reused from a similar one."""
+    tender = Tender.query.get_or_404(tender_id)
+    if not tender.index_path:
+        return jsonify({'error': 'The tender has no stored index.'}), 400
+    run_analysis(tender)
+    db.session.commit()
+    return jsonify({'message': f"Tender {tender.id} analysed."})
+
+
+@bp.route('/similar_tenders/<int:tender_id>')
+def similar_tenders(tender_id):
+    """Past tenders whose documents are most similar to this one (LSH lookup)."""
+    tender = Tender.query.get_or_404(tender_id)
+    limit = request.args.get('limit', 5, type=int)
+    matches = near_duplicates.find_similar(tender.minhash, limit=limit, exclude=tender.id)
+    return jsonify({'similar': [m.to_dict() for m in matches]})
+
+
+@bp.route('/delete_tender/<int:tender_id>', methods=['POST'])
+def delete_tender(tender_id):
+    """
+    Delete a tender with its upload, vector store, artifacts and cached chat state.
+    Returns the disk and memory reclaimed (see deletion.py).
+    """
+    global current_chat_manager, current_conversation_type, current_topic, current_tender_id
+    from deletion import delete_tender as delete
+
+    tender = Tender.query.get_or_404(tender_id)
+    report = delete(tender, keep_paths=(VECTOR_STORE_PATH,))
+    if current_tender_id == tender_id:
+        current_chat_manager = current_conversation_type = current_topic = current_tender_id = None
+    return jsonify(report)
 
 
 # Reusable store function
@@ -113,7 +292,7 @@ def store_tender_data(tender_id, json_data):
     tender.json_data = json.dumps(json_data, ensure_ascii=False)
     db.session.commit()
 
-@app.route('/get_tender_data/<int:tender_id>', methods=['GET'])
+@bp.route('/get_tender_data/<int:tender_id>', methods=['GET'])
 def get_tender_data(tender_id):
     tender = Tender.query.get_or_404(tender_id)
     tender_data = json.loads(tender.json_data)
@@ -126,10 +305,34 @@ def get_tender_data(tender_id):
 
     print(card_data)
 
-    return jsonify({'card_data': card_data})
+    # Pages the rule-based fields (deadline, reference number, contact) were found on
+    provenance = {}
+    if tender.index_path:
+        findings = load_findings(tender.index_path) or {}
+        provenance = {" / ".join(path): {'value': f['value'], 'pages': f['pages']} for path, f in findings.items()}
+
+    # Republished or related tenders, and where a reused analysis came from
+    similar = [m.to_dict() for m in near_duplicates.find_similar(tender.minhash, exclude=tender.id)]
+    reused_from = None
+    if tender.reused_from_id is not None:
+        reused_from = {'id': tender.reused_from_id, 'similarity': tender.reuse_similarity}
+
+    # Opening a card usually leads to a chat about the tender: prepare it in the background
+    warmup.warm_chat(tender.id, tender.index_path, tender.json_data, EMBEDDING_MODEL)
+
+    return jsonify({'card_data': card_data, 'provenance': provenance, 'similar': similar,
+                    'reused_from': reused_from, 'status': tender.status, 'error': tender.error})
+
+
+@bp.route('/warm_tender/<int:tender_id>', methods=['POST'])
+def warm_tender(tender_id):
+    """Start loading a tender's chat state, e.g. when the user hovers over its card."""
+    tender = Tender.query.get_or_404(tender_id)
+    scheduled = warmup.warm_chat(tender.id, tender.index_path, tender.json_data, EMBEDDING_MODEL)
+    return jsonify({'scheduled': scheduled})
 
 
-@app.route('/process_addons', methods=['POST'])
+@bp.route('/process_addons', methods=['POST'])
 def process_addons():
     data = request.json
     print(data)
@@ -154,7 +357,12 @@ def process_addons():
 
     return jsonify({'card_data_addons': card_data_addons})
 
-@app.route('/graph_data/<int:tender_id>')
+@bp.route('/portfolio_metrics')
+def portfolio_metrics():
+    # Served from the incrementally maintained aggregate tables
+    return jsonify(portfolio.snapshot())
+
+@bp.route('/graph_data/<int:tender_id>')
 def graph_data(tender_id):
 
     # Fetch the tender data based on tender_id
@@ -182,43 +390,88 @@ def graph_data(tender_id):
             "Rating": tender_data.get("Time Feasibility", {}).get("Rating", "Not Provided"),
             "Verification_Sentence": tender_data.get("Time Feasibility", {}).get("Verification Sentence", ".")
         },
-        "Days_Left": tender_data.get("Days Left to Submit the Proposal", "Not Available")
+        "Days_Left": days_left(tender, tender_data)
     }
 
     # Return the formatted data as JSON response
     return jsonify(formatted_data)
 
-@app.route('/start_conversation', methods=['POST'])
+def days_left(tender, metrics, today=None):
+    """
+    Days until the submission deadline, computed when read so the value never goes stale.
+    Tenders without a parsed deadline fall back to the value stored at upload.
+    """
+    if tender.deadline is not None:
+        return str((tender.deadline - (today or datetime.date.today())).days)
+    return metrics.get("Days Left to Submit the Proposal", "Not Available")
+
+
+def chat_tender(tender_id):
+    """
+    The tender a chat is about: the requested one, or the most recent upload.
+    """
+    if tender_id is not None:
+        return Tender.query.get_or_404(tender_id)
+    return Tender.query.filter(Tender.index_path.isnot(None)).order_by(Tender.id.desc()).first()
+
+
+@bp.route('/chat_metrics')
+def chat_metrics():
+    """
+    Batch size and latency of the coalesced chat calls, chat warm-up counters, stage latency
+    estimates, chunk store compaction and the PDF parsing watchdog.
+    """
+    metrics = sys.modules['coalescer'].stats() if 'coalescer' in sys.modules else {}
+    metrics['warmup'] = warmup.scheduler.stats()
+    metrics['write_queue'] = database.write_queue().stats()
+    if 'chat_budget' in sys.modules:
+        metrics['latency_budget'] = sys.modules['chat_budget'].stats()
+    if 'chunk_store' in sys.modules:
+        metrics['compactor'] = sys.modules['chunk_store'].compactor.stats()
+    if 'pdf_workers' in sys.modules:
+        metrics['pdf_workers'] = sys.modules['pdf_workers'].stats()
+    return jsonify(metrics)
+
+
+@bp.route('/start_conversation', methods=['POST'])
 def start_conversation():
-    global current_chat_manager, current_conversation_type, current_topic
+    global current_chat_manager, current_conversation_type, current_topic, current_tender_id
 
-    vector_store_path = "store/vectorstore"
-    embedding_model = "embed-multilingual-v2.0"
-    yaml_path = "uploads/structured_tender_CPQ_Ausschreibung2.yaml"
     data = request.json
     topic = data.get('topic')
 
     if not topic:
         return jsonify({'error': 'Topic is required to start a conversation.'}), 400
 
-    chat_manager = ChatManager(vector_store_path, embedding_model, yaml_path)
+    tender = chat_tender(data.get('tender_id'))
+    if tender is not None and tender.index_path:
+        # Usually prepared already by the warm-up started when the tender card was opened
+        chat_manager = warmup.chat_manager(tender.id, tender.index_path, tender.json_data, EMBEDDING_MODEL)
+    else:
+        from Conv_RAG import ChatManager
+        yaml_path = "uploads/structured_tender_CPQ_Ausschreibung2.yaml"
+        chat_manager = ChatManager(VECTOR_STORE_PATH, EMBEDDING_MODEL, yaml_path)
     message = chat_manager.start_conversation(topic)
 
     # Set global conversation state
     current_chat_manager = chat_manager
     current_conversation_type = 'topic'
     current_topic = topic
+    current_tender_id = tender.id if tender is not None else None
 
     return jsonify({'message': message})
 
 
-@app.route('/start_on_the_fly', methods=['POST'])
+@bp.route('/start_on_the_fly', methods=['POST'])
 def start_conversation_on_the_fly():
-    global current_chat_manager, current_conversation_type, current_topic
+    global current_chat_manager, current_conversation_type, current_topic, current_tender_id
+    from Conv_RAG import ChatWithoutTopic
 
-    vector_store_path = "store/vectorstore"
-    embedding_model = "embed-multilingual-v2.0"
-    chat_manager_general = ChatWithoutTopic(vector_store_path, embedding_model)
+    data = request.get_json(silent=True) or {}
+    tender = chat_tender(data.get('tender_id'))
+    vector_store_path = tender.index_path if tender is not None and tender.index_path else VECTOR_STORE_PATH
+
+    chat_manager_general = ChatWithoutTopic(vector_store_path, EMBEDDING_MODEL)
     message = chat_manager_general.start_conversation()
     print("message is ", message)
 
@@ -226,41 +479,60 @@ def start_conversation_on_the_fly():
     current_chat_manager = chat_manager_general
     current_conversation_type = 'general'
     current_topic = None
+    current_tender_id = tender.id if tender is not None else None
 
     return jsonify({'message': message})
 
 
-@app.route('/get_response', methods=['POST'])
+@bp.route('/get_response', methods=['POST'])
 def get_response():
-    global current_chat_manager, current_conversation_type, current_topic
+    # Copied once: a concurrent /end_conversation may reset the globals while this turn runs
+    chat_manager, conversation_type = current_chat_manager, current_conversation_type
+    topic, tender_id = current_topic, current_tender_id
 
     data = request.json
     user_message = data.get('message')
 
-    if not current_chat_manager:
+    if not chat_manager:
         return jsonify({'error': 'No active conversation. Please start a conversation first.'}), 400
 
-    if current_conversation_type == 'topic':
-        if not current_topic:
+    # Optional latency budget; the answer is degraded as needed to meet it (see chat_budget.py)
+    deadline_ms = data.get('deadline_ms')
+    if deadline_ms is not None:
+        if (isinstance(deadline_ms, bool) or not isinstance(deadline_ms, (int, float))
+                or not math.isfinite(deadline_ms) or deadline_ms <= 0):
+            return jsonify({'error': 'deadline_ms must be a positive number of milliseconds.'}), 400
+
+    started = time.perf_counter()
+    if conversation_type == 'topic':
+        if not topic:
             return jsonify({'error': 'Topic is not set for the current conversation.'}), 400
-        response_data = current_chat_manager.send_message(current_topic, user_message)
-    elif current_conversation_type == 'general':
-        response_data = current_chat_manager.send_message(user_message)
+        response_data = chat_manager.send_message(topic, user_message, deadline_ms=deadline_ms)
+    elif conversation_type == 'general':
+        response_data = chat_manager.send_message(user_message, deadline_ms=deadline_ms)
     else:
         return jsonify({'error': 'Invalid conversation type.'}), 400
 
+    # Logged off the request path, in batches (see database.WriteQueue)
+    database.enqueue(ChatLog, tender_id=tender_id, conversation_type=conversation_type,
+                     topic=topic, question=user_message or '', answer=response_data.get('ai_response'),
+                     error=response_data.get('error'), latency_ms=(time.perf_counter() - started) * 1000)
+
     if 'error' in response_data:
         return jsonify({'error': response_data['error']}), 400
     else:
-        return jsonify({
+        result = {
             'response': response_data['ai_response'],
             'source': response_data['references']  # References returned as 'source'
-        })
+        }
+        if 'budget' in response_data:
+            result['budget'] = response_data['budget']  # plan used and degradations applied
+        return jsonify(result)
 
 
-@app.route('/end_conversation', methods=['POST'])
+@bp.route('/end_conversation', methods=['POST'])
 def end_conversation():
-    global current_chat_manager, current_conversation_type, current_topic
+    global current_chat_manager, current_conversation_type, current_topic, current_tender_id
 
     if not current_chat_manager:
         return jsonify({'message': 'No active conversation to end.'})
@@ -278,9 +550,10 @@ def end_conversation():
     current_chat_manager = None
     current_conversation_type = None
     current_topic = None
+    current_tender_id = None
 
     return jsonify({'message': message})
 
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
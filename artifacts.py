@@ -0,0 +1,170 @@
+"""
+Debug artifacts (preprocessed pages, raw model output, structured extraction, assessment)
+written off the request path.
+
+Artifacts are grouped per document under ``artifacts/<namespace>/<name>.gz``, where the
+namespace is the document's file name without extension (the content hash for uploads),
+so concurrent ingests never share a file. ``save`` only enqueues the artifact; a
+background thread renders, gzips and writes it, then prunes the oldest namespaces once
+the retention limits are exceeded. When the queue is full the artifact is dropped
+rather than slowing down the caller.
+
+Configuration (environment):
+
+- ``TENDERMIND_ARTIFACTS``: "on" (default), "off", or a sample rate between 0 and 1.
+  Sampling is decided per namespace, so a document gets all of its artifacts or none.
+- ``TENDERMIND_ARTIFACT_MAX_DOCS``: namespaces to keep (default 50).
+- ``TENDERMIND_ARTIFACT_MAX_MB``: total size to keep (default 200).
+"""
+import atexit
+import gzip
+import hashlib
+import os
+import queue
+import shutil
+import threading
+
+ARTIFACT_FOLDER = "artifacts"
+QUEUE_SIZE = 256
+
+
+def _sample_rate():
+    value = os.getenv("TENDERMIND_ARTIFACTS", "on").strip().lower()
+    if value in ("on", "true", "yes", "1"):
+        return 1.0
+    if value in ("off", "false", "no", "0", ""):
+        return 0.0
+    try:
+        return min(max(float(value), 0.0), 1.0)
+    except ValueError:
+        return 1.0
+
+
+def namespace_for(file_path):
+    """Artifact namespace of a document: its file name without extension."""
+    return os.path.splitext(os.path.basename(file_path))[0]
+
+
+def is_sampled(namespace, rate=None):
+    rate = _sample_rate() if rate is None else rate
+    if rate >= 1.0:
+        return True
+    if rate <= 0.0:
+        return False
+    bucket = int(hashlib.sha1(namespace.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+    return bucket < rate
+
+
+class ArtifactStore:
+    def __init__(self, folder=ARTIFACT_FOLDER, max_docs=None, max_bytes=None):
+        self.folder = folder
+        self.max_docs = max_docs if max_docs is not None else int(os.getenv("TENDERMIND_ARTIFACT_MAX_DOCS", "50"))
+        self.max_bytes = max_bytes if max_bytes is not None else \
+            int(float(os.getenv("TENDERMIND_ARTIFACT_MAX_MB", "200")) * 1024 * 1024)
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.counts = {"queued": 0, "written": 0, "skipped": 0, "dropped": 0, "failed": 0, "pruned": 0}
+
+    def save(self, namespace, name, content):
+        """
+        Queue an artifact. ``content`` is a string, bytes, or a callable returning either;
+        a callable is only evaluated on the writer thread.
+        """
+        if not namespace or not is_sampled(namespace):
+            self.counts["skipped"] += 1
+            return False
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((namespace, name, content))
+        except queue.Full:
+            self.counts["dropped"] += 1
+            return False
+        self.counts["queued"] += 1
+        return True
+
+    def path_for(self, namespace, name):
+        return os.path.join(self.folder, namespace, name + ".gz")
+
+    def read(self, namespace, name):
+        with gzip.open(self.path_for(namespace, name), "rt", encoding="utf-8") as f:
+            return f.read()
+
+    def flush(self, timeout=None):
+        """Wait until every queued artifact has been written (or ``timeout`` expires)."""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        threading.Thread(target=lambda: (self._queue.join(), done.set()), daemon=True).start()
+        return done.wait(timeout)
+
+    def stats(self):
+        return dict(self.counts, pending=self._queue.qsize())
+
+    def _ensure_writer(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="artifact-writer", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            namespace, name, content = self._queue.get()
+            try:
+                self._write(namespace, name, content)
+                self.counts["written"] += 1
+                self._prune(keep=namespace)
+            except Exception as e:
+                self.counts["failed"] += 1
+                print(f"Could not write artifact {namespace}/{name}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, namespace, name, content):
+        if callable(content):
+            content = content()
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        path = self.path_for(namespace, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.part"
+        with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def _prune(self, keep):
+        if not os.path.isdir(self.folder):
+            return
+        namespaces = []
+        total = 0
+        for entry in os.scandir(self.folder):
+            if not entry.is_dir():
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+            namespaces.append((entry.stat().st_mtime, entry.name, size))
+            total += size
+        namespaces.sort()  # oldest first
+        while namespaces and (len(namespaces) > self.max_docs or total > self.max_bytes):
+            _, name, size = namespaces.pop(0)
+            if name == keep:
+                continue
+            shutil.rmtree(os.path.join(self.folder, name), ignore_errors=True)
+            total -= size
+            self.counts["pruned"] += 1
+
+
+_store = ArtifactStore()
+atexit.register(_store.flush, 10)
+
+
+def save(namespace, name, content):
+    return _store.save(namespace, name, content)
+
+
+def flush(timeout=None):
+    return _store.flush(timeout)
+
+
+def stats():
+    return _store.stats()
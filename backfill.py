@@ -0,0 +1,248 @@
+"""
+Re-run stale extractions and assessments across the whole portfolio.
+
+    python backfill.py --workers 2
+    python backfill.py --stages assess --dry-run
+
+Every tender records the versions its extraction (``RAG_21.EXTRACTION_VERSION``, prompt
+and schema) and assessment (``complexity.ASSESSMENT_VERSION``) were produced with. After
+a prompt or schema change, this re-runs only the stages whose version is out of date,
+against the tender's stored vector store and retrieved context, so no document is parsed
+or embedded again.
+
+- Concurrency is bounded by ``--workers``.
+- Chat comes first: before every model call a worker waits while a chat turn has been
+  logged within the last ``--chat-quiet`` seconds, and the process runs at a lower CPU
+  priority than the app.
+- Runs are resumable: a tender is committed with its new versions as soon as its stages
+  finish, so running again continues with the tenders that are still stale.
+- Progress is printed per tender, with throughput and ETA every ``--report-every`` tenders.
+"""
+import argparse
+import datetime
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import sqlalchemy as sa
+
+# Stage -> Tender column holding the version it was produced with
+STAGES = {
+    "extract": "extraction_version",
+    "assess": "assessment_version",
+}
+
+
+def current_versions():
+    from RAG_21 import EXTRACTION_VERSION
+    from complexity import ASSESSMENT_VERSION
+
+    return {"extract": EXTRACTION_VERSION, "assess": ASSESSMENT_VERSION}
+
+
+class StaleTender:
+    def __init__(self, row, stages):
+        self.id = row.id
+        self.name = row.name
+        self.file_path = row.file_path
+        self.index_path = row.index_path
+        self.stages = stages
+
+
+def find_stale(stages, versions, limit=None):
+    """
+    Tenders with at least one stage out of date, oldest first, and the ones that cannot be
+    re-run because their vector store is missing.
+    """
+    from chunk_store import index_exists
+    from models import Tender
+
+    columns = [getattr(Tender, STAGES[stage]) for stage in stages]
+    stale_condition = sa.or_(*[sa.or_(column.is_(None), column != versions[stage])
+                               for stage, column in zip(stages, columns)])
+    query = (Tender.query.with_entities(Tender.id, Tender.name, Tender.file_path, Tender.index_path, *columns)
+             .filter(stale_condition)
+             # Uploads still being analysed are completed by /create_tender
+             .filter(sa.or_(Tender.status.is_(None), Tender.status != "analysing"))
+             .order_by(Tender.id))
+    if limit:
+        query = query.limit(limit)
+
+    todo, missing_index = [], []
+    for row in query:
+        stale = [stage for stage in stages if getattr(row, STAGES[stage]) != versions[stage]]
+        tender = StaleTender(row, stale)
+        if row.index_path and index_exists(row.index_path):
+            todo.append(tender)
+        else:
+            missing_index.append(tender)
+    return todo, missing_index
+
+
+class ChatGate:
+    """Holds background model calls back while analysts are chatting (see ChatLog)."""
+
+    def __init__(self, engine, quiet_seconds, poll_seconds=2.0):
+        from models import ChatLog
+
+        self.engine = engine
+        self.quiet = datetime.timedelta(seconds=quiet_seconds)
+        self.poll_seconds = poll_seconds
+        self._last_chat = sa.select(sa.func.max(ChatLog.created_at))
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def chat_active(self):
+        if not self.quiet:
+            return False
+        with self.engine.connect() as conn:
+            last = conn.execute(self._last_chat).scalar()
+        return last is not None and datetime.datetime.utcnow() - last < self.quiet
+
+    def wait(self):
+        while self.chat_active():
+            time.sleep(self.poll_seconds)
+            with self._lock:
+                self.waited += self.poll_seconds
+
+
+def run_stages(tender, gate, stage_times):
+    """
+    Re-run a tender's stale stages. Returns ({stage: new column value}, {stage: error});
+    a failed stage keeps its old value and version.
+    """
+    from RAG_21 import extract_from_index
+    from complexity import get_assesment
+    from tender_schema import fill_nulls
+
+    # Artifacts are grouped by file name; tenders from before content-addressed uploads have none
+    source = tender.file_path or tender.index_path
+    runners = {
+        "extract": lambda: json.dumps(extract_from_index(source, tender.index_path, strict=True),
+                                      ensure_ascii=False),
+        "assess": lambda: json.dumps(fill_nulls(get_assesment(source, tender.index_path, strict=True)),
+                                     ensure_ascii=False),
+    }
+    updates, errors = {}, {}
+    for stage in tender.stages:
+        gate.wait()
+        started = time.perf_counter()
+        try:
+            updates[stage] = runners[stage]()
+        except Exception as e:
+            errors[stage] = f"{type(e).__name__}: {e}"
+            continue
+        stage_times.setdefault(stage, []).append(time.perf_counter() - started)
+    return updates, errors
+
+
+def write_updates(tender_id, updates, versions):
+    from extensions import db
+    from models import Tender
+
+    tender = db.session.get(Tender, tender_id)
+    if "extract" in updates:
+        tender.json_data = updates["extract"]
+    if "assess" in updates:
+        tender.metrics = updates["assess"]
+    for stage in updates:
+        setattr(tender, STAGES[stage], versions[stage])
+    # Portfolio aggregates follow in the same transaction (see portfolio.py)
+    db.session.commit()
+
+
+def lower_priority():
+    try:
+        os.nice(10)
+    except (AttributeError, OSError):
+        pass
+
+
+def backfill(stages=None, workers=2, limit=None, chat_quiet=30.0, dry_run=False, report_every=10, app=None):
+    from app import create_app
+    from extensions import db
+
+    stages = list(stages or STAGES)
+    versions = current_versions()
+    app = app or create_app()
+    with app.app_context():
+        todo, missing_index = find_stale(stages, versions, limit)
+        gate = ChatGate(db.engine, chat_quiet)
+
+    pending = {stage: sum(stage in t.stages for t in todo) for stage in stages}
+    print(f"Current versions: {', '.join(f'{s} {versions[s]}' for s in stages)}")
+    print(f"{len(todo)} tender(s) to update ({', '.join(f'{s}: {n}' for s, n in pending.items())}), "
+          f"{len(missing_index)} skipped without a stored index")
+    if dry_run or not todo:
+        return {"updated": 0, "failed": 0, "skipped": len(missing_index)}
+
+    lower_priority()
+    stage_times = {}
+    counts = {"updated": 0, "failed": 0, "skipped": len(missing_index)}
+    started = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backfill")
+    futures = {pool.submit(run_stages, tender, gate, stage_times): tender for tender in todo}
+    try:
+        with app.app_context():
+            for i, future in enumerate(as_completed(futures), 1):
+                tender = futures[future]
+                updates, errors = future.result()
+                if updates:
+                    write_updates(tender.id, updates, versions)
+                    counts["updated"] += 1
+                if errors:
+                    counts["failed"] += 1
+                status = ", ".join([f"{s} ok" for s in updates] + [f"{s} failed ({e})" for s, e in errors.items()])
+                print(f"[{i}/{len(todo)}] tender {tender.id} {tender.name!r}: {status}")
+                if i % report_every == 0 and i < len(todo):
+                    print_progress(i, len(todo), time.perf_counter() - started, gate.waited)
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        print("\nInterrupted; finished tenders are saved, run again to continue.")
+        raise
+    pool.shutdown()
+
+    print_summary(len(todo), counts, stage_times, time.perf_counter() - started, gate.waited)
+    return counts
+
+
+def print_progress(done, total, elapsed, waited):
+    rate = done / elapsed if elapsed > 0 else 0.0
+    eta = (total - done) / rate if rate else float("inf")
+    print(f"  progress: {done}/{total} ({done / total:.0%})  {rate * 60:.1f} tenders/min  "
+          f"ETA {eta / 60:.1f} min  paused for chat: {waited:.0f} worker-s")
+
+
+def print_summary(total, counts, stage_times, elapsed, waited):
+    print("\nBackfill summary")
+    print(f"  tenders: {total}  updated: {counts['updated']}  with failures: {counts['failed']}  "
+          f"skipped (no index): {counts['skipped']}")
+    rate = counts["updated"] / elapsed if elapsed > 0 else 0.0
+    print(f"  elapsed: {elapsed:.1f}s  throughput: {rate * 60:.1f} tenders/min  "
+          f"paused for chat: {waited:.0f} worker-s")
+    for stage in STAGES:
+        times = stage_times.get(stage)
+        if times:
+            print(f"  {stage:<8} runs: {len(times):>5}  mean: {sum(times) / len(times):7.2f}s  "
+                  f"total: {sum(times):8.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES),
+                        help="stages to bring up to date (default: all)")
+    parser.add_argument("--workers", type=int, default=2, help="tenders processed in parallel")
+    parser.add_argument("--limit", type=int, default=None, help="update at most this many tenders")
+    parser.add_argument("--chat-quiet", type=float, default=30.0,
+                        help="seconds without a chat turn before model calls proceed (0 disables)")
+    parser.add_argument("--report-every", type=int, default=10, help="tenders between progress lines")
+    parser.add_argument("--dry-run", action="store_true", help="only report what is stale")
+    args = parser.parse_args()
+    backfill(stages=args.stages, workers=args.workers, limit=args.limit, chat_quiet=args.chat_quiet,
+             dry_run=args.dry_run, report_every=args.report_every)
+
+
+if __name__ == "__main__":
+    main()
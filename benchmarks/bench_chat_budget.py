@@ -0,0 +1,144 @@
+"""
+Chat turns with and without a latency budget, against a simulated model.
+
+A stand-in client answers ``generate`` after a delay that grows with the prompt and the
+answer length (capped by ``max_tokens``), with random jitter, and ``rerank`` after a
+fixed delay. The same conversation is replayed once without a deadline and once per
+deadline. Reports p50/p95 turn latency, the share of turns that met the deadline and how
+often each setting was degraded.
+
+    python benchmarks/bench_chat_budget.py
+    python benchmarks/bench_chat_budget.py --deadlines 800 1500 3000 --turns 60 --rerank
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_text import generate_pages  # noqa: E402
+
+QUESTIONS = [
+    "Wann ist die Abgabefrist?",
+    "Welche Schnittstellen und Migrationen werden gefordert?",
+    "Welche Haftungsregelungen und Vertragsstrafen gelten?",
+    "Wie sind Datenschutz und Vertraulichkeit geregelt?",
+    "Welche Referenzen muss der Bieter vorweisen?",
+]
+
+
+class SimulatedClient:
+    """Generation time: a fixed overhead plus per prompt and per output token, with jitter."""
+
+    class _Generation:
+        def __init__(self, text):
+            self.text = text
+
+    class _Response:
+        def __init__(self, text):
+            self.generations = [SimulatedClient._Generation(text)]
+
+    class _Result:
+        def __init__(self, index):
+            self.index = index
+
+    class _Reranked:
+        def __init__(self, indices):
+            self.results = [SimulatedClient._Result(i) for i in indices]
+
+    def __init__(self, rng, ms_per_output_token, ms_per_prompt_token, overhead_ms, rerank_ms):
+        self.rng = rng
+        self.ms_per_output_token = ms_per_output_token
+        self.ms_per_prompt_token = ms_per_prompt_token
+        self.overhead_ms = overhead_ms
+        self.rerank_ms = rerank_ms
+
+    def generate(self, prompt="", max_tokens=500, **kwargs):
+        wanted = self.rng.randint(60, 320)
+        tokens = min(wanted, max_tokens)
+        delay = (self.overhead_ms + self.ms_per_prompt_token * len(prompt) / 4
+                 + self.ms_per_output_token * tokens) * self.rng.uniform(0.85, 1.15)
+        time.sleep(delay / 1000)
+        return self._Response(" ".join(["Angabe"] * (tokens * 4 // 7)))
+
+    def rerank(self, query="", documents=(), top_n=5, **kwargs):
+        time.sleep(self.rerank_ms / 1000)
+        return self._Reranked(range(min(top_n, len(documents))))
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def run_conversation(db, deadline_ms, turns, rng):
+    from Conv_RAG import Conversation
+
+    conversation = Conversation(topic="general", initial_context="This is a general conversation.", db=db)
+    latencies, met, degraded = [], 0, {}
+    for i in range(turns):
+        question = f"{rng.choice(QUESTIONS)} ({i})"
+        started = time.perf_counter()
+        response = conversation.generate_response(question, deadline_ms)
+        elapsed = (time.perf_counter() - started) * 1000
+        latencies.append(elapsed)
+        if deadline_ms is not None:
+            met += elapsed <= deadline_ms
+            for entry in response["budget"]["degradations"]:
+                degraded[entry["setting"]] = degraded.get(entry["setting"], 0) + 1
+    return latencies, met, degraded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--deadlines", type=float, nargs="+", default=[1000, 2000, 4000])
+    parser.add_argument("--turns", type=int, default=40, help="chat turns per run")
+    parser.add_argument("--pages", type=int, default=60, help="pages of the generated tender")
+    parser.add_argument("--ms-per-output-token", type=float, default=8.0)
+    parser.add_argument("--ms-per-prompt-token", type=float, default=0.4)
+    parser.add_argument("--overhead-ms", type=float, default=150.0)
+    parser.add_argument("--rerank", action="store_true", help="include a simulated rerank stage in the full plan")
+    parser.add_argument("--rerank-ms", type=float, default=250.0)
+    args = parser.parse_args()
+
+    import chat_budget
+    import chunk_store
+    import llm
+    from chunker import chunk_pages
+    from embeddings import HashedNgramEmbeddings
+    from text_preprocessing import preprocess_text
+
+    if args.rerank:
+        chat_budget.RERANK_MODEL = "simulated"
+    rng = random.Random(0)
+    llm._client = SimulatedClient(rng, args.ms_per_output_token, args.ms_per_prompt_token,
+                                  args.overhead_ms, args.rerank_ms)
+
+    chunks = chunk_pages(generate_pages(args.pages, seed=1),
+                         preprocess=preprocess_text)
+    embedding = HashedNgramEmbeddings()
+    with tempfile.TemporaryDirectory() as workdir:
+        store = chunk_store.ChunkStore(os.path.join(workdir, "chunks.db"))
+        db = chunk_store.build_vector_store([c.text for c in chunks], [c.metadata for c in chunks],
+                                            embedding, store=store)
+
+        # One warm-up conversation so every run starts from measured stage estimates
+        run_conversation(db, None, 10, random.Random(2))
+
+        print(f"{'deadline':>9}{'turns':>7}{'p50 ms':>9}{'p95 ms':>9}{'met':>7}  degraded settings (turns)")
+        for deadline_ms in [None] + args.deadlines:
+            latencies, met, degraded = run_conversation(db, deadline_ms, args.turns, random.Random(3))
+            label = "none" if deadline_ms is None else f"{deadline_ms:.0f}"
+            met_share = "-" if deadline_ms is None else f"{met / args.turns:.0%}"
+            settings = ", ".join(f"{s} {n}" for s, n in degraded.items()) or "-"
+            print(f"{label:>9}{args.turns:>7}{percentile(latencies, 0.5):>9.0f}{percentile(latencies, 0.95):>9.0f}"
+                  f"{met_share:>7}  {settings}")
+        print(f"\nStage estimates: {chat_budget.stats()['estimates']}")
+
+
+if __name__ == "__main__":
+    main()
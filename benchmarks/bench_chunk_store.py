@@ -0,0 +1,133 @@
+"""
+Shared chunk store vs. one FAISS folder per tender, on a generated archive.
+
+Tenders are generated per buyer: every tender of a buyer repeats the buyer's legal and
+compliance boilerplate pages and adds its own project pages. Each tender is indexed
+twice with the local hashed n-gram embeddings: as a FAISS ``save_local`` folder and
+through chunk_store. The run checks that every query returns the same chunks, metadata
+and scores from both, then reports the dedup ratio, disk use, embedding calls saved and
+load times.
+
+    python benchmarks/bench_chunk_store.py
+    python benchmarks/bench_chunk_store.py --buyers 10 --tenders-per-buyer 8 --pages 20
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_text import HEADINGS, sentence  # noqa: E402
+
+QUESTIONS = [
+    "Welche Haftungsregelungen und Vertragsstrafen gelten?",
+    "Wann ist die Abgabefrist?",
+    "Welche Schnittstellen und Migrationen werden gefordert?",
+    "Wie sind Datenschutz und Vertraulichkeit geregelt?",
+]
+
+
+def boilerplate(buyer, pages):
+    rng = random.Random(f"buyer-{buyer}")
+    return [f"{i + 1} Rechtliche und Compliance-Anforderungen\n"
+            + "\n".join(sentence(rng) for _ in range(16)) for i in range(pages)]
+
+
+def tender_pages(buyer, number, pages, shared):
+    rng = random.Random(f"tender-{buyer}-{number}")
+    own = [f"{rng.randint(1, 9)}.{rng.randint(1, 9)} {rng.choice(HEADINGS)}\n"
+           + "\n".join(sentence(rng) for _ in range(16)) for _ in range(pages - len(shared))]
+    return list(enumerate(own + shared, start=1))
+
+
+def folder_bytes(folder):
+    return sum(entry.stat().st_size for entry in os.scandir(folder) if entry.is_file())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buyers", type=int, default=6)
+    parser.add_argument("--tenders-per-buyer", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=20, help="pages per tender")
+    parser.add_argument("--boilerplate-pages", type=int, default=8, help="pages every tender of a buyer shares")
+    args = parser.parse_args()
+
+    from langchain_community.vectorstores.faiss import FAISS
+
+    import chunk_store
+    from chunker import chunk_pages
+    from embeddings import HashedNgramEmbeddings
+    from tender_schema import SECTION_QUERIES
+    from text_preprocessing import preprocess_text
+
+    class CountingEmbeddings(HashedNgramEmbeddings):
+        texts_embedded = 0
+
+        def embed_documents(self, texts):
+            CountingEmbeddings.texts_embedded += len(texts)
+            return super().embed_documents(texts)
+
+    embedding = CountingEmbeddings()
+    queries = list(SECTION_QUERIES.values()) + QUESTIONS
+
+    with tempfile.TemporaryDirectory() as workdir:
+        store = chunk_store.ChunkStore(os.path.join(workdir, "chunks.db"))
+        legacy_root, shared_root = os.path.join(workdir, "legacy"), os.path.join(workdir, "shared")
+        tenders = []
+        legacy_embedded = 0
+        for buyer in range(args.buyers):
+            shared = boilerplate(buyer, args.boilerplate_pages)
+            for number in range(args.tenders_per_buyer):
+                chunks = chunk_pages(tender_pages(buyer, number, args.pages, shared), preprocess=preprocess_text)
+                texts, metadatas = [c.text for c in chunks], [c.metadata for c in chunks]
+                name = f"{buyer:03d}-{number:03d}"
+                tenders.append(name)
+
+                legacy_embedded += len(texts)
+                FAISS.from_texts(texts, embedding, metadatas=metadatas).save_local(os.path.join(legacy_root, name))
+                with contextlib.redirect_stdout(io.StringIO()):
+                    db = chunk_store.build_vector_store(texts, metadatas, embedding, store=store)
+                chunk_store.save(db, os.path.join(shared_root, name), store=store)
+        shared_embedded = CountingEmbeddings.texts_embedded - legacy_embedded
+
+        mismatches = 0
+        load_times = {"legacy": 0.0, "shared": 0.0}
+        for name in tenders:
+            started = time.perf_counter()
+            legacy = FAISS.load_local(os.path.join(legacy_root, name), embedding, allow_dangerous_deserialization=True)
+            load_times["legacy"] += time.perf_counter() - started
+            started = time.perf_counter()
+            shared = chunk_store.load(os.path.join(shared_root, name), embedding, store=store)
+            load_times["shared"] += time.perf_counter() - started
+            for query in queries:
+                a = legacy.similarity_search_with_score(query, k=5)
+                b = shared.similarity_search_with_score(query, k=5)
+                if [(d.page_content, d.metadata) for d, _ in a] != [(d.page_content, d.metadata) for d, _ in b] \
+                        or any(abs(x - y) > 1e-5 for (_, x), (_, y) in zip(a, b)):
+                    mismatches += 1
+
+        result = chunk_store.report(shared_root, store=store)
+        legacy_disk = sum(folder_bytes(os.path.join(legacy_root, name)) for name in tenders)
+
+        mb = 1024 * 1024
+        print(f"Archive: {len(tenders)} tenders from {args.buyers} buyers, {args.pages} pages each "
+              f"({args.boilerplate_pages} shared per buyer)")
+        print(f"Queries compared: {len(tenders) * len(queries)}  differing results: {mismatches}")
+        chunk_store.print_report(result)
+        print(f"Disk: {legacy_disk / mb:.1f} MB as FAISS folders, {result['disk_bytes'] / mb:.1f} MB shared "
+              f"({1 - result['disk_bytes'] / legacy_disk:.0%} less)")
+        print(f"Chunks embedded: {legacy_embedded} per tender, {shared_embedded} with the shared store")
+        print(f"Load time per tender: {load_times['legacy'] / len(tenders) * 1000:.1f} ms FAISS folder, "
+              f"{load_times['shared'] / len(tenders) * 1000:.1f} ms shared store")
+        if mismatches:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
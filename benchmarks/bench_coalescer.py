@@ -0,0 +1,120 @@
+"""
+Chat lookup throughput with and without request coalescing.
+
+Simulates concurrent analysts: each turn embeds one query (a stand-in with a fixed
+round-trip cost plus a small per-text cost, like a remote embedding API) and searches a
+FAISS index. Reports turns/sec, latency and the coalescer's batch-size metrics.
+
+    python benchmarks/bench_coalescer.py --users 16 --turns 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import coalescer  # noqa: E402
+
+
+class RemoteLikeEmbeddings(Embeddings):
+    """Deterministic embeddings with a simulated network round trip per call."""
+
+    def __init__(self, dim, round_trip_ms, per_text_ms, max_concurrent):
+        self.dim = dim
+        self.round_trip = round_trip_ms / 1000.0
+        self.per_text = per_text_ms / 1000.0
+        self.calls = 0
+        # Like an API key's concurrency limit or a small HTTP connection pool
+        self.connections = threading.Semaphore(max_concurrent)
+
+    def _vector(self, text):
+        rng = np.random.default_rng(abs(hash(text)) % (2 ** 32))
+        return rng.normal(size=self.dim).astype(np.float32).tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        with self.connections:
+            time.sleep(self.round_trip + self.per_text * len(texts))
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def build_store(embedding, chunks, dim):
+    import faiss
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores.faiss import FAISS
+    from langchain_core.documents import Document
+
+    rng = np.random.default_rng(0)
+    index = faiss.IndexFlatL2(dim)
+    index.add(rng.normal(size=(chunks, dim)).astype(np.float32))
+    docstore = InMemoryDocstore({str(i): Document(page_content=f"chunk {i}") for i in range(chunks)})
+    return FAISS(embedding, index, docstore, {i: str(i) for i in range(chunks)})
+
+
+def run(users, turns, turn_fn):
+    latencies = []
+    lock = threading.Lock()
+
+    def user(u):
+        for t in range(turns):
+            started = time.perf_counter()
+            turn_fn(f"user {u} frage {t}")
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=user, args=(u,)) for u in range(users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "turns_per_sec": len(latencies) / wall,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--round-trip-ms", type=float, default=40.0)
+    parser.add_argument("--per-text-ms", type=float, default=0.5)
+    parser.add_argument("--api-concurrency", type=int, default=4, help="concurrent embedding calls the API allows")
+    args = parser.parse_args()
+
+    embedding = RemoteLikeEmbeddings(args.dim, args.round_trip_ms, args.per_text_ms, args.api_concurrency)
+    db = build_store(embedding, args.chunks, args.dim)
+
+    direct = run(args.users, args.turns, lambda q: db.similarity_search(q, k=5))
+    direct_calls = embedding.calls
+    embedding.calls = 0
+    batched = run(args.users, args.turns, lambda q: coalescer.similarity_search(db, q, k=5))
+
+    print(f"{args.users} users x {args.turns} turns, {args.chunks} chunks, dim {args.dim}")
+    print(f"{'mode':<12}{'turns/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'embed calls':>13}")
+    for name, result, calls in (("direct", direct, direct_calls), ("coalesced", batched, embedding.calls)):
+        print(f"{name:<12}{result['turns_per_sec']:>10.1f}{result['p50_ms']:>10.1f}"
+              f"{result['p95_ms']:>10.1f}{calls:>13}")
+    for name, snapshot in coalescer.stats().items():
+        print(f"{name}: mean batch {snapshot['mean_batch_size']:.1f}, max {snapshot['max_batch_size']}, "
+              f"mean wait {snapshot['mean_queue_wait_ms']:.1f} ms, histogram {snapshot['batch_size_histogram']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+SQLite under concurrent dashboard reads, chat logging and ingestion.
+
+Runs the same workload against two fresh databases:
+
+- default: SQLite's rollback journal and default settings, chat turns committed one by
+  one in the request thread (the setup before database.py)
+- tuned:   database.py as the app uses it (WAL, tuned pragmas, sized pool) with chat
+  turns going through the batched write queue
+
+Workload: reader threads load the dashboard list and single tenders, chat threads log
+turns, and one ingest thread writes batches of tenders (with their portfolio aggregate
+updates). Reports ops/sec, p50/p95/p99 latency and "database is locked" errors per
+operation.
+
+    python benchmarks/bench_database.py
+    python benchmarks/bench_database.py --readers 8 --chatters 8 --duration 20
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from loadtest import synthetic_tender  # noqa: E402
+
+CONFIGS = {
+    # SQLAlchemy's default pool size for file databases
+    "default": {"SQLITE_PRAGMAS": {}, "SQLALCHEMY_ENGINE_OPTIONS": {"pool_size": 5, "max_overflow": 10},
+                "queued_chat_log": False},
+    "tuned": {"queued_chat_log": True},
+}
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def timed(self, operation, fn):
+        started = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            with self.lock:
+                key = "locked" if "locked" in str(e) else type(e).__name__
+                self.errors.setdefault(operation, {}).setdefault(key, 0)
+                self.errors[operation][key] += 1
+            return
+        with self.lock:
+            self.samples.setdefault(operation, []).append(time.perf_counter() - started)
+
+
+def make_app(workdir, name, overrides):
+    from app import create_app
+
+    config = {"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(workdir, name + '.db')}",
+              "UPLOAD_FOLDER": os.path.join(workdir, "uploads")}
+    config.update({k: v for k, v in overrides.items() if k.isupper()})
+    return create_app(config)
+
+
+def seed(app, tenders, rng):
+    from extensions import db
+    from models import Tender
+
+    with app.app_context():
+        db.session.add_all([tender_row(f"Ausschreibung {i:05d}", rng) for i in range(tenders)])
+        db.session.commit()
+        return [t.id for t in Tender.query.with_entities(Tender.id)]
+
+
+def tender_row(name, rng):
+    from models import Tender
+
+    data, metrics = synthetic_tender(0, rng)
+    return Tender(name=name, json_data=json.dumps(data, ensure_ascii=False), metrics=json.dumps(metrics))
+
+
+def run(app, queued_chat_log, tender_ids, args, seed_value):
+    import database
+    from extensions import db
+    from models import ChatLog, Tender
+
+    recorder = Recorder()
+    stop = threading.Event()
+
+    def reader(rng):
+        with app.app_context():
+            while not stop.is_set():
+                recorder.timed("dashboard", lambda: Tender.query.with_entities(Tender.id, Tender.name).all())
+                recorder.timed("tender", lambda: db.session.get(Tender, rng.choice(tender_ids)).json_data)
+                db.session.remove()
+
+    def chatter(rng):
+        def log_turn():
+            values = dict(tender_id=rng.choice(tender_ids), conversation_type="topic", topic="Übersicht",
+                          question="Wann ist die Abgabefrist?", answer="Laut Ausschreibung [1] ...",
+                          latency_ms=rng.uniform(200, 900))
+            if queued_chat_log:
+                database.enqueue(ChatLog, **values)
+            else:
+                db.session.add(ChatLog(**values))
+                db.session.commit()
+
+        with app.app_context():
+            while not stop.is_set():
+                recorder.timed("chat_log", log_turn)
+                db.session.rollback()
+                time.sleep(args.chat_interval)
+
+    def ingester(rng):
+        def write_batch():
+            db.session.add_all([tender_row(f"Ingest {rng.random():.8f}", rng) for _ in range(args.batch)])
+            db.session.commit()
+
+        with app.app_context():
+            while not stop.is_set():
+                recorder.timed("ingest_batch", write_batch)
+                db.session.rollback()
+                time.sleep(args.ingest_interval)
+
+    threads = [threading.Thread(target=reader, args=(random.Random(seed_value + i),)) for i in range(args.readers)]
+    threads += [threading.Thread(target=chatter, args=(random.Random(seed_value + 100 + i),))
+                for i in range(args.chatters)]
+    threads.append(threading.Thread(target=ingester, args=(random.Random(seed_value + 200),)))
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    if queued_chat_log:
+        with app.app_context():
+            database.write_queue().flush(30)
+            print(f"  write queue: {database.write_queue().stats()}")
+    return recorder, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenders", type=int, default=2000, help="tenders seeded before the run")
+    parser.add_argument("--readers", type=int, default=6, help="dashboard reader threads")
+    parser.add_argument("--chatters", type=int, default=6, help="chat logging threads")
+    parser.add_argument("--chat-interval", type=float, default=0.005, help="seconds between a thread's chat turns")
+    parser.add_argument("--batch", type=int, default=20, help="tenders per ingest batch")
+    parser.add_argument("--ingest-interval", type=float, default=0.05, help="seconds between ingest batches")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per configuration")
+    args = parser.parse_args()
+
+    print(f"{'config':<9}{'operation':<14}{'ops':>7}{'ops/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, overrides in CONFIGS.items():
+            app = make_app(workdir, name, overrides)
+            tender_ids = seed(app, args.tenders, random.Random(0))
+            recorder, wall = run(app, overrides["queued_chat_log"], tender_ids, args, seed_value=1)
+            for operation in ("dashboard", "tender", "chat_log", "ingest_batch"):
+                latencies = sorted(recorder.samples.get(operation, []))
+                errors = sum(recorder.errors.get(operation, {}).values())
+                print(f"{name:<9}{operation:<14}{len(latencies):>7}{len(latencies) / wall:>9.1f}"
+                      f"{percentile(latencies, 0.5) * 1000:>9.1f}{percentile(latencies, 0.95) * 1000:>9.1f}"
+                      f"{percentile(latencies, 0.99) * 1000:>9.1f}{errors:>8}")
+            if recorder.errors:
+                print(f"  errors: {recorder.errors}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Archive churn (tenders deleted and added) with and without chunk store compaction.
+
+Builds an archive of generated tenders (buyers repeat their boilerplate pages, like in
+bench_chunk_store.py), then runs rounds in which a random tender is deleted (its chunk
+references released and its folder removed, as deletion.py does) and a new one is added.
+The same churn runs twice on fresh stores:
+
+- none:      released chunks stay as tombstones
+- compactor: ``chunk_store.Compactor.run_once`` after every deletion, which compacts once
+             tombstones pass ``COMPACT_RATIO`` of the stored bytes
+
+Reports the chunk database size and tombstones after the churn, the compactions run and
+the disk they reclaimed, and the latency of loading a live tender's vector store and
+searching it in the first and last quarter of the rounds.
+
+    python benchmarks/bench_deletion.py
+    python benchmarks/bench_deletion.py --tenders 60 --rounds 200 --ratio 0.1
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_chunk_store import QUESTIONS, boilerplate, tender_pages  # noqa: E402
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def run(mode, args, workdir, embedding):
+    import chunk_store
+    from chunker import chunk_pages
+    from text_preprocessing import preprocess_text
+
+    path = os.path.join(workdir, mode, "chunks.db")
+    os.makedirs(os.path.dirname(path))
+    store = chunk_store.get_store(path)
+    compactor = chunk_store.Compactor(store_path=path, ratio=args.ratio)
+    rng = random.Random(0)
+    numbers = {}
+
+    def add(name, buyer):
+        numbers[buyer] = numbers.get(buyer, 0) + 1
+        chunks = chunk_pages(tender_pages(buyer, numbers[buyer], args.pages, boilerplate(buyer, args.boilerplate_pages)),
+                             preprocess=preprocess_text)
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = chunk_store.build_vector_store([c.text for c in chunks], [c.metadata for c in chunks], embedding,
+                                                store=store)
+        chunk_store.save(db, os.path.join(workdir, mode, name), store=store)
+
+    live = []
+    for i in range(args.tenders):
+        live.append((f"t{i:05d}", i % args.buyers))
+        add(*live[-1])
+    start_bytes = store.disk_bytes()
+
+    latencies = []  # (round, load ms, search ms)
+    for round_no in range(args.rounds):
+        name, _ = live.pop(rng.randrange(len(live)))
+        folder = os.path.join(workdir, mode, name)
+        store.release(folder)
+        shutil.rmtree(folder)
+        if mode == "compactor":
+            compactor.run_once()
+        # New tenders mostly come from new buyers, so deleted chunks are rarely reused
+        buyer = rng.randrange(args.buyers) if rng.random() < 0.3 else args.buyers + round_no
+        live.append((f"t{args.tenders + round_no:05d}", buyer))
+        add(*live[-1])
+
+        name, _ = rng.choice(live)
+        started = time.perf_counter()
+        db = chunk_store.load(os.path.join(workdir, mode, name), embedding, store=store)
+        loaded = time.perf_counter()
+        db.similarity_search_with_score(rng.choice(QUESTIONS), k=5)
+        latencies.append((round_no, (loaded - started) * 1000, (time.perf_counter() - loaded) * 1000))
+
+    tombstones, dead_bytes, _ = store.tombstones()
+    return {"start_bytes": start_bytes, "end_bytes": store.disk_bytes(), "tombstones": tombstones,
+            "dead_bytes": dead_bytes, "compactor": compactor.counts, "latencies": latencies}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenders", type=int, default=40, help="tenders in the archive")
+    parser.add_argument("--rounds", type=int, default=120, help="deletions, each followed by a new tender")
+    parser.add_argument("--buyers", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=16, help="pages per tender")
+    parser.add_argument("--boilerplate-pages", type=int, default=6, help="pages every tender of a buyer shares")
+    parser.add_argument("--ratio", type=float, default=None, help="tombstone ratio that triggers a compaction")
+    args = parser.parse_args()
+
+    import chunk_store
+    from embeddings import HashedNgramEmbeddings
+
+    args.ratio = chunk_store.COMPACT_RATIO if args.ratio is None else args.ratio
+    embedding = HashedNgramEmbeddings()
+    mb = 1024 * 1024
+    quarter = max(1, args.rounds // 4)
+    print(f"Archive: {args.tenders} tenders of {args.pages} pages, {args.rounds} rounds of churn, "
+          f"compaction at {args.ratio:.0%} tombstones")
+    print(f"{'mode':<10}{'start MB':>9}{'end MB':>8}{'tombstones':>11}{'runs':>6}{'reclaimed MB':>13}"
+          f"{'load p50/p95 first':>20}{'last':>13}{'search p50/p95 first':>22}{'last':>13}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in ("none", "compactor"):
+            result = run(mode, args, workdir, embedding)
+            first = [entry for entry in result["latencies"] if entry[0] < quarter]
+            last = [entry for entry in result["latencies"] if entry[0] >= args.rounds - quarter]
+
+            def p(entries, column):
+                values = [entry[column] for entry in entries]
+                return f"{percentile(values, 0.5):.1f}/{percentile(values, 0.95):.1f}"
+
+            print(f"{mode:<10}{result['start_bytes'] / mb:>9.1f}{result['end_bytes'] / mb:>8.1f}"
+                  f"{result['tombstones']:>11}{result['compactor']['runs']:>6}"
+                  f"{result['compactor']['bytes_reclaimed'] / mb:>13.1f}"
+                  f"{p(first, 1):>20}{p(last, 1):>13}{p(first, 2):>22}{p(last, 2):>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Latency and throughput of the embedding backends.
+
+For each backend (the local hashed n-gram backend at several thread pool sizes, and
+Cohere when ``COHERE_API_KEY`` is set):
+
+- query:   single-query latency (p50/p95) over short chat questions
+- batch:   documents/sec embedding the chunks of a generated tender corpus
+- recall:  share of chunks that a 300-character excerpt of their own text retrieves at
+           rank 1, as a rough check that a backend still separates the chunks (the
+           generated corpus has a tiny vocabulary, so this is a lower bound)
+
+    python benchmarks/bench_embeddings.py
+    python benchmarks/bench_embeddings.py --pages 200 --workers 1 4 8 --queries 200
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_text import generate_pages  # noqa: E402
+from chunker import chunk_pages  # noqa: E402
+from embeddings import HashedNgramEmbeddings, get_embeddings  # noqa: E402
+from text_preprocessing import preprocess_text  # noqa: E402
+
+QUESTIONS = [
+    "Wann ist die Abgabefrist?",
+    "Welche Schnittstellen werden gefordert?",
+    "Wie hoch ist das Budget für die Wartung?",
+    "Welche Anforderungen gelten für den Datenschutz?",
+    "Gibt es eine Schulung für die Anwender?",
+]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def bench_queries(embedding, count):
+    latencies = []
+    for i in range(count):
+        started = time.perf_counter()
+        embedding.embed_query(f"{QUESTIONS[i % len(QUESTIONS)]} ({i})")
+        latencies.append((time.perf_counter() - started) * 1000)
+    return percentile(latencies, 0.5), percentile(latencies, 0.95)
+
+
+def bench_batch(embedding, texts):
+    started = time.perf_counter()
+    vectors = embedding.embed_documents(texts)
+    elapsed = time.perf_counter() - started
+    return len(texts) / elapsed, np.asarray(vectors, dtype=np.float32)
+
+
+def self_recall(embedding, texts, vectors, sample=200):
+    step = max(1, len(texts) // sample)
+    indices = list(range(0, len(texts), step))
+    queries = [texts[i][len(texts[i]) // 3:len(texts[i]) // 3 + 300] for i in indices]
+    query_vectors = np.asarray(embedding.embed_documents(queries), dtype=np.float32)
+    best = np.argmax(query_vectors @ vectors.T, axis=1)
+    return float(np.mean(best == np.asarray(indices)))
+
+
+def backends(workers):
+    for count in workers:
+        yield f"local:hashed-ngram ({count} thr)", HashedNgramEmbeddings(workers=count)
+    if os.getenv("COHERE_API_KEY"):
+        yield "cohere:embed-multilingual-v2.0", get_embeddings("cohere:embed-multilingual-v2.0")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=100, help="pages of the generated corpus")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="thread pool sizes for the local backend")
+    parser.add_argument("--queries", type=int, default=100, help="single queries to time")
+    args = parser.parse_args()
+
+    texts = [chunk.text for chunk in chunk_pages(generate_pages(args.pages), preprocess=preprocess_text)]
+    chars = sum(len(t) for t in texts)
+    print(f"Corpus: {args.pages} pages, {len(texts)} chunks, {chars // 1000}k chars\n")
+
+    print(f"{'backend':<34}{'query p50 ms':>13}{'p95 ms':>9}{'docs/s':>10}{'recall@1':>10}")
+    for name, embedding in backends(args.workers):
+        p50, p95 = bench_queries(embedding, args.queries)
+        docs_per_sec, vectors = bench_batch(embedding, texts)
+        recall = self_recall(embedding, texts, vectors)
+        print(f"{name:<34}{p50:>13.2f}{p95:>9.2f}{docs_per_sec:>10.0f}{recall:>10.2f}")
+    if not os.getenv("COHERE_API_KEY"):
+        print("\n(set COHERE_API_KEY to include the Cohere backend)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Near-duplicate lookup with the MinHash LSH index vs. comparing against every tender.
+
+Generates an archive in which some tenders are republished with small edits (a few
+sentences changed, a page added or dropped), stores their signatures in a fresh database
+through the ``Tender`` model (so the LSH bands are written by the session event) and
+then, for every republished tender, looks up its most similar earlier tenders:
+
+- lsh:   near_duplicates.find_similar (bucket lookup, then compare the candidates)
+- brute: the signature of every tender compared in Python
+
+Reports lookup latency, how many signatures each lookup compared, and recall/precision
+of the pairs at or above REUSE_THRESHOLD against the exact Jaccard similarity.
+
+    python benchmarks/bench_near_duplicates.py
+    python benchmarks/bench_near_duplicates.py --tenders 5000 --republished 200
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_text import HEADINGS, sentence  # noqa: E402
+
+
+def document(rng, pages):
+    return [f"{rng.randint(1, 9)}.{rng.randint(1, 9)} {rng.choice(HEADINGS)}\n"
+            + "\n".join(sentence(rng) for _ in range(14)) for _ in range(pages)]
+
+
+def republish(pages, rng, edits):
+    """A copy of ``pages`` with ``edits`` sentences replaced and maybe a page added or dropped."""
+    pages = [page.split("\n") for page in pages]
+    for _ in range(edits):
+        page = rng.choice(pages)
+        page[rng.randrange(1, len(page))] = sentence(rng)
+    if rng.random() < 0.3:
+        pages.pop(rng.randrange(len(pages)))
+    elif rng.random() < 0.3:
+        pages.append([sentence(rng) for _ in range(14)])
+    return ["\n".join(page) for page in pages]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenders", type=int, default=2000, help="original tenders in the archive")
+    parser.add_argument("--republished", type=int, default=100, help="tenders republished with small edits")
+    parser.add_argument("--pages", type=int, default=12, help="pages per tender")
+    parser.add_argument("--max-edits", type=int, default=12, help="sentences changed in a republished tender")
+    args = parser.parse_args()
+
+    import near_duplicates
+    from app import create_app
+    from extensions import db
+    from models import Tender
+    from text_preprocessing import preprocess_text
+
+    rng = random.Random(0)
+    originals = [document(rng, args.pages) for _ in range(args.tenders)]
+    republished = [(i, republish(originals[i], rng, rng.randint(1, args.max_edits)))
+                   for i in rng.sample(range(args.tenders), args.republished)]
+
+    started = time.perf_counter()
+    signatures = [near_duplicates.to_bytes(near_duplicates.signature(preprocess_text(p) for p in pages))
+                  for pages in originals]
+    signature_ms = (time.perf_counter() - started) * 1000 / len(originals)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+                          "UPLOAD_FOLDER": os.path.join(workdir, "uploads")})
+        with app.app_context():
+            started = time.perf_counter()
+            db.session.add_all([Tender(name=f"Ausschreibung {i:05d}", json_data="{}", minhash=sig)
+                                for i, sig in enumerate(signatures)])
+            db.session.commit()
+            insert_ms = (time.perf_counter() - started) * 1000 / len(originals)
+            ids = [tender_id for (tender_id,) in db.session.query(Tender.id).order_by(Tender.id)]
+            stored = dict(zip(ids, signatures))
+
+            times = {"lsh": [], "brute": []}
+            compared = []
+            found = {"lsh": set(), "brute": set()}
+            truth = set()
+            for original, pages in republished:
+                sig = near_duplicates.to_bytes(near_duplicates.signature(preprocess_text(p) for p in pages))
+                exact = jaccard(near_duplicates.shingles(preprocess_text(p) for p in originals[original]),
+                                near_duplicates.shingles(preprocess_text(p) for p in pages))
+                if exact >= near_duplicates.REUSE_THRESHOLD:
+                    truth.add(original)
+
+                started = time.perf_counter()
+                matches = near_duplicates.find_similar(sig, limit=5)
+                times["lsh"].append((time.perf_counter() - started) * 1000)
+                compared.append(len(candidates_of(sig)))
+                found["lsh"].update(ids.index(m.id) for m in matches
+                                    if m.similarity >= near_duplicates.REUSE_THRESHOLD)
+
+                started = time.perf_counter()
+                scores = sorted(((near_duplicates.similarity(sig, other), tender_id)
+                                 for tender_id, other in stored.items()), reverse=True)[:5]
+                times["brute"].append((time.perf_counter() - started) * 1000)
+                found["brute"].update(ids.index(tender_id) for score, tender_id in scores
+                                      if score >= near_duplicates.REUSE_THRESHOLD)
+
+    print(f"Archive: {args.tenders} tenders of {args.pages} pages, {args.republished} republished with edits")
+    print(f"Signature: {signature_ms:.1f} ms per tender, insert with bands: {insert_ms:.2f} ms per tender")
+    print(f"True near-duplicates (exact Jaccard >= {near_duplicates.REUSE_THRESHOLD}): {len(truth)}")
+    print(f"{'method':<7}{'p50 ms':>9}{'p95 ms':>9}{'compared':>10}{'recall':>9}{'precision':>11}")
+    for method in ("lsh", "brute"):
+        hits = found[method]
+        recall = len(hits & truth) / len(truth) if truth else 1.0
+        precision = len(hits & truth) / len(hits) if hits else 1.0
+        mean_compared = sum(compared) / len(compared) if method == "lsh" else args.tenders
+        print(f"{method:<7}{percentile(times[method], 0.5):>9.2f}{percentile(times[method], 0.95):>9.2f}"
+              f"{mean_compared:>10.1f}{recall:>9.0%}{precision:>11.0%}")
+
+
+def jaccard(a, b):
+    a, b = set(a.tolist()), set(b.tolist())
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+def candidates_of(sig):
+    import sqlalchemy as sa
+
+    import near_duplicates
+    from extensions import db
+    from models import TenderBand
+
+    return db.session.execute(
+        sa.select(TenderBand.tender_id).distinct()
+        .where(TenderBand.bucket.in_([bucket for _, bucket in near_duplicates.buckets(sig)]))
+    ).scalars().all()
+
+
+if __name__ == "__main__":
+    main()
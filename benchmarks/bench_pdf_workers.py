@@ -0,0 +1,126 @@
+"""
+PDF parsing in the web process vs. in the pdf_workers pool.
+
+Builds a large PDF by repeating the pages of the given one, then parses it repeatedly on
+background threads (like concurrent uploads) while the main thread serves a stand-in
+request: serialising a tender's JSON, every few milliseconds. Parsed in-process, pypdf
+competes with the requests for the interpreter; in the pool it runs in other processes.
+Reports request latency, the time per parsed document, and the watchdog counters of a
+run with a time limit below the parse time.
+
+    python benchmarks/bench_pdf_workers.py path/to/tender.pdf
+    python benchmarks/bench_pdf_workers.py path/to/tender.pdf --repeat 20 --uploads 2
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def build_pdf(source, repeat, path):
+    from pypdf import PdfReader, PdfWriter
+
+    reader = PdfReader(source)
+    writer = PdfWriter()
+    for _ in range(repeat):
+        for page in reader.pages:
+            writer.add_page(page)
+    with open(path, "wb") as f:
+        writer.write(f)
+    return len(reader.pages) * repeat
+
+
+def serve_requests(stop, payload):
+    """
+    Latencies (ms) of stand-in requests, one every 5 ms until ``stop`` is set, measured
+    from when the request was due, so waiting for the interpreter counts.
+    """
+    latencies = []
+    while not stop.is_set():
+        due = time.perf_counter() + 0.005
+        time.sleep(0.005)
+        json.loads(json.dumps(payload))
+        latencies.append((time.perf_counter() - due) * 1000)
+    return latencies
+
+
+def run(load, path, uploads, documents):
+    payload = {f"field {i}": {"value": "x" * 200, "pages": list(range(10))} for i in range(200)}
+    stop = threading.Event()
+    parse_times = []
+
+    def upload():
+        for _ in range(documents):
+            started = time.perf_counter()
+            load(path)
+            parse_times.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=upload) for _ in range(uploads)]
+    result = {}
+    server = threading.Thread(target=lambda: result.setdefault("latencies", serve_requests(stop, payload)))
+    server.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stop.set()
+    server.join()
+    return result["latencies"], parse_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", help="a text PDF whose pages are repeated")
+    parser.add_argument("--repeat", type=int, default=10, help="copies of the PDF's pages in the test document")
+    parser.add_argument("--uploads", type=int, default=2, help="concurrent uploads")
+    parser.add_argument("--documents", type=int, default=3, help="documents parsed per upload")
+    args = parser.parse_args()
+
+    import pdf_workers
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "large.pdf")
+        pages = build_pdf(args.pdf, args.repeat, path)
+        pdf_workers.parse(path)  # import the loader before timing
+
+        idle, _ = run(lambda p: time.sleep(2), path, 1, 1)
+        pool = pdf_workers.PDFWorkerPool(size=args.uploads)
+        pool.load_pages(path)  # start the workers
+        results = {"idle": (idle, []),
+                   "in-process": run(pdf_workers.parse, path, args.uploads, args.documents),
+                   "pool": run(pool.load_pages, path, args.uploads, args.documents)}
+        pool.shutdown()
+
+        print(f"Document: {pages} pages, {args.uploads} concurrent upload(s) x {args.documents} document(s)")
+        print(f"{'parsing':<12}{'requests':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'s per doc':>11}")
+        for name, (latencies, parse_times) in results.items():
+            per_doc = f"{sum(parse_times) / len(parse_times):.2f}" if parse_times else "-"
+            print(f"{name:<12}{len(latencies):>9}{percentile(latencies, 0.5):>9.2f}"
+                  f"{percentile(latencies, 0.95):>9.2f}{percentile(latencies, 0.99):>9.2f}{per_doc:>11}")
+
+        limit = max(0.05, min(results["pool"][1]) / 4)
+        watchdog = pdf_workers.PDFWorkerPool(size=1, timeout=limit)
+        for _ in range(2):
+            try:
+                watchdog.load_pages(path)
+            except pdf_workers.PDFParseError:
+                pass
+        watchdog.shutdown()
+        stats = watchdog.stats()
+        print(f"\nWith a {limit:.2f} s time limit: {stats['timeouts']} timeout(s), "
+              f"{stats['oom_kills']} memory kill(s), {stats['workers_started']} worker(s) started")
+
+
+if __name__ == "__main__":
+    main()
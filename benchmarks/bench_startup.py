@@ -0,0 +1,90 @@
+"""
+Startup benchmark: import time and RSS of a fresh worker process.
+
+Each scenario runs in its own interpreter so nothing is shared between runs.
+
+    python benchmarks/bench_startup.py               # print a table
+    python benchmarks/bench_startup.py --runs 5 --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the child interpreter and prints one JSON line
+PROBE = r'''
+import json, os, resource, sys, time
+t0 = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - t0
+
+def current_rss_kb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        return None
+
+max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == "darwin":
+    max_rss //= 1024  # bytes on macOS, kilobytes on Linux
+print(json.dumps({{"seconds": elapsed, "rss_kb": current_rss_kb(), "max_rss_kb": max_rss,
+                  "modules": len(sys.modules)}}))
+'''
+
+SCENARIOS = {
+    "import app": "import app",
+    "create_app()": "import app\napp.create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})",
+    "create_app() + prewarm": (
+        "import app\n"
+        "app.create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'PREWARM': '1'})"
+    ),
+}
+
+
+def run_scenario(body):
+    env = dict(os.environ, TENDERMIND_PREWARM="0")
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(body=body)],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "probe failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="runs per scenario (median is reported)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    report = {}
+    print(f"{'scenario':<26}{'import s':>10}{'rss MB':>10}{'max rss MB':>12}{'modules':>9}")
+    for name, body in SCENARIOS.items():
+        try:
+            runs = [run_scenario(body) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{name:<26}  failed: {e}")
+            continue
+        row = {
+            "seconds": statistics.median(r["seconds"] for r in runs),
+            "rss_kb": statistics.median(r["rss_kb"] or 0 for r in runs),
+            "max_rss_kb": statistics.median(r["max_rss_kb"] for r in runs),
+            "modules": runs[-1]["modules"],
+        }
+        report[name] = row
+        print(f"{name:<26}{row['seconds']:>10.3f}{row['rss_kb'] / 1024:>10.1f}"
+              f"{row['max_rss_kb'] / 1024:>12.1f}{row['modules']:>9}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
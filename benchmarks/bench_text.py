@@ -0,0 +1,258 @@
+"""
+Micro-benchmarks for the CPU-bound text handling on generated German tender corpora.
+
+Cases (each measured on corpora of increasing size):
+
+- preprocess:   text_preprocessing.preprocess_text vs. the previous per-module version
+- split:        the RecursiveCharacterTextSplitter configuration of complexity.py vs.
+                the structure-aware chunker.chunk_pages
+- assessment:   complexity.parse_assessment vs. the previous inline DOTALL regex loop
+- nulls:        tender_schema.fill_nulls vs. the previous re.sub(r'\\bnull\\b', ...) pass
+
+Reports ops/sec and allocations per op (tracemalloc peak and retained memory). Every run
+is appended to a JSON lines history file together with the git revision, so changes
+can be tracked over time; the report shows the change against the previous run.
+
+    python benchmarks/bench_text.py
+    python benchmarks/bench_text.py --pages 10 100 1000 --min-time 0.5
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from chunker import chunk_pages  # noqa: E402
+from complexity import parse_assessment  # noqa: E402
+from tender_schema import NOT_PROVIDED, fill_nulls, iter_field_paths, set_field  # noqa: E402
+from text_preprocessing import preprocess_text  # noqa: E402
+
+DEFAULT_HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "bench_text.jsonl")
+
+WORDS = ("die der das und für mit von Auftraggeber Auftragnehmer Leistung Anforderungen "
+         "Schnittstelle Wartung Betrieb Angebot Vergabe Zuschlag Frist Lieferung Software "
+         "Lizenzen Datenschutz Verfügbarkeit Dokumentation Schulung Migration Abnahme "
+         "Projektleitung Konfiguration Sicherheitskonzept Rahmenvertrag Preisblatt").split()
+HEADINGS = ["Allgemeine Anforderungen", "Technische Spezifikationen", "Leistungsbeschreibung",
+            "Zahlungsbedingungen", "Support und Wartung", "Einreichungsrichtlinien"]
+
+
+# --- Previous implementations, kept verbatim as the comparison baseline ---------------
+
+def legacy_preprocess_text(text):
+    text = re.sub(r'\n+', ' ', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    text = re.sub(r'Page \d+', '', text)
+    text = re.sub(r'Ausschreibungsdokument.*', '', text)
+    text = re.sub(r'([a-z])-\s+([a-z])', r'\1\2', text)
+    text = re.sub(r'(\S)- (\S)', r'\1\2', text)
+    text = re.sub(r'([a-zA-Z])\s*\n\s*([a-zA-Z])', r'\1 \2', text)
+    return text
+
+
+def legacy_parse_assessment(generated_text):
+    factors = {}
+    factor_patterns = {
+        'Complexity': r'Complexity:\s*Ratings?:\s*([^\n]+)\s*Verification\s+Sentence:\s*(.*?)(?=\n\S|\Z)',
+        'Scalability': r'Scalability:\s*Ratings?:\s*([^\n]+)\s*Verification\s+Sentence:\s*(.*?)(?=\n\S|\Z)',
+        'Integration Requirements': r'Integration\s*Requirements:\s*Ratings?:\s*([^\n]+)\s*Verification\s+Sentence:\s*(.*?)(?=\n\S|\Z)',
+        'Time Feasibility': r'Time\s*Feasibility:\s*Ratings?:\s*([^\n]+)\s*Verification\s+Sentence:\s*(.*?)(?=\n\S|\Z)',
+        'Days Left to Submit the Proposal': r'Days\s*Left\s*to\s*Submit\s*the\s*Proposal:\s*(.*)'
+    }
+    for factor, pat in factor_patterns.items():
+        match = re.search(pat, generated_text, re.DOTALL)
+        if match:
+            if factor != 'Days Left to Submit the Proposal':
+                rating = match.group(1).strip()
+                verification_sentence = match.group(2).strip()
+                if len(verification_sentence.split()) > 20:
+                    verification_sentence = "Verification sentence exceeds 20 words."
+                factors[factor] = {'Rating': rating, 'Verification Sentence': verification_sentence}
+            else:
+                factors[factor] = match.group(1).strip()
+        else:
+            if factor != 'Days Left to Submit the Proposal':
+                factors[factor] = {'Rating': 'Not Available', 'Verification Sentence': 'Not Available'}
+            else:
+                factors[factor] = 'Not Available'
+    return factors
+
+
+def legacy_fill_nulls(data):
+    return json.loads(re.sub(r'\bnull\b', f'"{NOT_PROVIDED}"', json.dumps(data, ensure_ascii=False)))
+
+
+def legacy_split(pages):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=10, length_function=len,
+                                              is_separator_regex=False)
+    chunks = []
+    for _, content in pages:
+        chunks.extend(splitter.split_text(legacy_preprocess_text(content)))
+    return chunks
+
+
+# --- Corpora -----------------------------------------------------------------------
+
+def sentence(rng):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 22))]
+    if rng.random() < 0.3:
+        # A word hyphenated across a line break, as PDF extraction produces it
+        i = rng.randrange(len(words))
+        word = words[i]
+        if len(word) > 6:
+            words[i] = f"{word[:3]}-\n{word[3:]}"
+    return " ".join(words).capitalize() + "."
+
+
+def generate_pages(count, seed=0):
+    rng = random.Random(seed)
+    pages = []
+    for number in range(1, count + 1):
+        lines = [f"Page {number}"]
+        if rng.random() < 0.4:
+            lines.append(f"{rng.randint(1, 9)}.{rng.randint(1, 9)} {rng.choice(HEADINGS)}")
+        for _ in range(rng.randint(12, 20)):
+            lines.append(sentence(rng) + ("\n" if rng.random() < 0.2 else ""))
+        lines.append(f"Ausschreibungsdokument Vergabe {number} von {count}")
+        pages.append((number, "\n".join(lines)))
+    return pages
+
+
+def generate_assessment(rng, padding):
+    filler = " ".join(rng.choice(WORDS) for _ in range(padding))
+    return (f"{filler}\n\nComplexity:\nRatings: [High]\nVerification Sentence: Viele Schnittstellen.\n\n"
+            f"Scalability:\nRatings: [Moderate]\nVerification Sentence: Wachstum ist geplant.\n\n"
+            f"Integration Requirements:\nRatings: [High]\nVerification Sentence: SAP und CRM.\n\n"
+            f"Time Feasibility:\nRatings: [Feasible]\nVerification Sentence: Zwölf Monate Laufzeit.\n\n"
+            f"Days Left to Submit the Proposal: 21\n")
+
+
+def generate_extraction(rng, repeat):
+    data = {}
+    for path in iter_field_paths():
+        value = None if rng.random() < 0.3 else " ".join(rng.choice(WORDS) for _ in range(20 * repeat))
+        set_field(data, path, value)
+    return data
+
+
+# --- Measurement -------------------------------------------------------------------
+
+def measure(fn, arg, min_time):
+    fn(arg)  # warm caches (compiled patterns, imports)
+    runs = 0
+    started = time.perf_counter()
+    while True:
+        fn(arg)
+        runs += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+
+    tracemalloc.start()
+    fn(arg)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"ops_per_sec": runs / elapsed, "peak_kb": peak / 1024, "retained_kb": current / 1024}
+
+
+def cases(page_counts):
+    rng = random.Random(1)
+    for pages in page_counts:
+        corpus = generate_pages(pages)
+        chars = sum(len(text) for _, text in corpus)
+        size = f"{pages}p/{chars // 1000}k"
+
+        def run_preprocess(fn):
+            return lambda docs: [fn(text) for _, text in docs]
+
+        yield "preprocess", size, corpus, run_preprocess(legacy_preprocess_text), run_preprocess(preprocess_text)
+        yield ("split", size, corpus, legacy_split,
+               lambda docs: chunk_pages(docs, preprocess=preprocess_text))
+
+    for padding in (200, 2000, 20000):
+        text = generate_assessment(rng, padding)
+        yield "assessment", f"{len(text) // 1000}k", text, legacy_parse_assessment, parse_assessment
+    for repeat in (1, 10, 100):
+        data = generate_extraction(rng, repeat)
+        yield "nulls", f"x{repeat}", data, legacy_fill_nulls, fill_nulls
+
+
+def check_equivalence(page_counts):
+    corpus = generate_pages(max(page_counts), seed=99)
+    for _, text in corpus:
+        assert preprocess_text(text) == legacy_preprocess_text(text), "preprocess_text output changed"
+    text = generate_assessment(random.Random(2), 500)
+    assert parse_assessment(text) == legacy_parse_assessment(text), "parse_assessment output changed"
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_previous(history_path):
+    if not os.path.exists(history_path):
+        return {}
+    last = None
+    with open(history_path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                last = json.loads(line)
+    return {(r["case"], r["size"], r["impl"]): r for r in last["results"]} if last else {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 1000], help="corpus sizes in pages")
+    parser.add_argument("--min-time", type=float, default=0.3, help="seconds per measurement")
+    parser.add_argument("--history", default=DEFAULT_HISTORY, help="JSON lines file runs are appended to")
+    parser.add_argument("--no-save", action="store_true", help="do not append this run to the history")
+    args = parser.parse_args()
+
+    check_equivalence(args.pages)
+    previous = load_previous(args.history)
+
+    results = []
+    print(f"{'case':<12}{'size':<12}{'impl':<9}{'ops/s':>11}{'vs prev':>9}{'peak KB':>10}{'kept KB':>9}{'speedup':>9}")
+    for case, size, arg, legacy_fn, current_fn in cases(args.pages):
+        pair = {}
+        for impl, fn in (("legacy", legacy_fn), ("current", current_fn)):
+            result = {"case": case, "size": size, "impl": impl, **measure(fn, arg, args.min_time)}
+            results.append(result)
+            pair[impl] = result
+            prev = previous.get((case, size, impl))
+            change = f"{result['ops_per_sec'] / prev['ops_per_sec'] - 1:+.0%}" if prev else "-"
+            speedup = f"{result['ops_per_sec'] / pair['legacy']['ops_per_sec']:.2f}x" if impl == "current" else ""
+            print(f"{case:<12}{size:<12}{impl:<9}{result['ops_per_sec']:>11.1f}{change:>9}"
+                  f"{result['peak_kb']:>10.1f}{result['retained_kb']:>9.1f}{speedup:>9}")
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(args.history), exist_ok=True)
+        entry = {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results,
+        }
+        with open(args.history, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        print(f"\nAppended to {args.history}")
+
+
+if __name__ == "__main__":
+    main()
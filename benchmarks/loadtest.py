@@ -0,0 +1,385 @@
+"""
+HTTP load test with latency regression gates.
+
+Seeds a throwaway SQLite database with synthetic tenders, serves the app on a local
+port and lets concurrent virtual users mix dashboard reads with chat sessions (one chat
+session at a time, since the app keeps a single conversation per process). The
+model is replaced by a local stand-in with a fixed generation delay, and every tender
+points at one synthetic vector store with deterministic local embeddings, so the run
+needs neither network access nor an API key.
+
+Reports p50/p95/p99 latency and the error rate per endpoint, compares them with a
+stored baseline and exits with status 1 when an endpoint regressed.
+
+    python benchmarks/loadtest.py                       # compare with the stored baseline
+    python benchmarks/loadtest.py --save-baseline       # record a new baseline
+    python benchmarks/loadtest.py --tenders 5000 --users 32 --duration 60
+"""
+import argparse
+import contextlib
+import hashlib
+import http.client
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "loadtest_baseline.json")
+
+# Relative weight of each scenario in the traffic mix
+SCENARIOS = {
+    "dashboard": 1,
+    "tender_card": 6,
+    "addons": 2,
+    "topic_chat": 2,
+    "general_chat": 1,
+}
+
+WORDS = ("Angebot Auftraggeber Leistung Anforderung Schnittstelle Wartung Support Vertrag Frist "
+         "Zahlung Budget Lizenz Migration Betrieb Sicherheit Datenschutz Projekt Meilenstein "
+         "Abnahme Dokumentation Schulung Konfiguration Integration Skalierung Verfügbarkeit").split()
+
+
+class HashedEmbeddings(Embeddings):
+    """Deterministic bag-of-words embeddings computed locally."""
+
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    def _vector(self, text):
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            vec[int(hashlib.md5(token.encode()).hexdigest()[:8], 16) % self.dim] += 1.0
+        norm = np.linalg.norm(vec)
+        return (vec / norm if norm else vec).tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+class StandInClient:
+    """Answers ``generate`` calls after a fixed delay, like a local model server."""
+
+    class _Generation:
+        def __init__(self, text):
+            self.text = text
+
+    class _Response:
+        def __init__(self, text):
+            self.generations = [StandInClient._Generation(text)]
+
+    def __init__(self, delay_ms):
+        self.delay = delay_ms / 1000.0
+
+    def generate(self, prompt="", max_tokens=500, **kwargs):
+        time.sleep(self.delay)
+        return self._Response("Laut Ausschreibung [1] ist die Abgabefrist einzuhalten.")
+
+
+def synthetic_tender(i, rng):
+    from tender_schema import iter_field_paths, set_field
+
+    data = {}
+    for path in iter_field_paths():
+        set_field(data, path, " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 40))))
+    deadline = f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.2027"
+    set_field(data, ("Übersicht", "Abgabefrist"), deadline)
+    set_field(data, ("Revenue_Potential",), f"{rng.randint(50, 5000) * 1000} EUR")
+    ratings = ["Low", "Moderate", "High"]
+    metrics = {
+        factor: {"Rating": rng.choice(ratings), "Verification Sentence": "Synthetisch."}
+        for factor in ("Complexity", "Scalability", "Integration Requirements")
+    }
+    metrics["Time Feasibility"] = {"Rating": rng.choice(["Feasible", "Unfeasible"]),
+                                   "Verification Sentence": "Synthetisch."}
+    metrics["Days Left to Submit the Proposal"] = str(rng.randint(1, 90))
+    return data, metrics
+
+
+def build_store(path, chunks, rng):
+    from langchain_community.vectorstores import FAISS
+    from tender_schema import SECTION_KEYWORDS
+
+    sections = [keywords[0] for keywords in SECTION_KEYWORDS.values() if keywords]
+    texts, metadatas = [], []
+    for i in range(chunks):
+        section = sections[i % len(sections)]
+        texts.append(f"{section}: " + " ".join(rng.choice(WORDS) for _ in range(120)))
+        page = i // 4 + 1
+        metadatas.append({"page_start": page, "page_end": page, "section": section, "section_path": section})
+    db = FAISS.from_texts(texts, HashedEmbeddings(), metadatas=metadatas)
+    db.save_local(path)
+    return db
+
+
+def seed(app, tenders, index_path, rng):
+    from extensions import db
+    from models import Tender
+
+    with app.app_context():
+        batch = []
+        for i in range(tenders):
+            data, metrics = synthetic_tender(i, rng)
+            batch.append(Tender(name=f"Ausschreibung {i:05d}", json_data=json.dumps(data, ensure_ascii=False),
+                                metrics=json.dumps(metrics), index_path=index_path))
+            if len(batch) == 500:
+                db.session.add_all(batch)
+                db.session.commit()
+                batch = []
+        db.session.add_all(batch)
+        db.session.commit()
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, endpoint, seconds, ok):
+        with self.lock:
+            self.samples.setdefault(endpoint, []).append((seconds, ok))
+
+    def summary(self, wall):
+        result = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            latencies = sorted(s for s, _ in samples)
+            errors = sum(1 for _, ok in samples if not ok)
+            result[endpoint] = {
+                "requests": len(samples),
+                "rps": len(samples) / wall,
+                "error_rate": errors / len(samples),
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p95_ms": percentile(latencies, 95) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+            }
+        return result
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    rank = (len(values) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+class VirtualUser:
+    def __init__(self, port, recorder, tender_count, rng, chat_lock):
+        self.port = port
+        self.recorder = recorder
+        self.tender_count = tender_count
+        self.rng = rng
+        # The app keeps one conversation per process, so chat sessions of different users
+        # must not interleave; each start/send/end sequence holds this lock
+        self.chat_lock = chat_lock
+
+    def request(self, endpoint, method, path, body=None):
+        started = time.perf_counter()
+        ok = False
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+            ok = response.status < 400
+        except OSError:
+            pass
+        self.recorder.add(endpoint, time.perf_counter() - started, ok)
+
+    def run_scenario(self, name):
+        tender_id = self.rng.randint(1, self.tender_count)
+        if name == "dashboard":
+            self.request("/", "GET", "/")
+        elif name == "tender_card":
+            self.request("/get_tender_data", "GET", f"/get_tender_data/{tender_id}")
+            self.request("/graph_data", "GET", f"/graph_data/{tender_id}")
+        elif name == "addons":
+            addons = self.rng.sample(["Hauptziele", "Technische Spezifikationen", "Support und Wartung",
+                                      "Kontaktinformationen"], 2)
+            self.request("/process_addons", "POST", "/process_addons", {"tender_id": tender_id, "addons": addons})
+        elif name == "topic_chat":
+            topic = self.rng.choice(["Übersicht", "Technische Spezifikationen", "Kosteninformationen"])
+            with self.chat_lock:
+                self.request("/start_conversation", "POST", "/start_conversation",
+                             {"topic": topic, "tender_id": tender_id})
+                self.request("/get_response", "POST", "/get_response",
+                             {"message": f"Was gilt für {self.rng.choice(WORDS)}?"})
+                self.request("/end_conversation", "POST", "/end_conversation", {})
+        elif name == "general_chat":
+            with self.chat_lock:
+                self.request("/start_on_the_fly", "POST", "/start_on_the_fly", {"tender_id": tender_id})
+                self.request("/get_response", "POST", "/get_response",
+                             {"message": f"Welche {self.rng.choice(WORDS)} wird verlangt?"})
+                self.request("/end_conversation", "POST", "/end_conversation", {})
+
+    def loop(self, stop_at):
+        names = list(SCENARIOS)
+        weights = [SCENARIOS[n] for n in names]
+        while time.perf_counter() < stop_at:
+            self.run_scenario(self.rng.choices(names, weights)[0])
+
+
+def drive(port, users, duration, tender_count, seed_value):
+    recorder = Recorder()
+    chat_lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=VirtualUser(port, recorder, tender_count, random.Random(seed_value + u),
+                                            chat_lock).loop,
+                         args=(stop_at,))
+        for u in range(users)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.summary(time.perf_counter() - started)
+
+
+def run(args):
+    from werkzeug.serving import make_server
+
+    import Conv_RAG
+    import chunk_store
+    import llm
+    from app import EMBEDDING_MODEL, create_app
+
+    workdir = tempfile.mkdtemp(prefix="tendermind-load-")
+    os.chdir(workdir)
+    rng = random.Random(args.seed)
+
+    index_path = os.path.join(workdir, "store", "shared")
+    db = build_store(index_path, args.chunks, rng)
+    # Serve the synthetic store and the stand-in model through the app's own caches
+    mtime = chunk_store.index_mtime(index_path)
+    Conv_RAG._vector_store_cache[(index_path, EMBEDDING_MODEL)] = (mtime, db)
+    llm._client = StandInClient(args.llm_delay_ms)
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(workdir, 'load.db')}",
+                      "UPLOAD_FOLDER": os.path.join(workdir, "uploads")})
+    started = time.perf_counter()
+    seed(app, args.tenders, index_path, rng)
+    print(f"Seeded {args.tenders} tenders in {time.perf_counter() - started:.1f}s ({workdir})")
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        # The routes print their payloads; keep that out of the report
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            if args.warmup > 0:
+                drive(server.server_port, args.users, args.warmup, args.tenders, args.seed)
+            results = drive(server.server_port, args.users, args.duration, args.tenders, args.seed + 1000)
+    finally:
+        server.shutdown()
+    return results
+
+
+def config_of(args):
+    return {key: getattr(args, key) for key in ("tenders", "users", "duration", "chunks", "llm_delay_ms")}
+
+
+def compare(results, baseline, tolerance, p99_tolerance, slack_ms, max_error_increase):
+    """Return a list of human readable regressions against ``baseline``."""
+    regressions = []
+    for endpoint, base in baseline.get("endpoints", {}).items():
+        current = results.get(endpoint)
+        if current is None:
+            regressions.append(f"{endpoint}: no requests recorded")
+            continue
+        for metric, allowed in (("p95_ms", tolerance), ("p99_ms", p99_tolerance)):
+            limit = base[metric] * (1 + allowed) + slack_ms
+            if current[metric] > limit:
+                regressions.append(f"{endpoint}: {metric} {current[metric]:.1f} > {limit:.1f} "
+                                   f"(baseline {base[metric]:.1f})")
+        if current["error_rate"] > base["error_rate"] * (1 + tolerance) + max_error_increase:
+            regressions.append(f"{endpoint}: error rate {current['error_rate']:.2%} "
+                               f"(baseline {base['error_rate']:.2%})")
+    return regressions
+
+
+def print_report(results, baseline):
+    base = baseline.get("endpoints", {}) if baseline else {}
+    print(f"{'endpoint':<22}{'req':>7}{'rps':>8}{'err':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'base p95':>10}")
+    for endpoint, r in results.items():
+        base_p95 = f"{base[endpoint]['p95_ms']:.1f}" if endpoint in base else "-"
+        print(f"{endpoint:<22}{r['requests']:>7}{r['rps']:>8.1f}{r['error_rate']:>8.1%}{r['p50_ms']:>9.1f}"
+              f"{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{base_p95:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenders", type=int, default=3000)
+    parser.add_argument("--users", type=int, default=16, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds before the run")
+    parser.add_argument("--chunks", type=int, default=400, help="chunks in the synthetic vector store")
+    parser.add_argument("--llm-delay-ms", type=float, default=50.0, help="stand-in model generation time")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed relative p95 and error rate increase")
+    parser.add_argument("--p99-tolerance", type=float, default=0.6, help="allowed relative p99 increase")
+    parser.add_argument("--slack-ms", type=float, default=5.0, help="allowed absolute p95/p99 increase")
+    parser.add_argument("--max-error-increase", type=float, default=0.01, help="allowed error rate increase")
+    args = parser.parse_args()
+
+    baseline_path = os.path.abspath(args.baseline)
+    output_path = os.path.abspath(args.output) if args.output else None
+    baseline = None
+    if os.path.exists(baseline_path) and not args.save_baseline:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = run(args)
+    print(f"{args.users} users, {args.duration:.0f}s, {args.tenders} tenders, "
+          f"stand-in model {args.llm_delay_ms:.0f} ms")
+    print_report(results, baseline)
+
+    report = {"config": config_of(args), "endpoints": results}
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {baseline_path}")
+        return 0
+    if baseline is None:
+        print("No baseline to compare with; run with --save-baseline first.")
+        return 0
+    if baseline.get("config") != report["config"]:
+        print(f"Warning: baseline was recorded with {baseline.get('config')}")
+
+    regressions = compare(results, baseline, args.tolerance, args.p99_tolerance, args.slack_ms,
+                          args.max_error_increase)
+    if regressions:
+        print("\nRegressions:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\nNo regressions against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+Latency budgets for chat turns.
+
+A chat turn runs retrieval (query embedding and index search), optionally a rerank of a
+wider candidate set, and generation. By default every turn uses ``FULL_PLAN``. When a
+request carries a deadline (``deadline_ms`` on ``/get_response``), ``plan_turn`` starts
+from the full plan and applies ``DEGRADATION_STEPS`` one at a time until the estimated
+latency fits. The cheapest quality losses come first: the rerank, then older conversation
+messages, retrieved chunks and the answer length. Plans aim at ``HEADROOM`` of the deadline.
+If even the last step does not fit, the turn runs with the smallest plan.
+
+Estimates come from exponentially weighted moving averages of what this process has
+measured per stage (``estimator``). Until a stage has been measured, ``DEFAULT_ESTIMATES``
+are used. Generation is modelled as a fixed overhead per call plus a cost per token, where
+every output token counts one unit and every prompt token ``PROMPT_TOKEN_WEIGHT`` units;
+both are fitted to the measured calls by a weighted least-squares line.
+"""
+import os
+import threading
+
+from retrieval import estimate_tokens
+
+# Cohere rerank model applied to a wider candidate set, e.g. "rerank-multilingual-v2.0";
+# unset, turns are not reranked
+RERANK_MODEL = os.getenv("TENDERMIND_RERANK") or None
+RERANK_FANOUT = 4  # candidates retrieved per chunk kept after reranking
+
+SETTINGS = ("rerank", "context_messages", "k", "max_tokens")
+
+FULL_PLAN = {
+    "rerank": True,
+    "context_messages": 20,
+    "k": 5,
+    "max_tokens": 500,
+}
+
+# Applied in order until the estimate fits the deadline
+DEGRADATION_STEPS = [
+    ("rerank", False),
+    ("context_messages", 8),
+    ("k", 3),
+    ("max_tokens", 250),
+    ("context_messages", 4),
+    ("k", 2),
+    ("max_tokens", 120),
+]
+
+# Plans target this share of the deadline, leaving room for the variance of model calls
+HEADROOM = 0.8
+
+# Below this, answers are cut off mid-sentence too often to be useful
+MIN_MAX_TOKENS = 60
+
+# Reading a prompt token costs about a tenth of writing an output token
+PROMPT_TOKEN_WEIGHT = 0.1
+# Answers are planned at this multiple of the average answer length
+OUTPUT_MARGIN = 1.5
+# Instructions and headings of the chat prompt, without retrieved text and context
+PROMPT_OVERHEAD_TOKENS = 200
+
+EWMA_ALPHA = 0.2
+# Generation calls measured before the overhead and per-token cost are fitted separately
+MIN_FIT_SAMPLES = 5
+
+DEFAULT_ESTIMATES = {
+    "retrieve_ms": 150.0,
+    "rerank_ms": 250.0,
+    "generate_overhead_ms": 300.0,
+    "generate_ms_per_token": 20.0,
+    "output_tokens": 150.0,
+    "chunk_tokens": 250.0,
+}
+
+
+class LatencyEstimator:
+    """Moving averages of chat stage latencies and sizes, plus deadline counters."""
+
+    def __init__(self, alpha=EWMA_ALPHA, defaults=None):
+        self.alpha = alpha
+        self.defaults = dict(defaults or DEFAULT_ESTIMATES)
+        self._lock = threading.Lock()
+        self._values = {}
+        self._samples = {}
+        self.counts = {"turns": 0, "with_deadline": 0, "degraded": 0, "over_budget": 0, "missed": 0}
+
+    def observe(self, name, value):
+        with self._lock:
+            previous = self._values.get(name)
+            self._values[name] = value if previous is None else previous + self.alpha * (value - previous)
+            self._samples[name] = self._samples.get(name, 0) + 1
+
+    def get(self, name):
+        with self._lock:
+            return self._values.get(name, self.defaults[name])
+
+    def observe_generation(self, elapsed_ms, prompt_tokens, output_tokens):
+        units = output_tokens + PROMPT_TOKEN_WEIGHT * prompt_tokens
+        # Moving averages of the moments of (units, ms) for the line fit in generation_model
+        for name, value in (("_units", units), ("_ms", elapsed_ms), ("_units_sq", units * units),
+                            ("_units_ms", units * elapsed_ms)):
+            self.observe(name, value)
+        self.observe("output_tokens", output_tokens)
+        overhead, per_token = self.generation_model()
+        with self._lock:
+            self._values["generate_overhead_ms"], self._values["generate_ms_per_token"] = overhead, per_token
+            for name in ("generate_overhead_ms", "generate_ms_per_token"):
+                self._samples[name] = self._samples["_ms"]
+
+    def generation_model(self):
+        """(overhead_ms, ms_per_token) fitted to the measured generation calls."""
+        with self._lock:
+            if self._samples.get("_ms", 0) < MIN_FIT_SAMPLES:
+                return self.defaults["generate_overhead_ms"], self.defaults["generate_ms_per_token"]
+            units, ms = self._values["_units"], self._values["_ms"]
+            variance = self._values["_units_sq"] - units * units
+            covariance = self._values["_units_ms"] - units * ms
+        if variance > (0.05 * units) ** 2 and covariance > 0:
+            per_token = covariance / variance
+            overhead = ms - per_token * units
+            if overhead >= 0:
+                return overhead, per_token
+        # Too little spread in the call sizes to separate the two: all cost per token
+        return 0.0, ms / max(units, 1.0)
+
+    def record_turn(self, budget):
+        with self._lock:
+            self.counts["turns"] += 1
+            if budget is None:
+                return
+            self.counts["with_deadline"] += 1
+            self.counts["degraded"] += bool(budget["degradations"])
+            self.counts["over_budget"] += budget["estimated_ms"] > budget["deadline_ms"] * HEADROOM
+            self.counts["missed"] += budget["elapsed_ms"] > budget["deadline_ms"]
+
+    def stats(self):
+        with self._lock:
+            estimates = {name: {"value": round(self._values.get(name, default), 2),
+                                "samples": self._samples.get(name, 0)}
+                         for name, default in self.defaults.items()}
+            return {"estimates": estimates, **self.counts}
+
+
+estimator = LatencyEstimator()
+
+
+def generation_ms(max_tokens, prompt_tokens, estimates=estimator):
+    expected_output = min(max_tokens, estimates.get("output_tokens") * OUTPUT_MARGIN)
+    units = expected_output + PROMPT_TOKEN_WEIGHT * prompt_tokens
+    return estimates.get("generate_overhead_ms") + units * estimates.get("generate_ms_per_token")
+
+
+def context_tokens(context, messages):
+    return sum(estimate_tokens(message) for message in context[-messages:])
+
+
+def estimate_turn(plan, context, estimates=estimator):
+    """Estimated latency of a chat turn run with ``plan`` (a dict of SETTINGS), in ms."""
+    prompt_tokens = (PROMPT_OVERHEAD_TOKENS + plan["k"] * estimates.get("chunk_tokens")
+                     + context_tokens(context, plan["context_messages"]))
+    total = estimates.get("retrieve_ms") + generation_ms(plan["max_tokens"], prompt_tokens, estimates)
+    if plan["rerank"]:
+        total += estimates.get("rerank_ms")
+    return total
+
+
+def full_plan():
+    return dict(FULL_PLAN, rerank=FULL_PLAN["rerank"] and RERANK_MODEL is not None)
+
+
+def plan_turn(deadline_ms, context, estimates=estimator):
+    """
+    Settings for a chat turn with the conversation ``context`` (list of messages).
+
+    Returns (plan, estimated_ms). Without a deadline the full plan is returned.
+    """
+    plan = full_plan()
+    estimated = estimate_turn(plan, context, estimates)
+    if deadline_ms is None:
+        return plan, estimated
+    for setting, value in DEGRADATION_STEPS:
+        if estimated <= deadline_ms * HEADROOM:
+            break
+        candidate = dict(plan, **{setting: value})
+        candidate_estimate = estimate_turn(candidate, context, estimates)
+        # Steps that would not save anything (e.g. trimming a short conversation) are skipped
+        if candidate_estimate < estimated:
+            plan, estimated = candidate, candidate_estimate
+    return plan, estimated
+
+
+def fit_max_tokens(max_tokens, remaining_ms, prompt_tokens, estimates=estimator):
+    """
+    The largest answer length up to ``max_tokens`` whose generation fits ``remaining_ms``,
+    once the prompt is known. Never below MIN_MAX_TOKENS.
+    """
+    remaining_ms *= HEADROOM
+    if generation_ms(max_tokens, prompt_tokens, estimates) <= remaining_ms:
+        return max_tokens
+    per_token = estimates.get("generate_ms_per_token")
+    affordable = ((remaining_ms - estimates.get("generate_overhead_ms")) / per_token
+                  - PROMPT_TOKEN_WEIGHT * prompt_tokens)
+    return max(MIN_MAX_TOKENS, min(max_tokens, int(affordable)))
+
+
+def degradations(plan):
+    """The settings of ``plan`` that fall short of the full plan, as {setting, from, to} entries."""
+    full = full_plan()
+    return [{"setting": setting, "from": full[setting], "to": plan[setting]}
+            for setting in SETTINGS if plan[setting] != full[setting]]
+
+
+def stats():
+    return estimator.stats()
@@ -0,0 +1,538 @@
+"""
+Content-addressed chunk store shared by all tenders.
+
+Tenders from the same buyers repeat long blocks of legal and compliance boilerplate. Each
+chunk is therefore stored once in ``store/chunks.db``, keyed by the SHA-256 of the
+embedding model and the chunk text, together with its embedding vector and a reference
+count. A tender's vector store folder only holds a manifest (``chunks.json``) listing its
+chunk ids in index order with each chunk's metadata (pages, section). Opening the folder
+builds the FAISS index from the shared vectors in the same order, so searches return
+the same results as a store written by ``FAISS.save_local``.
+
+- Building an index only embeds the chunks the store does not know yet.
+- Loaded chunk texts are shared between tenders in memory through a bounded cache.
+- ``release(folder)`` drops a tender's references (when the tender is deleted). Chunks
+  nobody references any more stay as tombstones (reference count 0), so a document that
+  is uploaded again soon reuses them. Once tombstones make up ``COMPACT_RATIO`` of the
+  stored bytes, the background ``compactor`` deletes them and rewrites the database
+  file (VACUUM) to give the space back.
+- Folders written by ``FAISS.save_local`` (index.faiss/index.pkl) still load, and
+  ``migrate`` moves them into the shared store.
+
+    python chunk_store.py report                  # dedup ratio, disk and memory saved
+    python chunk_store.py migrate [--keep-legacy]
+    python chunk_store.py recount                 # rebuild reference counts from manifests
+    python chunk_store.py compact                 # delete tombstones and shrink the file now
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from embeddings import read_store_metadata, spec_of, write_store_metadata
+from storage import STORE_FOLDER
+
+CHUNK_DB = os.path.join(STORE_FOLDER, "chunks.db")
+MANIFEST = "chunks.json"
+LEGACY_FILES = ("index.faiss", "index.pkl")
+TEXT_CACHE_SIZE = 20000
+PAGE_SIZE = 16384
+# Share of the stored chunk bytes held by tombstones that triggers a compaction
+COMPACT_RATIO = float(os.getenv("TENDERMIND_COMPACT_RATIO", "0.25"))
+
+
+def chunk_id(spec, text):
+    return hashlib.sha256(f"{spec}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class ChunkStore:
+    def __init__(self, path=CHUNK_DB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunk (
+                id TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                refcount INTEGER NOT NULL DEFAULT 0
+            )""")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            # A chunk row (text plus a 3 KB vector) overflows 4 KB pages; large pages pack them densely
+            conn.execute(f"PRAGMA page_size={PAGE_SIZE}")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _select(self, columns, ids):
+        conn = self._conn()
+        rows = []
+        ids = list(ids)
+        for start in range(0, len(ids), 500):  # stay below SQLite's bound-parameter limit
+            batch = ids[start:start + 500]
+            rows.extend(conn.execute(f"SELECT id, {columns} FROM chunk WHERE id IN ({','.join('?' * len(batch))})",
+                                     batch))
+        return rows
+
+    def vectors(self, ids):
+        """{id: vector} for the ids that are stored."""
+        return {cid: np.frombuffer(blob, dtype=np.float32) for cid, blob in self._select("vector", set(ids))}
+
+    def rows(self, ids):
+        """{id: (text, vector)} for the ids that are stored."""
+        return {cid: (text, np.frombuffer(blob, dtype=np.float32))
+                for cid, text, blob in self._select("text, vector", set(ids))}
+
+    def put(self, folder, texts, vectors, ids, metadatas):
+        """
+        Store a tender's chunks and make ``folder`` reference them, replacing references
+        the folder held before.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._release(conn, read_manifest(folder))
+            conn.executemany("INSERT OR IGNORE INTO chunk (id, text, vector, refcount) VALUES (?, ?, ?, 0)",
+                             [(cid, text, np.asarray(vector, dtype=np.float32).tobytes())
+                              for cid, text, vector in zip(ids, texts, vectors)])
+            conn.executemany("UPDATE chunk SET refcount = refcount + ? WHERE id = ?",
+                             [(count, cid) for cid, count in Counter(ids).items()])
+            write_manifest(folder, ids, metadatas)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def release(self, folder):
+        """Drop the references of ``folder``. Returns the number of chunks it left unreferenced."""
+        manifest = read_manifest(folder)
+        if manifest is None:
+            return 0
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            tombstoned = self._release(conn, manifest)
+            os.remove(os.path.join(folder, MANIFEST))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return tombstoned
+
+    def _release(self, conn, manifest):
+        # Unreferenced chunks stay as tombstones until the next compaction
+        if not manifest:
+            return 0
+        counts = Counter(entry["id"] for entry in manifest["chunks"])
+        conn.executemany("UPDATE chunk SET refcount = refcount - ? WHERE id = ?",
+                         [(count, cid) for cid, count in counts.items()])
+        return self._select_count(conn, "refcount <= 0 AND id IN", list(counts))
+
+    def _select_count(self, conn, condition, ids):
+        total = 0
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            total += conn.execute(f"SELECT COUNT(*) FROM chunk WHERE {condition} ({','.join('?' * len(batch))})",
+                                  batch).fetchone()[0]
+        return total
+
+    def tombstones(self):
+        """(tombstoned chunks, their bytes, bytes of all stored chunks)."""
+        return self._conn().execute("""
+            SELECT COALESCE(SUM(refcount <= 0), 0),
+                   COALESCE(SUM(CASE WHEN refcount <= 0 THEN LENGTH(CAST(text AS BLOB)) + LENGTH(vector) END), 0),
+                   COALESCE(SUM(LENGTH(CAST(text AS BLOB)) + LENGTH(vector)), 0)
+            FROM chunk""").fetchone()
+
+    def compact(self):
+        """
+        Delete the tombstones and rewrite the database file. Returns (chunks deleted, bytes
+        of disk reclaimed).
+        """
+        before = self.disk_bytes()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            deleted = [cid for (cid,) in conn.execute("SELECT id FROM chunk WHERE refcount <= 0")]
+            conn.execute("DELETE FROM chunk WHERE refcount <= 0")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("VACUUM")
+        _forget_texts(deleted)
+        return len(deleted), before - self.disk_bytes()
+
+    def recount(self, manifests):
+        """Recompute every reference count from the given manifests."""
+        counts = Counter(entry["id"] for manifest in manifests for entry in manifest["chunks"])
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("UPDATE chunk SET refcount = 0")
+        conn.executemany("UPDATE chunk SET refcount = ? WHERE id = ?", [(n, cid) for cid, n in counts.items()])
+        deleted = conn.execute("DELETE FROM chunk WHERE refcount <= 0").rowcount
+        conn.execute("COMMIT")
+        return deleted
+
+    def totals(self):
+        """Sizes of the referenced chunks, and what per-tender copies of every reference would take."""
+        row = self._conn().execute("""
+            SELECT COUNT(*), COALESCE(SUM(refcount), 0),
+                   COALESCE(SUM(LENGTH(CAST(text AS BLOB))), 0), COALESCE(SUM(LENGTH(vector)), 0),
+                   COALESCE(SUM(refcount * LENGTH(CAST(text AS BLOB))), 0), COALESCE(SUM(refcount * LENGTH(vector)), 0)
+            FROM chunk WHERE refcount > 0""").fetchone()
+        keys = ("chunks", "references", "text_bytes", "vector_bytes", "referenced_text_bytes",
+                "referenced_vector_bytes")
+        return dict(zip(keys, row))
+
+    def disk_bytes(self):
+        self._conn().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return sum(os.path.getsize(self.path + suffix) for suffix in ("", "-wal", "-shm")
+                   if os.path.exists(self.path + suffix))
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+_texts = OrderedDict()
+_texts_lock = threading.Lock()
+
+
+def get_store(path=CHUNK_DB):
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = ChunkStore(path)
+        return _stores[path]
+
+
+def _forget_texts(ids):
+    with _texts_lock:
+        for cid in ids:
+            _texts.pop(cid, None)
+
+
+def _shared_text(cid, text):
+    # Tenders loaded at the same time hold one copy of each boilerplate chunk
+    with _texts_lock:
+        shared = _texts.get(cid)
+        if shared is None:
+            _texts[cid] = shared = text
+            if len(_texts) > TEXT_CACHE_SIZE:
+                _texts.popitem(last=False)
+        else:
+            _texts.move_to_end(cid)
+        return shared
+
+
+# --- Manifests -----------------------------------------------------------------------
+
+def manifest_path(folder):
+    return os.path.join(folder, MANIFEST)
+
+
+def read_manifest(folder):
+    path = manifest_path(folder)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(folder, ids, metadatas):
+    os.makedirs(folder, exist_ok=True)
+    tmp_path = manifest_path(folder) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"chunks": [{"id": cid, "metadata": metadata or {}} for cid, metadata in zip(ids, metadatas)]},
+                  f, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path(folder))
+
+
+def index_file(folder):
+    """The file whose presence (and mtime) marks a built vector store in ``folder``."""
+    manifest = manifest_path(folder)
+    return manifest if os.path.exists(manifest) else os.path.join(folder, LEGACY_FILES[0])
+
+
+def index_exists(folder):
+    return os.path.exists(index_file(folder))
+
+
+def index_mtime(folder):
+    return os.path.getmtime(index_file(folder))
+
+
+# --- Vector stores -------------------------------------------------------------------
+
+def build_vector_store(texts, metadatas, embedding, store=None):
+    """
+    Embed a document's chunks into a FAISS store, reusing the vectors of chunks that are
+    already in the shared store (boilerplate seen in other tenders).
+    """
+    from langchain_community.vectorstores.faiss import FAISS
+
+    store = store or get_store()
+    spec = spec_of(embedding)
+    ids = [chunk_id(spec, text) for text in texts]
+    known = store.vectors(ids)
+    new = {}  # id -> first position, for chunks neither stored nor seen earlier in this document
+    for i, cid in enumerate(ids):
+        if cid not in known and cid not in new:
+            new[cid] = i
+    if new:
+        for cid, vector in zip(new, embedding.embed_documents([texts[i] for i in new.values()])):
+            known[cid] = np.asarray(vector, dtype=np.float32)
+    print(f"Embedded {len(new)} new chunk(s), reused {len(texts) - len(new)}")
+    return FAISS.from_embeddings([(text, known[cid].tolist()) for text, cid in zip(texts, ids)], embedding,
+                                 metadatas=metadatas)
+
+
+def documents_and_vectors(db):
+    index = db.index
+    vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else np.zeros((0, index.d), dtype=np.float32)
+    documents = [db.docstore.search(db.index_to_docstore_id[i]) for i in range(index.ntotal)]
+    return documents, vectors
+
+
+def save(db, folder, store=None):
+    """Save a FAISS store as references into the shared chunk store."""
+    store = store or get_store()
+    documents, vectors = documents_and_vectors(db)
+    spec = spec_of(db.embedding_function)
+    texts = [doc.page_content for doc in documents]
+    store.put(folder, texts, vectors, [chunk_id(spec, text) for text in texts],
+              [doc.metadata for doc in documents])
+    write_store_metadata(folder, db.embedding_function, db.index.d)
+    for name in LEGACY_FILES:
+        if os.path.exists(os.path.join(folder, name)):
+            os.remove(os.path.join(folder, name))
+
+
+def load(folder, embedding, store=None):
+    """Open the vector store in ``folder`` (a manifest, or a legacy FAISS folder)."""
+    import faiss
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores.faiss import FAISS
+    from langchain_core.documents import Document
+
+    manifest = read_manifest(folder)
+    if manifest is None:
+        return FAISS.load_local(folder, embeddings=embedding, allow_dangerous_deserialization=True)
+
+    store = store or get_store()
+    entries = manifest["chunks"]
+    rows = store.rows(entry["id"] for entry in entries)
+    missing = {entry["id"] for entry in entries} - rows.keys()
+    if missing:
+        raise FileNotFoundError(f"{len(missing)} chunk(s) of {folder} are missing from {store.path}")
+
+    # The same construction as FAISS.from_embeddings, without round-tripping through lists
+    dim = rows[entries[0]["id"]][1].shape[0] if entries else read_store_metadata(folder).get("dim") or 1
+    index = faiss.IndexFlatL2(dim)
+    if entries:
+        index.add(np.vstack([rows[entry["id"]][1] for entry in entries]))
+    docstore = InMemoryDocstore({
+        str(i): Document(id=str(i), page_content=_shared_text(entry["id"], rows[entry["id"]][0]),
+                         metadata=entry["metadata"])
+        for i, entry in enumerate(entries)
+    })
+    return FAISS(embedding, index, docstore, {i: str(i) for i in range(len(entries))})
+
+
+def release(folder, store=None):
+    """Drop a vector store's chunk references (e.g. when its tender is deleted)."""
+    return (store or get_store()).release(folder)
+
+
+class Compactor:
+    """
+    Compacts a chunk store in a background thread once its tombstones pass ``ratio`` of
+    the stored bytes. ``request()`` is cheap and called after every release.
+    """
+
+    def __init__(self, store_path=CHUNK_DB, ratio=None):
+        self.store_path = store_path
+        self.ratio = COMPACT_RATIO if ratio is None else ratio
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.counts = {"requests": 0, "runs": 0, "chunks_deleted": 0, "bytes_reclaimed": 0, "failed": 0}
+        self.last_run = None
+
+    def request(self):
+        self.counts["requests"] += 1
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="chunk-compactor", daemon=True)
+                    self._thread.start()
+        self._wake.set()
+
+    def due(self):
+        tombstoned, dead_bytes, total_bytes = get_store(self.store_path).tombstones()
+        return tombstoned > 0 and total_bytes > 0 and dead_bytes / total_bytes >= self.ratio
+
+    def run_once(self, force=False):
+        """Compact now if due (or ``force``). Returns (chunks deleted, bytes reclaimed)."""
+        if not force and not self.due():
+            return 0, 0
+        started = time.perf_counter()
+        deleted, reclaimed = get_store(self.store_path).compact()
+        self.counts["runs"] += 1
+        self.counts["chunks_deleted"] += deleted
+        self.counts["bytes_reclaimed"] += reclaimed
+        self.last_run = {"chunks_deleted": deleted, "bytes_reclaimed": reclaimed,
+                         "seconds": round(time.perf_counter() - started, 3)}
+        return deleted, reclaimed
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            try:
+                self.run_once()
+            except Exception as e:
+                self.counts["failed"] += 1
+                print(f"Chunk store compaction failed: {e}")
+
+    def stats(self):
+        tombstoned, dead_bytes, total_bytes = get_store(self.store_path).tombstones()
+        return dict(self.counts, tombstones=tombstoned,
+                    tombstone_ratio=round(dead_bytes / total_bytes, 4) if total_bytes else 0.0,
+                    threshold=self.ratio, last_run=self.last_run)
+
+
+compactor = Compactor()
+
+
+def texts(folder, store=None):
+    """The chunk texts of the vector store in ``folder``, in index order."""
+    manifest = read_manifest(folder)
+    if manifest is None:
+        return read_legacy(folder)[0]
+    rows = (store or get_store()).rows(entry["id"] for entry in manifest["chunks"])
+    return [rows[entry["id"]][0] for entry in manifest["chunks"] if entry["id"] in rows]
+
+
+# --- Maintenance ---------------------------------------------------------------------
+
+def _folders(root):
+    if not os.path.isdir(root):
+        return []
+    return sorted(entry.path for entry in os.scandir(root) if entry.is_dir())
+
+
+def read_legacy(folder):
+    """(texts, vectors, metadatas) of a folder written by FAISS.save_local."""
+    import faiss
+
+    index = faiss.read_index(os.path.join(folder, "index.faiss"))
+    with open(os.path.join(folder, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    documents = [docstore.search(index_to_docstore_id[i]) for i in range(index.ntotal)]
+    vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else np.zeros((0, index.d), dtype=np.float32)
+    return [d.page_content for d in documents], vectors, [d.metadata for d in documents]
+
+
+def migrate(root=STORE_FOLDER, keep_legacy=False, store=None):
+    """Move legacy FAISS folders under ``root`` into the shared store (verified before removal)."""
+    store = store or get_store()
+    migrated = 0
+    for folder in _folders(root):
+        if read_manifest(folder) is not None or not all(os.path.exists(os.path.join(folder, n)) for n in LEGACY_FILES):
+            continue
+        texts, vectors, metadatas = read_legacy(folder)
+        spec = read_store_metadata(folder)["spec"]
+        ids = [chunk_id(spec, text) for text in texts]
+        store.put(folder, texts, vectors, ids, metadatas)
+
+        # A chunk stored earlier by another tender has to match this tender's copy, or its
+        # search results would change; then the folder stays a legacy store
+        rows = store.rows(ids)
+        if any(rows[cid][0] != texts[i] or not np.allclose(rows[cid][1], vectors[i], rtol=1e-4, atol=1e-6)
+               for i, cid in enumerate(ids)):
+            store.release(folder)
+            print(f"{folder}: chunks differ from their shared copies, left as a legacy store")
+            continue
+        if not keep_legacy:
+            for name in LEGACY_FILES:
+                os.remove(os.path.join(folder, name))
+        migrated += 1
+        print(f"Migrated {folder} ({len(texts)} chunks)")
+    return migrated
+
+
+def report(root=STORE_FOLDER, store=None):
+    """
+    Dedup ratio and the space saved by sharing chunks. Per-tender stores would hold every
+    referenced chunk's text and vector; the shared store holds each distinct chunk once.
+    """
+    store = store or get_store()
+    totals = store.totals()
+    folders = _folders(root)
+    manifests = [f for f in folders if os.path.exists(manifest_path(f))]
+    per_tender = totals["referenced_text_bytes"] + totals["referenced_vector_bytes"]
+    shared = totals["text_bytes"] + totals["vector_bytes"]
+    tombstoned, dead_bytes, _ = store.tombstones()
+    return {
+        "stores": len(manifests),
+        "legacy_stores": sum(1 for f in folders if os.path.exists(os.path.join(f, LEGACY_FILES[0]))),
+        "references": totals["references"],
+        "distinct_chunks": totals["chunks"],
+        "dedup_ratio": totals["references"] / totals["chunks"] if totals["chunks"] else 1.0,
+        "per_tender_bytes": per_tender,
+        "shared_bytes": shared,
+        "saved_bytes": per_tender - shared,
+        "tombstones": tombstoned,
+        "tombstone_bytes": dead_bytes,
+        "disk_bytes": store.disk_bytes() + sum(os.path.getsize(manifest_path(f)) for f in manifests),
+        # FAISS keeps its own vectors per loaded tender; chunk texts are shared in memory
+        "memory_saved_bytes": totals["referenced_text_bytes"] - totals["text_bytes"],
+    }
+
+
+def print_report(result):
+    mb = 1024 * 1024
+    print(f"Vector stores: {result['stores']} on the chunk store, {result['legacy_stores']} legacy")
+    print(f"Chunk references: {result['references']}  distinct chunks: {result['distinct_chunks']}  "
+          f"dedup ratio: {result['dedup_ratio']:.2f}x")
+    print(f"Chunk data: {result['per_tender_bytes'] / mb:.1f} MB as per-tender copies, "
+          f"{result['shared_bytes'] / mb:.1f} MB shared, {result['saved_bytes'] / mb:.1f} MB saved")
+    print(f"Tombstones awaiting compaction: {result['tombstones']} chunk(s), "
+          f"{result['tombstone_bytes'] / mb:.1f} MB")
+    print(f"On disk (chunk database and manifests): {result['disk_bytes'] / mb:.1f} MB")
+    print(f"Memory saved with every store loaded (shared chunk texts): {result['memory_saved_bytes'] / mb:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["report", "migrate", "recount", "compact"])
+    parser.add_argument("--root", default=STORE_FOLDER, help="folder containing the vector stores")
+    parser.add_argument("--keep-legacy", action="store_true", help="keep index.faiss/index.pkl after migrating")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        print(f"Migrated {migrate(args.root, keep_legacy=args.keep_legacy)} store(s)")
+    elif args.command == "recount":
+        manifests = [m for m in (read_manifest(f) for f in _folders(args.root)) if m]
+        print(f"Deleted {get_store().recount(manifests)} unreferenced chunk(s)")
+    elif args.command == "compact":
+        deleted, reclaimed = compactor.run_once(force=True)
+        print(f"Deleted {deleted} tombstoned chunk(s), reclaimed {reclaimed / (1024 * 1024):.1f} MB")
+    print_report(report(args.root))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Structure-aware chunking of tender documents.
+
+Headings are detected on the raw page lines (before preprocessing joins them), so every
+chunk knows which section it belongs to and which pages it spans. Chunks never cross a
+section boundary, which keeps topic-scoped searches clean and makes citations real.
+"""
+import re
+from bisect import bisect_right
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+
+# "3", "3.2", "3.2.1" followed by a capitalised title, e.g. "3.2 Technische Anforderungen"
+NUMBERED_HEADING = re.compile(r'^(\d{1,2}(?:\.\d{1,2}){0,4})\.?\s+([A-ZÄÖÜ][^\n]{2,90})$')
+# "§ 4 Vertragslaufzeit", "Anlage 2: Preisblatt", "Teil B - Leistungsbeschreibung"
+LABELLED_HEADING = re.compile(
+    r'^(§\s*\d+[a-z]?|(?:Anlage|Anhang|Teil|Kapitel|Abschnitt|Los)\s+[0-9A-Z]{1,3})\b[\s.:\-–]*([^\n]{0,90})$'
+)
+# Stand-alone headings that tender documents commonly use without numbering
+KEYWORD_HEADINGS = (
+    "leistungsbeschreibung", "ausgangslage", "zielsetzung", "projektziele", "anforderungen",
+    "technische anforderungen", "funktionale anforderungen", "zeitplan", "termine", "meilensteine",
+    "zuschlagskriterien", "eignungskriterien", "vergabeunterlagen", "angebotsabgabe",
+    "vertragsbedingungen", "datenschutz", "support", "wartung", "ansprechpartner", "kontakt",
+    "preisblatt", "vergütung", "zahlungsbedingungen", "allgemeine geschäftsbedingungen",
+)
+# Words that follow a number in running text ("3. Juni", "12 Monate") rather than in a heading
+NOT_A_TITLE = {
+    "januar", "februar", "märz", "april", "mai", "juni", "juli", "august", "september", "oktober",
+    "november", "dezember", "tage", "tagen", "wochen", "monate", "monaten", "jahre", "jahren",
+    "stunden", "prozent", "euro", "eur", "mio", "stück", "personen", "mitarbeiter",
+}
+SENTENCE_END = re.compile(r'(?<=[.!?;:])\s+')
+
+
+class Chunk:
+    def __init__(self, text, page_start, page_end, section_path):
+        self.text = text
+        self.page_start = page_start
+        self.page_end = page_end
+        self.section_path = section_path
+
+    @property
+    def metadata(self):
+        return {
+            "page_start": self.page_start,
+            "page_end": self.page_end,
+            "section": self.section_path[-1] if self.section_path else "",
+            "section_path": " > ".join(self.section_path),
+        }
+
+
+def detect_heading(line):
+    """
+    Return (depth, title) if the line looks like a heading, else None.
+    """
+    line = line.strip()
+    if not line or len(line) > 100:
+        return None
+    match = NUMBERED_HEADING.match(line)
+    if (match and not line.endswith(('.', ',')) and len(match.group(2).split()) <= 12
+            and match.group(2).split()[0].lower().strip('.,:') not in NOT_A_TITLE):
+        return match.group(1).count('.') + 1, line
+    match = LABELLED_HEADING.match(line)
+    if match:
+        return 1, line
+    lowered = line.lower().rstrip(':')
+    if lowered in KEYWORD_HEADINGS or (len(lowered) <= 60 and lowered.endswith(KEYWORD_HEADINGS) and line[0].isupper()
+                                       and not line.endswith('.')):
+        return 1, line.rstrip(':')
+    return None
+
+
+def _sections(pages):
+    """
+    Group page lines into sections: yields (section_path, [(page_number, text), ...]).
+    """
+    path = []
+    depths = []
+    pieces = []
+    for page_number, text in pages:
+        lines = []
+        for line in text.splitlines():
+            heading = detect_heading(line)
+            if heading is None:
+                lines.append(line)
+                continue
+            if lines:
+                pieces.append((page_number, "\n".join(lines)))
+                lines = []
+            if pieces:
+                yield list(path), pieces
+                pieces = []
+            depth, title = heading
+            while depths and depths[-1] >= depth:
+                depths.pop()
+                path.pop()
+            depths.append(depth)
+            path.append(title)
+        if lines:
+            pieces.append((page_number, "\n".join(lines)))
+    if pieces:
+        yield list(path), pieces
+
+
+def _split(text, chunk_size, chunk_overlap):
+    """
+    Split text into (start, end) spans of at most ``chunk_size`` characters, preferring
+    sentence boundaries, with about ``chunk_overlap`` characters carried over.
+    """
+    spans = []
+    boundaries = [0] + [m.end() for m in SENTENCE_END.finditer(text)] + [len(text)]
+    start = 0
+    while start < len(text):
+        limit = start + chunk_size
+        if limit >= len(text):
+            spans.append((start, len(text)))
+            break
+        # Last sentence boundary that still fits, otherwise the last space, otherwise a hard cut
+        i = bisect_right(boundaries, limit) - 1
+        end = boundaries[i] if boundaries[i] > start + chunk_size // 2 else text.rfind(' ', start, limit)
+        if end <= start:
+            end = limit
+        spans.append((start, end))
+        next_start = max(end - chunk_overlap, start + 1)
+        space = text.find(' ', next_start, end)
+        start = space + 1 if space != -1 else end
+    return spans
+
+
+def chunk_pages(pages, preprocess=None, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """
+    Chunk a document given as [(page_number, raw_text), ...] with 1-based page numbers.
+
+    ``preprocess`` is applied to each page's part of a section before splitting.
+    Returns a list of ``Chunk``.
+    """
+    chunks = []
+    for section_path, pieces in _sections(pages):
+        # Join the section's page pieces and remember where each page starts
+        parts, offsets, pages_at = [], [], []
+        position = 0
+        for page_number, text in pieces:
+            cleaned = preprocess(text) if preprocess else " ".join(text.split())
+            if not cleaned:
+                continue
+            offsets.append(position)
+            pages_at.append(page_number)
+            parts.append(cleaned)
+            position += len(cleaned) + 1
+        if not parts:
+            continue
+        body = " ".join(parts)
+        for start, end in _split(body, chunk_size, chunk_overlap):
+            text = body[start:end].strip()
+            if not text:
+                continue
+            first = pages_at[bisect_right(offsets, start) - 1]
+            last = pages_at[bisect_right(offsets, max(start, end - 1)) - 1]
+            chunks.append(Chunk(text, first, last, section_path))
+    return chunks
+
+
+def section_filter(keywords):
+    """
+    Build a metadata predicate that keeps chunks whose section path mentions a keyword.
+    """
+    keywords = [k.lower() for k in keywords]
+
+    def matches(metadata):
+        path = (metadata or {}).get("section_path", "").lower()
+        return any(k in path for k in keywords)
+
+    return matches
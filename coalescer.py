@@ -0,0 +1,201 @@
+"""
+Micro-batching of concurrent chat lookups.
+
+When several analysts chat at once, every turn used to make its own query embedding call
+and its own index search. A ``Coalescer`` collects requests that arrive within a few
+milliseconds of each other and hands them to one batch function, then gives each caller
+its own result back. ``embed_query`` and ``search_by_vector`` wrap the two expensive
+calls of a chat turn.
+"""
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+# How long the first request of a batch waits for company, the largest batch formed and
+# how many batches may be in flight at once
+WINDOW_MS = 5
+MAX_BATCH = 32
+MAX_INFLIGHT = 2
+
+
+class CoalescerStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.max_batch = 0
+        self.wait_ms_total = 0.0
+        self.batch_ms_total = 0.0
+        self.batch_sizes = {}
+
+    def record(self, size, wait_ms, batch_ms):
+        with self.lock:
+            self.requests += size
+            self.batches += 1
+            self.max_batch = max(self.max_batch, size)
+            self.wait_ms_total += wait_ms
+            self.batch_ms_total += batch_ms
+            self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            batches = self.batches or 1
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "mean_batch_size": self.requests / batches,
+                "max_batch_size": self.max_batch,
+                "mean_queue_wait_ms": self.wait_ms_total / batches,
+                "mean_batch_ms": self.batch_ms_total / batches,
+                "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+            }
+
+
+class Coalescer:
+    """
+    Gather submitted items into batches for ``batch_fn``.
+
+    ``batch_fn(key, items)`` must return one result per item, in order. Items are grouped
+    by ``key`` so only compatible requests (same model, same index) share a batch.
+    """
+
+    def __init__(self, name, batch_fn, window_ms=WINDOW_MS, max_batch=MAX_BATCH, max_inflight=MAX_INFLIGHT):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.stats = CoalescerStats()
+        self._queues = {}
+        self._lock = threading.Condition()
+        self._thread = None
+        # While all slots are busy, new requests keep queueing, so batches grow with load
+        self._slots = threading.Semaphore(max_inflight)
+        self._executor = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix=f"coalescer-{name}")
+
+    def submit(self, key, item):
+        future = Future()
+        with self._lock:
+            self._queues.setdefault(key, deque()).append((item, future, time.perf_counter()))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f"coalescer-{self.name}", daemon=True)
+                self._thread.start()
+            self._lock.notify()
+        return future
+
+    def call(self, key, item, timeout=None):
+        return self.submit(key, item).result(timeout)
+
+    def _next_batch(self):
+        with self._lock:
+            while not self._queues:
+                self._lock.wait()
+            # Serve the key whose oldest request has waited longest
+            key = min(self._queues, key=lambda k: self._queues[k][0][2])
+            deadline = self._queues[key][0][2] + self.window
+            while len(self._queues[key]) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._lock.wait(remaining)
+            queue = self._queues[key]
+            batch = [queue.popleft() for _ in range(min(self.max_batch, len(queue)))]
+            if not queue:
+                del self._queues[key]
+            return key, batch
+
+    def _run(self):
+        while True:
+            self._slots.acquire()
+            key, batch = self._next_batch()
+            self._executor.submit(self._execute, key, batch)
+
+    def _execute(self, key, batch):
+        started = time.perf_counter()
+        try:
+            results = self.batch_fn(key, [item for item, _, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"{self.name}: batch function returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+        finished = time.perf_counter()
+        wait_ms = sum(started - queued for _, _, queued in batch) * 1000 / len(batch)
+        self.stats.record(len(batch), wait_ms, (finished - started) * 1000)
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
+
+
+# Embedding objects and vector stores by id(), so the batch functions can find them from a
+# key. Callers hold a reference while their request is queued, so weak references suffice.
+_registry = weakref.WeakValueDictionary()
+_registry_lock = threading.Lock()
+
+
+def _register(obj):
+    with _registry_lock:
+        _registry[id(obj)] = obj
+    return id(obj)
+
+
+def _embed_batch(key, queries):
+    embedding = _registry[key]
+    # Cohere distinguishes query and document embeddings; other backends only have embed_documents
+    if hasattr(embedding, "embed"):
+        try:
+            return embedding.embed(queries, input_type="search_query")
+        except TypeError:
+            pass
+    return embedding.embed_documents(queries)
+
+
+def _search_batch(key, requests):
+    """
+    One FAISS search for all query vectors against the same index. Each request is
+    (vector, k); the batch searches with the largest k and trims per request.
+    """
+    db = _registry[key]
+    vectors = np.asarray([vector for vector, _ in requests], dtype=np.float32)
+    if getattr(db, "_normalize_L2", False):
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+    k_max = max(k for _, k in requests)
+    distances, indices = db.index.search(vectors, k_max)
+    results = []
+    for row, (_, k) in enumerate(requests):
+        docs = []
+        for i in indices[row][:k]:
+            if i == -1:
+                continue
+            docs.append(db.docstore.search(db.index_to_docstore_id[int(i)]))
+        results.append(docs)
+    return results
+
+
+query_embedder = Coalescer("embed", _embed_batch)
+index_searcher = Coalescer("search", _search_batch)
+
+
+def embed_query(embedding, query):
+    """Embed one chat query, batched with concurrent queries for the same model."""
+    return query_embedder.call(_register(embedding), query)
+
+
+def search_by_vector(db, vector, k=5):
+    """Search one vector store, batched with concurrent searches of the same store."""
+    return index_searcher.call(_register(db), (vector, k))
+
+
+def similarity_search(db, query, k=5):
+    """Coalesced equivalent of ``db.similarity_search(query, k)``."""
+    return search_by_vector(db, embed_query(db.embedding_function, query), k)
+
+
+def stats():
+    return {"embed": query_embedder.stats.snapshot(), "search": index_searcher.stats.snapshot()}
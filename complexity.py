@@ -1,22 +1,20 @@
-import os
 import requests
-import cohere
 import yaml
 import re
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.vectorstores.faiss import FAISS
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_cohere import CohereEmbeddings
-from dotenv import load_dotenv
+from embeddings import EmbeddingMismatchError, check_store, get_embeddings
+import chunk_store
+import artifacts
+import pdf_workers
+from llm import get_cohere_client
+from retrieval import context_key, load_context, save_context
+from text_preprocessing import preprocess_text
 import time
-# Load environment variables from .env file (optional)
-load_dotenv()
 
-# Initialize Cohere Client
-COHERE_API_KEY = os.getenv('COHERE_API_KEY')
-if not COHERE_API_KEY:
-    raise ValueError("COHERE_API_KEY environment variable not set.")
-cohere_client = cohere.Client(COHERE_API_KEY)
+# Bump when the assessment prompt changes, so backfill.py re-runs stored assessments
+ASSESSMENT_VERSION = "1"
+ASSESSMENT_QUERY = "Was sind wichtige Punkte in der Ausschreibung?"
+ASSESSMENT_TOP_K = 5
 
 
 def download_file(url, save_path='downloaded_file.pdf'):
@@ -27,49 +25,21 @@ def download_file(url, save_path='downloaded_file.pdf'):
     print("File downloaded successfully!")
     return save_path
 
-def preprocess_text(text):
-    """
-    Preprocess text to remove unnecessary line breaks and improve context understanding.
-    """
-    # Remove multiple newlines and extra spaces
-    text = re.sub(r'\n+', ' ', text)  # Replace multiple newlines with a single space
-    text = re.sub(r'\s+', ' ', text).strip()  # Remove extra spaces
-
-    # Remove common headers or footers (e.g., "Page 1", "Ausschreibungsdokument", etc.)
-    text = re.sub(r'Page \d+', '', text)
-    text = re.sub(r'Ausschreibungsdokument.*', '', text)
-
-    # Fix sentence-breaking by handling cases where a sentence is split across lines without a period
-    text = re.sub(r'([a-z])-\s+([a-z])', r'\1\2', text)  # Fix hyphenated word breaks
-    text = re.sub(r'(\S)- (\S)', r'\1\2', text)  # Handle more hyphen breaks in German
-    text = re.sub(r'([a-zA-Z])\s*\n\s*([a-zA-Z])', r'\1 \2', text)  # Remove line breaks within sentences
-
-    return text
-
-
 def convert_to_vector_store(file_path):
-    loader = PyPDFLoader(file_path)
     # Use an embedding model suitable for German (if available)
-    embedding = CohereEmbeddings(model="embed-multilingual-v2.0")
-    pages = loader.load()
+    embedding = get_embeddings()
+    pages = pdf_workers.load_pages(file_path)  # parsed in a worker process with time and memory limits
 
     # Preprocess each page's content before saving to the database
     preprocessed_pages = []
-    for page in pages:
-        preprocessed_content = preprocess_text(page.page_content)
+    for _, content in pages:
+        preprocessed_content = preprocess_text(content)
         preprocessed_pages.append(preprocessed_content)
 
-    # Save preprocessed pages to a text file for debugging purposes
-    pages_text_path = "output/pages_preprocessed.txt"
-    os.makedirs(os.path.dirname(pages_text_path), exist_ok=True)
-
-    with open(pages_text_path, 'w', encoding='utf-8') as f:
-        for i, content in enumerate(preprocessed_pages):
-            f.write(f"Page {i + 1}:\n")
-            f.write(content)
-            f.write("\n\n" + "-" * 50 + "\n\n")  # Adding a separator between pages
-
-    print(f"Preprocessed pages content saved for debugging at {pages_text_path}")
+    # Keep the preprocessed pages as a debug artifact (written in the background)
+    artifacts.save(artifacts.namespace_for(file_path), "pages_preprocessed.txt",
+                   lambda: "".join(f"Page {i + 1}:\n{content}\n\n{'-' * 50}\n\n"
+                                   for i, content in enumerate(preprocessed_pages)))
 
     # Initialize the RecursiveCharacterTextSplitter
     split_text = RecursiveCharacterTextSplitter(
@@ -85,19 +55,19 @@ def convert_to_vector_store(file_path):
         split_pages.extend(split_text.split_text(content))  # Splitting each page individually
 
     # Create vector store from split pages
-    db = FAISS.from_texts(split_pages, embedding=embedding)
+    db = chunk_store.build_vector_store(split_pages, [{} for _ in split_pages], embedding)
 
     return db
 
 
 def save_vector_store(db, save_path):
-    db.save_local(folder_path=save_path)
+    chunk_store.save(db, save_path)
     print(f"Vector store saved successfully at {save_path}")
 
 
 def load_vector_store(save_path, embedding):
-    db = FAISS.load_local(save_path, embeddings=embedding, allow_dangerous_deserialization=True)
-    return db
+    check_store(save_path, embedding)
+    return chunk_store.load(save_path, embedding)
 
 
 def query_vector_store(db, query, top_k=5):
@@ -105,9 +75,49 @@ def query_vector_store(db, query, top_k=5):
     return results
 
 
+# Compiled once; the lazy DOTALL groups stop at the next unindented line
+FACTOR_PATTERNS = {
+    'Complexity': re.compile(r'Complexity:\s*Ratings?:\s*([^\n]+)\s*Verification\s+Sentence:\s*(.*?)(?=\n\S|\Z)', re.DOTALL),
+    'Scalability': re.compile(r'Scalability:\s*Ratings?:\s*([^\n]+)\s*Verification\s+Sentence:\s*(.*?)(?=\n\S|\Z)', re.DOTALL),
+    'Integration Requirements': re.compile(r'Integration\s*Requirements:\s*Ratings?:\s*([^\n]+)\s*Verification\s+Sentence:\s*(.*?)(?=\n\S|\Z)', re.DOTALL),
+    'Time Feasibility': re.compile(r'Time\s*Feasibility:\s*Ratings?:\s*([^\n]+)\s*Verification\s+Sentence:\s*(.*?)(?=\n\S|\Z)', re.DOTALL),
+}
+DAYS_LEFT_KEY = 'Days Left to Submit the Proposal'
+DAYS_LEFT_PATTERN = re.compile(r'Days\s*Left\s*to\s*Submit\s*the\s*Proposal:\s*(.*)', re.DOTALL)
+
+
+def parse_assessment(generated_text):
+    """
+    Parse the model's assessment into {factor: {'Rating', 'Verification Sentence'}} plus
+    the days left. Factors missing from the text are 'Not Available'. Days left are only
+    in older outputs; they are now computed from the stored deadline when read.
+    """
+    factors = {}
+    for factor, pattern in FACTOR_PATTERNS.items():
+        match = pattern.search(generated_text)
+        if match:
+            rating = match.group(1).strip()
+            verification_sentence = match.group(2).strip()
+            # Ensure verification sentence is maximum 20 words
+            if len(verification_sentence.split()) > 20:
+                verification_sentence = "Verification sentence exceeds 20 words."
+            factors[factor] = {
+                'Rating': rating,
+                'Verification Sentence': verification_sentence
+            }
+        else:
+            factors[factor] = {
+                'Rating': 'Not Available',
+                'Verification Sentence': 'Not Available'
+            }
+    match = DAYS_LEFT_PATTERN.search(generated_text)
+    factors[DAYS_LEFT_KEY] = match.group(1).strip() if match else 'Not Available'
+    return factors
+
+
 def assess_factors(retrieved_text):
     """
-    Assess five factors from the retrieved text and assign score labels along with a verification sentence.
+    Assess four factors from the retrieved text and assign score labels along with a verification sentence.
     Verification sentences must be a maximum of 20 words.
     """
 
@@ -142,9 +152,6 @@ Factors:
    - **Ratings:** [Unfeasible], [Somehow Feasible], [Feasible], [Not Available]
    - **Description:** Consider the feasibility of the proposed timeline.
 
-5. **Days Left to Submit the Proposal**
-   - **Provide the number of days left or [Not Available] if not specified.
-
 Provide your response in the following format:
 
 Complexity:
@@ -162,12 +169,10 @@ Verification Sentence: [Your verification sentence]
 Time Feasibility:
 Ratings: [Rating]
 Verification Sentence: [Your verification sentence]
-
-Days Left to Submit the Proposal: [Number of days left] or [Not Available]
 """
     # Generate the response using Cohere
     try:
-        response = cohere_client.generate(
+        response = get_cohere_client().generate(
             model='command-xlarge-nightly',
             prompt=prompt,
             max_tokens=700,  # Increased max_tokens
@@ -180,43 +185,7 @@ Days Left to Submit the Proposal: [Number of days left] or [Not Available]
         # print("\nGenerated Text:")
         # print(generated_text)
 
-        # Initialize the factors dictionary
-        factors = {}
-
-        # Adjust regex patterns to match the expected format with case insensitivity and flexible spacing
-        factor_patterns = {
-            'Complexity': r'Complexity:\s*Ratings?:\s*([^\n]+)\s*Verification\s+Sentence:\s*(.*?)(?=\n\S|\Z)',
-            'Scalability': r'Scalability:\s*Ratings?:\s*([^\n]+)\s*Verification\s+Sentence:\s*(.*?)(?=\n\S|\Z)',
-            'Integration Requirements': r'Integration\s*Requirements:\s*Ratings?:\s*([^\n]+)\s*Verification\s+Sentence:\s*(.*?)(?=\n\S|\Z)',
-            'Time Feasibility': r'Time\s*Feasibility:\s*Ratings?:\s*([^\n]+)\s*Verification\s+Sentence:\s*(.*?)(?=\n\S|\Z)',
-            'Days Left to Submit the Proposal': r'Days\s*Left\s*to\s*Submit\s*the\s*Proposal:\s*(.*)'
-        }
-
-        for factor, pat in factor_patterns.items():
-            print(generated_text)
-            match = re.search(pat, generated_text, re.DOTALL)
-            if match:
-                if factor != 'Days Left to Submit the Proposal':
-                    rating = match.group(1).strip()
-                    verification_sentence = match.group(2).strip()
-                    # Ensure verification sentence is maximum 20 words
-                    word_count = len(verification_sentence.split())
-                    if word_count > 20:
-                        verification_sentence = "Verification sentence exceeds 20 words."
-                    factors[factor] = {
-                        'Rating': rating,
-                        'Verification Sentence': verification_sentence
-                    }
-                else:
-                    factors[factor] = match.group(1).strip()
-            else:
-                if factor != 'Days Left to Submit the Proposal':
-                    factors[factor] = {
-                        'Rating': 'Not Available',
-                        'Verification Sentence': 'Not Available'
-                    }
-                else:
-                    factors[factor] = 'Not Available'
+        factors = parse_assessment(generated_text)
 
         # Return the factors dictionary
         print(factors)
@@ -245,38 +214,43 @@ def save_yaml_to_file(structured_data, output_path):
     except Exception as e:
         print(f"Error saving structured YAML to file: {e}")
 
-def get_assesment(file_path):
-    embedding = CohereEmbeddings(model="embed-multilingual-v2.0")
-    save_path = "store/vectorstore"
-    
-    # Check if db is available else wait for it to be available
-    db = None
-    while db is None:
-        try:
-            db = load_vector_store(save_path, embedding)
-        except Exception as e:
-            print(f"Database not available yet. Waiting... Error: {e}")
-            time.sleep(5)  # Wait for 5 seconds before retrying
-
-    query = "Was sind wichtige Punkte in der Ausschreibung?"
-    results = query_vector_store(db, query, top_k=5)
-    
-    # Combine retrieved texts
-    retrieved_text = "\n".join([doc.page_content for doc in results])
-    # print(retrieved_text)
+def get_assesment(file_path, save_path="store/vectorstore", strict=False):
+    embedding = get_embeddings()
+
+    # The retrieved text is stored next to the index, so a re-assessment skips loading it
+    retrieved_text = load_context(save_path, "assessment",
+                                  context_key(save_path, embedding, ASSESSMENT_QUERY, ASSESSMENT_TOP_K))
+    if retrieved_text is None:
+        # Check if db is available else wait for it to be available
+        db = None
+        while db is None:
+            try:
+                db = load_vector_store(save_path, embedding)
+            except EmbeddingMismatchError:
+                raise  # waiting does not help, the store has to be rebuilt
+            except Exception as e:
+                print(f"Database not available yet. Waiting... Error: {e}")
+                time.sleep(5)  # Wait for 5 seconds before retrying
+
+        results = query_vector_store(db, ASSESSMENT_QUERY, top_k=ASSESSMENT_TOP_K)
+
+        # Combine retrieved texts
+        retrieved_text = "\n".join([doc.page_content for doc in results])
+        save_context(save_path, "assessment", context_key(save_path, embedding, ASSESSMENT_QUERY, ASSESSMENT_TOP_K),
+                     retrieved_text)
+    else:
+        check_store(save_path, embedding)
 
     # Assess the factors
     factors = assess_factors(retrieved_text)
     print(factors)
+    if not factors and strict:
+        raise RuntimeError(f"Assessment failed for {file_path}")
 
-    # Print and save the factors
     if factors:
-        print("\nFinal Output:")
-        print(yaml.dump(factors, allow_unicode=True, sort_keys=False, indent=4))
-
-        # Save the factors to a YAML file
-        output_yaml_path = "uploads/assessment_labels.yaml"
-        save_yaml_to_file(factors, output_yaml_path)
+        # Keep the factors as a debug artifact of this document
+        artifacts.save(artifacts.namespace_for(file_path), "assessment_labels.yaml",
+                       lambda: yaml.dump(factors, allow_unicode=True, sort_keys=False, indent=4))
     else:
         print("Failed to generate assessment labels.")
 
@@ -1,19 +1,236 @@
-from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+"""
+Storage layer: SQLite engine configuration, schema creation and migrations, and a
+background queue for high-frequency inserts.
 
-db = SQLAlchemy()
+SQLite allows a single writer. With its default rollback journal a writer also blocks
+readers, so background ingestion, chat logging and dashboard reads running at the same
+time failed with "database is locked". Every connection of the app's engine is therefore
+set up with ``SQLITE_PRAGMAS``:
 
-class Tender(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    content = db.Column(db.Text)
+- ``journal_mode=WAL``: readers and the writer no longer block each other;
+- ``busy_timeout``: a second writer waits for the lock instead of failing at once;
+- ``synchronous=NORMAL``: safe in WAL mode, syncs at checkpoints instead of every commit;
+- a larger page cache, in-memory temp tables and memory-mapped reads.
+
+The connection pool holds one connection per thread that touches the database (request
+threads, warm-up workers, the write queue); set ``TENDERMIND_WEB_THREADS`` to the number
+of request threads per process, or ``TENDERMIND_DB_POOL_SIZE`` directly.
+
+Frequent small inserts (chat turns) go through ``enqueue``: it returns at once and one
+writer thread per app commits the queued rows in batches, one transaction per batch.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+
+import sqlalchemy as sa
+
+import near_duplicates  # noqa: F401  (keeps the LSH bands in step with tender writes)
+import portfolio
+from extensions import db
+
+DATABASE_URI = "sqlite:///tenders.db"
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 10000,     # ms
+    "cache_size": -32000,      # KiB
+    "temp_store": "MEMORY",
+    "mmap_size": 268435456,    # bytes
+}
+
+# Background threads using a connection besides the request threads: two warm-up workers
+# (warmup.MAX_WORKERS) and the write queue
+BACKGROUND_CONNECTIONS = 3
+
+
+def pool_size():
+    if os.getenv("TENDERMIND_DB_POOL_SIZE"):
+        return int(os.getenv("TENDERMIND_DB_POOL_SIZE"))
+    return int(os.getenv("TENDERMIND_WEB_THREADS", "8")) + BACKGROUND_CONNECTIONS
 
-def init_db(app):
-    # Set the database to be stored in the same directory with a custom name
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///tender.db'
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False  # Avoid unnecessary overhead
 
-    db.init_app(app)
+def configure(app):
+    """Set the database defaults on ``app.config`` (before ``db.init_app``)."""
+    app.config.setdefault("SQLALCHEMY_DATABASE_URI", DATABASE_URI)
+    app.config.setdefault("SQLALCHEMY_TRACK_MODIFICATIONS", False)  # Disable SQLAlchemy event system for performance
+    app.config.setdefault("SQLITE_PRAGMAS", SQLITE_PRAGMAS)
+    app.config.setdefault("WRITE_QUEUE_BATCH", 200)
+    app.config.setdefault("WRITE_QUEUE_DELAY", 0.05)
+
+    url = sa.engine.make_url(app.config["SQLALCHEMY_DATABASE_URI"])
+    if url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:"):
+        # In-memory databases keep Flask-SQLAlchemy's single static connection
+        options = app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+        options.setdefault("pool_size", pool_size())
+        options.setdefault("max_overflow", 4)
+        options.setdefault("pool_timeout", 30)
+
+
+def _pragma_listener(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    return set_pragmas
+
+
+# Initialize the database and create tables if they don't exist
+def init_db(app):
     with app.app_context():
-        db.create_all()
\ No newline at end of file
+        engine = db.engine
+        if engine.dialect.name == "sqlite" and app.config["SQLITE_PRAGMAS"]:
+            sa.event.listen(engine, "connect", _pragma_listener(app.config["SQLITE_PRAGMAS"]))
+            engine.dispose()  # connections opened before the listener existed are reopened
+        db.create_all()
+        add_missing_columns()
+        portfolio.ensure_aggregates()
+        app.extensions["write_queue"] = WriteQueue(engine, app.config["WRITE_QUEUE_BATCH"],
+                                                   app.config["WRITE_QUEUE_DELAY"])
+
+
+def add_missing_columns():
+    """
+    Add columns that were introduced after a table was first created.
+
+    create_all() only creates missing tables, so databases from earlier versions would
+    otherwise lack new nullable columns. Missing indexes are created as well.
+    """
+    inspector = sa.inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=db.engine.dialect)
+                    conn.execute(sa.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
+def begin_immediate():
+    """
+    Start the session's transaction by taking SQLite's write lock, for a check that a
+    later write in the same transaction depends on (other writers wait at ``busy_timeout``).
+
+    pysqlite only opens a transaction at the first write, so reads before it would run
+    outside it. Call before the session has written anything.
+    """
+    if db.engine.dialect.name == "sqlite":
+        db.session.execute(sa.text("BEGIN IMMEDIATE"))
+
+
+class WriteQueue:
+    """
+    Inserts rows from a background thread in batches. A batch is written once
+    ``max_batch`` rows are waiting or ``max_delay`` seconds after its first row.
+
+    Rows are plain column values inserted with Core, so ORM events (such as the portfolio
+    aggregates of ``Tender``) do not run; use it for append-only tables.
+    """
+
+    def __init__(self, engine, max_batch=200, max_delay=0.05, max_pending=10000):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._lock = threading.Lock()  # guards the writer thread's start and the counts
+        self.counts = {"queued": 0, "written": 0, "batches": 0, "dropped": 0, "failed": 0}
+        atexit.register(self.flush, 10)
+
+    def put(self, table, values):
+        """Queue one row for ``table``; returns False if the queue is full and it was dropped."""
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((table, values))
+        except queue.Full:
+            with self._lock:
+                self.counts["dropped"] += 1
+            return False
+        with self._lock:
+            self.counts["queued"] += 1
+        return True
+
+    def flush(self, timeout=None):
+        """Wait until every queued row has been written (or ``timeout`` expires)."""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        threading.Thread(target=lambda: (self._queue.join(), done.set()), daemon=True).start()
+        return done.wait(timeout)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts, pending=self._queue.qsize())
+
+    def _ensure_writer(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                    self._thread.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._write(batch)
+                with self._lock:
+                    self.counts["written"] += len(batch)
+                    self.counts["batches"] += 1
+            except Exception:
+                # One bad row fails the whole batch: write the rows one by one so only it is lost
+                self._write_each(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_each(self, batch):
+        for row in batch:
+            try:
+                self._write([row])
+                with self._lock:
+                    self.counts["written"] += 1
+            except Exception as e:
+                with self._lock:
+                    self.counts["failed"] += 1
+                print(f"Could not write a queued {row[0].name} row: {e}")
+
+    def _write(self, batch):
+        rows = {}
+        for table, values in batch:
+            rows.setdefault(table, []).append(values)
+        with self.engine.begin() as conn:
+            for table, values in rows.items():
+                conn.execute(table.insert(), values)
+
+
+def write_queue(app=None):
+    from flask import current_app
+
+    return (app or current_app).extensions["write_queue"]
+
+
+def enqueue(model, **values):
+    """Queue an insert of a ``model`` row (e.g. ``enqueue(ChatLog, question=...)``)."""
+    return write_queue().put(model.__table__, values)
@@ -0,0 +1,122 @@
+"""
+Deleting a tender and what was stored for it.
+
+``delete_tender`` removes the ``Tender`` row (the portfolio aggregates and the LSH bands
+follow through their session events) and the tender's chat log, then everything on disk
+and in memory that no other tender uses:
+
+- the vector store folder (chunk manifest, rule findings, MinHash signature). Its chunks
+  in the shared chunk store are released, and chunks no other tender references become
+  tombstones, which ``chunk_store.compactor`` deletes in the background once they pass
+  ``chunk_store.COMPACT_RATIO`` of the stored bytes;
+- the loaded vector store and warmed-up chat managers;
+- the uploaded file and its debug artifacts.
+
+Identical uploads share their file and vector store, so those are kept while another
+tender still points at them. The row is deleted and committed first; the check and the
+removal then run under the database's write lock, which ``/create_tender`` holds until
+a tender referencing a stored upload is committed (a placeholder row while a new
+document is analysed). The report lists the disk and memory reclaimed right away; what
+the compactor reclaims later shows in its stats (``/chat_metrics``).
+"""
+import os
+import shutil
+import sys
+
+import chunk_store
+import warmup
+from artifacts import ARTIFACT_FOLDER, namespace_for
+from database import begin_immediate
+from extensions import db
+from models import ChatLog, Tender
+
+
+def path_bytes(path):
+    """Size of a file, or of every file below a folder, in bytes (0 if missing)."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:  # removed while walking
+                pass
+    return total
+
+
+def _remove(path):
+    size = path_bytes(path)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+    else:
+        return 0
+    return size
+
+
+def _evict(tender_id, index_path):
+    """Drop the tender's in-memory state. Returns (memory bytes, chat managers evicted)."""
+    managers = warmup.scheduler.evict(tender_id)
+    # Conv_RAG is only imported once a chat or prewarm has loaded a vector store
+    memory = sys.modules["Conv_RAG"].evict_vector_store(index_path) if "Conv_RAG" in sys.modules else 0
+    return memory, managers
+
+
+def delete_tender(tender, keep_paths=(), artifact_folder=ARTIFACT_FOLDER):
+    """
+    Delete ``tender`` and the files and cached state only it uses. Paths in
+    ``keep_paths`` (e.g. the legacy shared vector store) are never removed.
+
+    Returns a report of what was removed and reclaimed. The row is deleted first; errors
+    while removing files or releasing chunks are listed under ``errors`` in the report.
+    """
+    tender_id, index_path, file_path = tender.id, tender.index_path, tender.file_path
+
+    # Tenders that copied this one's analysis keep it, without a link to a missing source
+    Tender.query.filter_by(reused_from_id=tender_id).update(
+        {Tender.reused_from_id: None, Tender.reuse_similarity: None}, synchronize_session=False)
+    chat_turns = ChatLog.query.filter_by(tender_id=tender_id).delete(synchronize_session=False)
+    db.session.delete(tender)
+    db.session.commit()
+
+    report = {"tender_id": tender_id, "chat_turns_deleted": chat_turns, "chunks_tombstoned": 0,
+              "disk_bytes": {"index": 0, "upload": 0, "artifacts": 0}, "memory_bytes": 0, "errors": []}
+    report["memory_bytes"], report["chat_managers_evicted"] = _evict(tender_id, index_path)
+
+    # Held until the cleanup is done, so an identical upload cannot start using the index
+    # or file between the check below and their removal (create_tender takes the same lock)
+    begin_immediate()
+    try:
+        report["shared_index"] = bool(index_path) and db.session.query(Tender.id).filter(
+            Tender.index_path == index_path).first() is not None
+        report["shared_upload"] = bool(file_path) and db.session.query(Tender.id).filter(
+            Tender.file_path == file_path).first() is not None
+        if index_path and not report["shared_index"] and index_path not in keep_paths:
+            try:
+                report["chunks_tombstoned"] = chunk_store.release(index_path)
+                # Only once released: the folder's manifest lists the chunks to release
+                report["disk_bytes"]["index"] = _remove(index_path)
+            except Exception as e:
+                _cleanup_failed(report, "index", e)
+        if file_path and not report["shared_upload"] and file_path not in keep_paths:
+            for name, path in (("upload", file_path),
+                               ("artifacts", os.path.join(artifact_folder, namespace_for(file_path)))):
+                try:
+                    report["disk_bytes"][name] = _remove(path)
+                except OSError as e:
+                    _cleanup_failed(report, name, e)
+    finally:
+        db.session.rollback()  # nothing was written: releases the lock
+    report["disk_bytes"]["total"] = sum(report["disk_bytes"].values())
+
+    if report["chunks_tombstoned"]:
+        chunk_store.compactor.request()
+    return report
+
+
+def _cleanup_failed(report, what, error):
+    # The tender is already gone: report what was left behind instead of failing the request
+    report["errors"].append(f"{what}: {error}")
+    print(f"Could not remove the {what} of deleted tender {report['tender_id']}: {error}")
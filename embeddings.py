@@ -0,0 +1,181 @@
+"""
+Embedding backends.
+
+A backend is chosen by a spec string ``"<backend>:<model>"``; a spec without a backend
+prefix names a Cohere model, which is what the app used exclusively before. The default
+comes from ``TENDERMIND_EMBEDDINGS`` and is ``cohere:embed-multilingual-v2.0``.
+
+- ``cohere:<model>``: the Cohere API (network round trip per call).
+- ``local:hashed-ngram``: character 3- to 5-grams hashed into a fixed-size vector. Runs on
+  the CPU without a model download, so ingestion and chat also work offline. A batch is
+  hashed with a few numpy operations over all of its texts at once, and long inputs are
+  split into batches that run on a thread pool (numpy releases the GIL for the heavy parts).
+
+Every vector store records the spec and dimension it was built with in
+``embedding_meta.json``; opening a store with a different backend raises
+``EmbeddingMismatchError`` instead of silently returning meaningless neighbours.
+"""
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_SPEC = "cohere:embed-multilingual-v2.0"
+META_FILE = "embedding_meta.json"
+
+_backends = {}
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+class EmbeddingMismatchError(ValueError):
+    """A vector store is opened with a different embedding model than it was built with."""
+
+
+def register_backend(name):
+    """Register ``factory(model) -> Embeddings`` under a backend name."""
+    def decorator(factory):
+        _backends[name] = factory
+        return factory
+    return decorator
+
+
+def default_spec():
+    return os.getenv("TENDERMIND_EMBEDDINGS", DEFAULT_SPEC)
+
+
+def normalize_spec(spec=None):
+    spec = spec or default_spec()
+    return spec if ":" in spec else f"cohere:{spec}"
+
+
+def get_embeddings(spec=None):
+    """The (shared) embedding backend for ``spec``, or for the configured default."""
+    spec = normalize_spec(spec)
+    with _instances_lock:
+        if spec not in _instances:
+            backend, model = spec.split(":", 1)
+            if backend not in _backends:
+                raise ValueError(f"Unknown embedding backend '{backend}' (known: {', '.join(sorted(_backends))})")
+            _instances[spec] = _backends[backend](model)
+        return _instances[spec]
+
+
+def spec_of(embedding):
+    """The spec an embedding backend instance was created for."""
+    with _instances_lock:
+        for spec, instance in _instances.items():
+            if instance is embedding:
+                return spec
+    return getattr(embedding, "spec", None) or normalize_spec(getattr(embedding, "model", None) or DEFAULT_SPEC)
+
+
+@register_backend("cohere")
+def _cohere(model):
+    from langchain_cohere import CohereEmbeddings
+    return CohereEmbeddings(model=model)
+
+
+class HashedNgramEmbeddings(Embeddings):
+    """
+    Signed feature hashing of character n-grams, L2-normalised.
+
+    Texts are lower-cased and whitespace-collapsed; n-gram hashes are polynomial hashes
+    over the UTF-32 code points.
+    """
+
+    def __init__(self, model="hashed-ngram", dim=768, ngram_range=(3, 5), batch_size=64, workers=None):
+        self.model = model
+        self.spec = f"local:{model}"
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.batch_size = batch_size
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _codes(self, text):
+        text = " " + " ".join(text.lower().split()) + " "
+        return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+
+    def _embed_batch(self, texts):
+        # The whole batch is hashed as one array; n-grams that would span two texts are
+        # masked out and each text's features are binned into its own row
+        codes = [self._codes(t) for t in texts]
+        lengths = np.array([len(c) for c in codes], dtype=np.int64)
+        flat = np.concatenate(codes) if codes else np.zeros(0, dtype=np.uint64)
+        owner = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+        ends = np.cumsum(lengths)
+        counts = np.zeros(len(texts) * self.dim, dtype=np.float64)
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            if len(flat) < n:
+                continue
+            starts = np.arange(len(flat) - n + 1)
+            valid = starts + n <= ends[owner[starts]]
+            h = np.full(len(starts), n, dtype=np.uint64)
+            for i in range(n):
+                h = h * np.uint64(1000003) + flat[i:len(flat) - n + 1 + i]
+            h *= np.uint64(0x9E3779B97F4A7C15)  # spread the bits before taking the bucket
+            h, rows = h[valid], owner[starts[valid]]
+            buckets = ((h >> np.uint64(33)) % np.uint64(self.dim)).astype(np.int64)
+            signs = np.where(h & np.uint64(1), 1.0, -1.0)
+            counts += np.bincount(rows * self.dim + buckets, weights=signs, minlength=len(counts))
+        vectors = counts.reshape(len(texts), self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.where(norms == 0, 1.0, norms)).astype(np.float32).tolist()
+
+    def _executor(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="embed")
+        return self._pool
+
+    def embed_documents(self, texts):
+        if len(texts) <= self.batch_size or self.workers <= 1:
+            return self._embed_batch(texts)
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        return [vector for batch in self._executor().map(self._embed_batch, batches) for vector in batch]
+
+    def embed_query(self, text):
+        return self._embed_batch([text])[0]
+
+
+@register_backend("local")
+def _local(model):
+    if model != "hashed-ngram":
+        raise ValueError(f"Unknown local embedding model '{model}' (known: hashed-ngram)")
+    return HashedNgramEmbeddings(model)
+
+
+def write_store_metadata(folder, embedding, dim):
+    """Record which embedding model built the vector store in ``folder``."""
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, META_FILE), "w", encoding="utf-8") as f:
+        json.dump({"spec": spec_of(embedding), "dim": int(dim)}, f)
+
+
+def read_store_metadata(folder):
+    path = os.path.join(folder, META_FILE)
+    if not os.path.exists(path):
+        # Stores written before the metadata existed were all built with the Cohere default
+        return {"spec": DEFAULT_SPEC, "dim": None}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def check_store(folder, embedding):
+    """
+    Raise ``EmbeddingMismatchError`` if the store was built with a different model.
+    ``embedding`` is a backend instance or a spec string.
+    """
+    spec = normalize_spec(embedding) if isinstance(embedding, str) else spec_of(embedding)
+    stored = read_store_metadata(folder)["spec"]
+    if stored != spec:
+        raise EmbeddingMismatchError(
+            f"Vector store {folder} was built with '{stored}' but is opened with '{spec}'; "
+            f"rebuild it or set TENDERMIND_EMBEDDINGS={stored}")
@@ -0,0 +1,290 @@
+"""
+Bulk ingestion of a directory of tender documents.
+
+    python ingest.py path/to/archive --workers 4 --batch-size 20
+
+Every document goes through the same stages as an upload: store (hash and copy into the
+content-addressed upload folder), index (parse, chunk, embed), extract (structured
+fields) and assess (ratings). Progress is checkpointed per document and stage in a
+SQLite file, together with the stage results, so an interrupted run resumes without
+redoing finished embeddings or LLM calls. Finished documents are written as ``Tender``
+rows in batched transactions.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from pdf_workers import PDFParseError
+
+STAGES = ["store", "index", "extract", "assess"]
+DEFAULT_CHECKPOINT_DB = os.path.join("instance", "ingest_checkpoints.db")
+
+
+class Checkpoints:
+    """
+    Per-document stage progress. Each stage's result is stored as JSON so a resumed run
+    can pick up where the previous one stopped.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS ingest_stage (
+                source TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                result TEXT,
+                seconds REAL,
+                finished_at REAL,
+                PRIMARY KEY (source, fingerprint, stage)
+            )""")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS ingest_error (
+                source TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                error TEXT,
+                failed_at REAL,
+                PRIMARY KEY (source, fingerprint)
+            )""")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def done(self, source, fingerprint):
+        rows = self._conn().execute(
+            "SELECT stage, result FROM ingest_stage WHERE source = ? AND fingerprint = ?",
+            (source, fingerprint),
+        ).fetchall()
+        return {stage: json.loads(result) for stage, result in rows}
+
+    def record(self, source, fingerprint, stage, result, seconds):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO ingest_stage VALUES (?, ?, ?, ?, ?, ?)",
+            (source, fingerprint, stage, json.dumps(result, ensure_ascii=False), seconds, time.time()),
+        )
+        conn.execute("DELETE FROM ingest_error WHERE source = ? AND fingerprint = ?", (source, fingerprint))
+        conn.commit()
+
+    def record_error(self, source, fingerprint, stage, error):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO ingest_error VALUES (?, ?, ?, ?, ?)",
+            (source, fingerprint, stage, error, time.time()),
+        )
+        conn.commit()
+
+
+class DigestClaims:
+    """
+    The first document of a run with a given content digest claims it; identical copies
+    found later in the same run are skipped instead of being indexed and analysed again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._owners = {}
+
+    def claim(self, digest, source):
+        with self._lock:
+            return self._owners.setdefault(digest, source) == source
+
+
+def fingerprint(path):
+    # Size and mtime identify a version of a file cheaply; the content hash comes from "store"
+    stat = os.stat(path)
+    return f"{stat.st_size}-{int(stat.st_mtime)}"
+
+
+def find_documents(directory, pattern):
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if fnmatch.fnmatch(name.lower(), pattern.lower()):
+                yield os.path.join(root, name)
+
+
+def run_stages(source, checkpoints, upload_folder, known_digests, stage_times, claims):
+    """
+    Run the remaining stages for one document. Returns the finished results, or None when
+    the document is a duplicate of one that is already in the database or of another
+    document of this run (see DigestClaims).
+    """
+    from storage import index_path_for, store_file
+
+    key = fingerprint(source)
+    results = checkpoints.done(source, key)
+
+    def stage(name, fn):
+        if name in results:
+            return results[name]
+        started = time.perf_counter()
+        try:
+            value = fn()
+        except Exception as e:
+            checkpoints.record_error(source, key, name, f"{type(e).__name__}: {e}")
+            raise
+        seconds = time.perf_counter() - started
+        checkpoints.record(source, key, name, value, seconds)
+        stage_times.setdefault(name, []).append(seconds)
+        results[name] = value
+        return value
+
+    stored = stage("store", lambda: dict(zip(("digest", "path"), store_file(source, upload_folder))))
+    if stored["digest"] in known_digests or not claims.claim(stored["digest"], source):
+        return None
+    index_path = index_path_for(stored["digest"])
+
+    def index():
+        from RAG_21 import build_index
+        from chunk_store import index_exists
+        if not index_exists(index_path):
+            build_index(stored["path"], index_path)
+        return {"index_path": index_path}
+
+    def extract():
+        from RAG_21 import extract_from_index
+        return extract_from_index(stored["path"], index_path)
+
+    def assess():
+        from complexity import get_assesment
+        from tender_schema import fill_nulls
+        return fill_nulls(get_assesment(stored["path"], index_path))
+
+    name = os.path.splitext(os.path.basename(source))[0][:100]
+    try:
+        stage("index", index)
+    except PDFParseError as e:
+        # Written as a failed tender, so it shows up with its reason instead of being retried every run
+        return {"name": name, "digest": stored["digest"], "path": stored["path"], "error": f"{e.reason}: {e}"}
+    extraction = stage("extract", extract)
+    metrics = stage("assess", assess)
+    return {
+        "name": name,
+        "digest": stored["digest"],
+        "path": stored["path"],
+        "index_path": index_path,
+        "json_data": extraction,
+        "metrics": metrics,
+    }
+
+
+def write_batch(batch):
+    from RAG_21 import EXTRACTION_VERSION
+    from complexity import ASSESSMENT_VERSION
+    from extensions import db
+    from models import Tender
+    from near_duplicates import load_signature
+
+    db.session.add_all([
+        Tender(name=doc["name"], json_data="{}", metrics="{}", content_hash=doc["digest"], file_path=doc["path"],
+               status="failed", error=doc["error"]) if "error" in doc else
+        Tender(name=doc["name"], json_data=json.dumps(doc["json_data"], ensure_ascii=False),
+               metrics=json.dumps(doc["metrics"], ensure_ascii=False), content_hash=doc["digest"],
+               file_path=doc["path"], index_path=doc["index_path"],
+               extraction_version=EXTRACTION_VERSION, assessment_version=ASSESSMENT_VERSION,
+               minhash=load_signature(doc["index_path"]))
+        for doc in batch
+    ])
+    db.session.commit()
+
+
+def ingest(directory, workers=4, batch_size=20, pattern="*.pdf", checkpoint_db=DEFAULT_CHECKPOINT_DB,
+           app=None):
+    from app import create_app
+    from models import Tender
+
+    app = app or create_app()
+    checkpoints = Checkpoints(checkpoint_db)
+    sources = list(find_documents(directory, pattern))
+    with app.app_context():
+        known_digests = {d for (d,) in Tender.query.with_entities(Tender.content_hash)
+                         .filter(Tender.content_hash.isnot(None))}
+    upload_folder = app.config["UPLOAD_FOLDER"]
+
+    print(f"Ingesting {len(sources)} document(s) from {directory} with {workers} worker(s)")
+    stage_times = {}
+    counts = {"written": 0, "duplicate": 0, "failed": 0}
+    pending = []
+    claims = DigestClaims()
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool, app.app_context():
+        futures = {pool.submit(run_stages, source, checkpoints, upload_folder, known_digests, stage_times,
+                               claims): source
+                   for source in sources}
+        for i, future in enumerate(as_completed(futures), 1):
+            source = futures[future]
+            try:
+                doc = future.result()
+            except Exception as e:
+                counts["failed"] += 1
+                print(f"[{i}/{len(sources)}] failed: {source}: {e}")
+                continue
+            if doc is None or doc["digest"] in known_digests:
+                counts["duplicate"] += 1
+                print(f"[{i}/{len(sources)}] already ingested: {source}")
+                continue
+            known_digests.add(doc["digest"])
+            pending.append(doc)
+            if "error" in doc:
+                counts["failed"] += 1
+                print(f"[{i}/{len(sources)}] failed, stored as a failed tender: {source}: {doc['error']}")
+            else:
+                print(f"[{i}/{len(sources)}] done: {source}")
+            if len(pending) >= batch_size:
+                write_batch(pending)
+                counts["written"] += sum("error" not in doc for doc in pending)
+                pending = []
+        if pending:
+            write_batch(pending)
+            counts["written"] += sum("error" not in doc for doc in pending)
+
+    elapsed = time.perf_counter() - started
+    print_summary(len(sources), counts, stage_times, elapsed)
+    return counts
+
+
+def print_summary(total, counts, stage_times, elapsed):
+    print("\nIngestion summary")
+    print(f"  documents: {total}  written: {counts['written']}  duplicates: {counts['duplicate']}  "
+          f"failed: {counts['failed']}")
+    rate = counts["written"] / elapsed if elapsed > 0 else 0.0
+    print(f"  elapsed: {elapsed:.1f}s  throughput: {rate:.2f} docs/s ({rate * 3600:.0f} docs/h)")
+    for stage in STAGES:
+        times = stage_times.get(stage)
+        if times:
+            print(f"  {stage:<8} runs: {len(times):>5}  mean: {sum(times) / len(times):7.2f}s  "
+                  f"total: {sum(times):8.1f}s")
+        else:
+            print(f"  {stage:<8} runs:     0  (resumed from checkpoints)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="folder to scan recursively")
+    parser.add_argument("--workers", type=int, default=4, help="documents processed in parallel")
+    parser.add_argument("--batch-size", type=int, default=20, help="tenders written per transaction")
+    parser.add_argument("--pattern", default="*.pdf", help="file name pattern (default: *.pdf)")
+    parser.add_argument("--checkpoint-db", default=DEFAULT_CHECKPOINT_DB, help="SQLite file for stage checkpoints")
+    args = parser.parse_args()
+    ingest(args.directory, workers=args.workers, batch_size=args.batch_size, pattern=args.pattern,
+           checkpoint_db=args.checkpoint_db)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Single-pass, lenient JSON parser for model output.
+
+Model responses are often almost JSON: wrapped in prose or code fences, cut off by the
+token limit, with trailing commas, single quotes, bare words or Python literals. Rather
+than discarding the whole response, ``parse_json_lenient`` reads as far as it can in one
+pass, closes whatever strings, objects and arrays are still open at the end and drops a
+key whose value never arrived. The caller can then re-request just the missing fields.
+"""
+
+_LITERALS = {
+    "true": True, "True": True,
+    "false": False, "False": False,
+    "null": None, "None": None,
+}
+
+_WHITESPACE = " \t\r\n"
+
+
+class ParseResult:
+    def __init__(self, value, repaired):
+        self.value = value
+        # True when anything had to be fixed or guessed to produce ``value``
+        self.repaired = repaired
+
+    def __repr__(self):
+        return f"ParseResult(value={self.value!r}, repaired={self.repaired})"
+
+
+class _Truncated(Exception):
+    """Raised when the input ends before a value has started."""
+
+
+class _Parser:
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+        self.repaired = False
+
+    def at_end(self):
+        return self.pos >= len(self.text)
+
+    def peek(self):
+        return self.text[self.pos] if self.pos < len(self.text) else ""
+
+    def skip_whitespace(self):
+        text, pos = self.text, self.pos
+        while pos < len(text) and text[pos] in _WHITESPACE:
+            pos += 1
+        self.pos = pos
+
+    def parse_value(self):
+        self.skip_whitespace()
+        if self.at_end():
+            raise _Truncated()
+        ch = self.peek()
+        if ch == "{":
+            return self.parse_object()
+        if ch == "[":
+            return self.parse_array()
+        if ch in "\"'":
+            return self.parse_string()
+        return self.parse_bare()
+
+    def parse_object(self):
+        self.pos += 1  # '{'
+        result = {}
+        while True:
+            self.skip_whitespace()
+            if self.at_end():
+                self.repaired = True
+                return result
+            ch = self.peek()
+            if ch == "}":
+                self.pos += 1
+                return result
+            if ch == ",":
+                self.pos += 1
+                continue
+            if ch == "]":
+                # Mismatched closer: treat it as the end of this object
+                self.repaired = True
+                self.pos += 1
+                return result
+
+            key = self.parse_key()
+            self.skip_whitespace()
+            if self.peek() == ":":
+                self.pos += 1
+            elif self.at_end():
+                self.repaired = True
+                return result
+            else:
+                self.repaired = True  # missing colon
+            try:
+                value = self.parse_value()
+            except _Truncated:
+                # The key arrived but its value did not
+                self.repaired = True
+                return result
+            result[key] = value
+
+            self.skip_whitespace()
+            ch = self.peek()
+            if ch not in (",", "}", ""):
+                self.repaired = True  # missing comma between members
+
+    def parse_array(self):
+        self.pos += 1  # '['
+        result = []
+        while True:
+            self.skip_whitespace()
+            if self.at_end():
+                self.repaired = True
+                return result
+            ch = self.peek()
+            if ch == "]":
+                self.pos += 1
+                return result
+            if ch == ",":
+                self.pos += 1
+                continue
+            if ch == "}":
+                self.repaired = True
+                self.pos += 1
+                return result
+            try:
+                result.append(self.parse_value())
+            except _Truncated:
+                self.repaired = True
+                return result
+
+    def parse_key(self):
+        if self.peek() in "\"'":
+            return self.parse_string()
+        # Unquoted key: read up to the colon
+        self.repaired = True
+        start = self.pos
+        text = self.text
+        while self.pos < len(text) and text[self.pos] not in ":,}\n":
+            self.pos += 1
+        return text[start:self.pos].strip()
+
+    def parse_string(self):
+        quote = self.peek()
+        if quote == "'":
+            self.repaired = True
+        self.pos += 1
+        text = self.text
+        parts = []
+        start = self.pos
+        while self.pos < len(text):
+            ch = text[self.pos]
+            if ch == quote:
+                parts.append(text[start:self.pos])
+                self.pos += 1
+                return "".join(parts)
+            if ch == "\\":
+                parts.append(text[start:self.pos])
+                parts.append(self.parse_escape())
+                start = self.pos
+                continue
+            self.pos += 1
+        # Unterminated string: keep what we have
+        parts.append(text[start:])
+        self.repaired = True
+        return "".join(parts)
+
+    def parse_escape(self):
+        self.pos += 1  # backslash
+        if self.at_end():
+            self.repaired = True
+            return ""
+        ch = self.text[self.pos]
+        self.pos += 1
+        simple = {'"': '"', "'": "'", "\\": "\\", "/": "/", "b": "\b", "f": "\f",
+                  "n": "\n", "r": "\r", "t": "\t"}
+        if ch in simple:
+            return simple[ch]
+        if ch == "u":
+            digits = self.text[self.pos:self.pos + 4]
+            try:
+                code = int(digits, 16)
+            except ValueError:
+                self.repaired = True
+                return "u"
+            if len(digits) < 4:
+                self.repaired = True
+                self.pos = len(self.text)
+                return ""
+            self.pos += 4
+            return chr(code)
+        self.repaired = True
+        return ch
+
+    def parse_bare(self):
+        """Numbers, literals and unquoted words, up to the next delimiter."""
+        start = self.pos
+        text = self.text
+        while self.pos < len(text) and text[self.pos] not in ",}]\n":
+            self.pos += 1
+        token = text[start:self.pos].strip()
+        if token in _LITERALS:
+            return _LITERALS[token]
+        try:
+            return int(token)
+        except ValueError:
+            pass
+        try:
+            return float(token)
+        except ValueError:
+            pass
+        self.repaired = True
+        return token
+
+
+def _find_start(text):
+    """Index of the first '{' or '[' outside any leading prose or code fence."""
+    for i, ch in enumerate(text):
+        if ch in "{[":
+            return i
+    return -1
+
+
+def parse_json_lenient(text):
+    """
+    Parse model output into a Python value, repairing it where necessary.
+
+    Returns a ``ParseResult``; ``value`` is ``None`` when no JSON value was found at all.
+    """
+    if not text:
+        return ParseResult(None, True)
+    start = _find_start(text)
+    if start < 0:
+        return ParseResult(None, True)
+    parser = _Parser(text)
+    parser.pos = start
+    if start > 0 and text[:start].strip():
+        parser.repaired = True
+    value = parser.parse_value()
+
+    # Anything other than whitespace or a closing code fence after the value is noise
+    rest = text[parser.pos:].strip()
+    if rest and rest.strip("`") != "":
+        parser.repaired = True
+    return ParseResult(value, parser.repaired)
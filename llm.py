@@ -0,0 +1,31 @@
+import os
+import threading
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file (optional)
+load_dotenv()
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_cohere_client():
+    """
+    Return the shared Cohere client, creating it on first use.
+
+    The cohere SDK is only imported here so that importing the web app (or
+    any module that talks to the model) does not require an API key or pay
+    for the SDK import until a request actually needs it.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import cohere
+
+                api_key = os.getenv('COHERE_API_KEY')
+                if not api_key:
+                    raise ValueError("COHERE_API_KEY environment variable not set.")
+                _client = cohere.Client(api_key)
+    return _client
@@ -1,9 +1,71 @@
+import datetime
+
 from extensions import db  # Import db from extensions.py
 
 class Tender(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    json_data = db.Column(db.Text, nullable=True)
+    json_data = db.Column(db.Text, nullable=False)  # Store JSON data as text
+    metrics = db.Column(db.Text, nullable=True)  # Any metrics stored as text
+    content_hash = db.Column(db.String(64), nullable=True, index=True)  # SHA-256 of the uploaded file
+    file_path = db.Column(db.String(255), nullable=True)  # Content-addressed upload path
+    index_path = db.Column(db.String(255), nullable=True)  # Vector store built from the upload
+    # Derived from json_data on every write (see portfolio.py) so aggregates can be kept in SQL
+    revenue_potential = db.Column(db.Float, nullable=True, index=True)
+    deadline = db.Column(db.Date, nullable=True, index=True)
+    # Prompt/schema versions json_data and metrics were produced with (see backfill.py)
+    extraction_version = db.Column(db.String(20), nullable=True)
+    assessment_version = db.Column(db.String(20), nullable=True)
+    # MinHash signature of the document, indexed in TenderBand (see near_duplicates.py)
+    minhash = db.Column(db.LargeBinary, nullable=True)
+    # Set when the analysis was copied from a near-identical earlier tender
+    reused_from_id = db.Column(db.Integer, nullable=True)
+    reuse_similarity = db.Column(db.Float, nullable=True)
+    # "failed" when the document could not be processed (e.g. PDF parsing hit its time or
+    # memory limit, see pdf_workers.py), with the reason in `error`; NULL once analysed
+    status = db.Column(db.String(20), nullable=True)
+    error = db.Column(db.Text, nullable=True)
 
     def __repr__(self):
         return f'<Tender {self.name}>'
+
+
+class TenderBand(db.Model):
+    """One LSH bucket of a tender's MinHash signature, maintained by near_duplicates.py."""
+    bucket = db.Column(db.BigInteger, primary_key=True, autoincrement=False)  # hash of the band number and values
+    tender_id = db.Column(db.Integer, primary_key=True, autoincrement=False, index=True)
+    band = db.Column(db.SmallInteger, nullable=False)
+
+
+# Portfolio aggregates, maintained by portfolio.py in the same transaction as tender writes
+
+class PortfolioRatingCount(db.Model):
+    factor = db.Column(db.String(50), primary_key=True)
+    rating = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class PortfolioDeadlineCount(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class PortfolioSummary(db.Model):
+    id = db.Column(db.Integer, primary_key=True)  # Single row, id 1
+    tender_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue_total = db.Column(db.Float, nullable=False, default=0.0)
+    revenue_median = db.Column(db.Float, nullable=True)
+
+
+class ChatLog(db.Model):
+    """One chat turn. Written through the batched write queue (database.enqueue)."""
+    id = db.Column(db.Integer, primary_key=True)
+    tender_id = db.Column(db.Integer, nullable=True, index=True)
+    conversation_type = db.Column(db.String(20), nullable=False)  # 'topic' or 'general'
+    topic = db.Column(db.String(100), nullable=True)
+    question = db.Column(db.Text, nullable=False)
+    answer = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    latency_ms = db.Column(db.Float, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow, index=True)
@@ -0,0 +1,262 @@
+"""
+Near-duplicate and related-tender detection with MinHash and locality-sensitive hashing.
+
+Buyers often republish a tender with small changes. Every document gets a MinHash
+signature of its word shingles, computed from the preprocessed page text while it is
+indexed (``RAG_21.convert_to_vector_store``) and stored next to its vector store. The
+share of equal positions in two signatures estimates the Jaccard similarity of the two
+documents' shingle sets.
+
+Signatures are split into ``BANDS`` bands of ``ROWS`` values. Each band is hashed to a
+bucket and stored in the ``tender_band`` table, kept in step with the ``Tender`` rows by
+a session event (like the portfolio aggregates). Finding the tenders similar to a
+document is one indexed lookup of its buckets, followed by comparing the signatures of
+the few tenders that share a bucket, instead of a comparison with every tender. With
+32 bands of 4 rows, a tender with a similarity of 0.5 shares a bucket with a probability
+of 0.87, one at 0.8 practically always and one at 0.2 with a probability of 0.05.
+
+numpy is only imported when a signature is computed or compared, so importing this
+module (the app does, for the session event) stays cheap.
+"""
+import hashlib
+import json
+import os
+import re
+import zlib
+
+import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import Tender, TenderBand
+
+SIGNATURE_FILE = "minhash.json"
+
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 5
+SEED = 1
+
+# Similar tenders are listed from this estimated similarity on...
+MIN_SIMILARITY = 0.3
+# ...and from this one on, their analysis is reused instead of calling the model
+REUSE_THRESHOLD = 0.9
+
+# Largest prime below 2**32: (a * x + b) % PRIME fits uint64 for 32-bit a, b and x
+_PRIME = 4294967291
+_WORD = re.compile(r"\w+")
+_permutations = None
+
+
+def _hash_parameters():
+    global _permutations
+    if _permutations is None:
+        import numpy as np
+
+        rng = np.random.RandomState(SEED)
+        a = rng.randint(1, _PRIME, size=NUM_PERM, dtype=np.uint64)
+        b = rng.randint(0, _PRIME, size=NUM_PERM, dtype=np.uint64)
+        _permutations = a, b
+    return _permutations
+
+
+def shingles(texts):
+    """Hashes (uint32) of the distinct SHINGLE_WORDS-word shingles of ``texts``."""
+    import numpy as np
+
+    words = [word for text in texts for word in _WORD.findall(text.lower())]
+    if not words:
+        return np.zeros(0, dtype=np.uint64)
+    ids = np.fromiter((zlib.crc32(word.encode("utf-8")) for word in words), dtype=np.uint64, count=len(words))
+    width = min(SHINGLE_WORDS, len(ids))
+    # Polynomial hash of every window of `width` words, modulo 2**32
+    hashes = np.zeros(len(ids) - width + 1, dtype=np.uint64)
+    for offset in range(width):
+        hashes = (hashes * np.uint64(1000003) + ids[offset:len(ids) - width + 1 + offset]) & np.uint64(0xFFFFFFFF)
+    return np.unique(hashes)
+
+
+def signature(texts, block=4096):
+    """
+    MinHash signature (NUM_PERM uint32 values) of the word shingles of ``texts``, or None
+    for a document without text (e.g. a scanned PDF without a text layer).
+    """
+    import numpy as np
+
+    values = shingles(texts)
+    if not len(values):
+        return None
+    a, b = _hash_parameters()
+    result = np.full(NUM_PERM, _PRIME, dtype=np.uint64)
+    for start in range(0, len(values), block):
+        part = values[start:start + block, None]
+        np.minimum(result, ((part * a[None, :] + b[None, :]) % np.uint64(_PRIME)).min(axis=0), out=result)
+    return result.astype(np.uint32)
+
+
+def to_bytes(sig):
+    return None if sig is None else sig.astype("<u4").tobytes()
+
+
+def from_bytes(data):
+    import numpy as np
+
+    return np.frombuffer(data, dtype="<u4")
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two documents from their signatures (bytes or arrays)."""
+    import numpy as np
+
+    a = from_bytes(a) if isinstance(a, (bytes, memoryview)) else a
+    b = from_bytes(b) if isinstance(b, (bytes, memoryview)) else b
+    return float(np.mean(a == b))
+
+
+def buckets(data):
+    """
+    (band, bucket) pairs of a signature given as bytes. The band number is part of the
+    hash, so a bucket identifies its band and lookups only need the bucket column.
+    """
+    width = ROWS * 4
+    return [(band, int.from_bytes(hashlib.blake2b(data[band * width:(band + 1) * width], digest_size=8,
+                                                  salt=band.to_bytes(2, "little")).digest(),
+                                  "little", signed=True))
+            for band in range(BANDS)]
+
+
+# --- Signatures stored next to the vector store ---------------------------------------
+
+def save_signature(folder, sig):
+    if sig is None:
+        return
+    os.makedirs(folder, exist_ok=True)
+    tmp_path = os.path.join(folder, SIGNATURE_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"num_perm": NUM_PERM, "shingle_words": SHINGLE_WORDS, "seed": SEED,
+                   "signature": [int(v) for v in sig]}, f)
+    os.replace(tmp_path, os.path.join(folder, SIGNATURE_FILE))
+
+
+def load_signature(folder):
+    """The stored signature of a vector store folder as bytes, or None."""
+    import numpy as np
+
+    path = os.path.join(folder, SIGNATURE_FILE) if folder else None
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        stored = json.load(f)
+    if (stored.get("num_perm"), stored.get("shingle_words"), stored.get("seed")) != (NUM_PERM, SHINGLE_WORDS, SEED):
+        return None
+    return to_bytes(np.asarray(stored["signature"], dtype=np.uint32))
+
+
+# --- LSH index ------------------------------------------------------------------------
+
+class Match:
+    def __init__(self, tender_id, name, similarity):
+        self.id = tender_id
+        self.name = name
+        self.similarity = similarity
+
+    def to_dict(self):
+        return {"id": self.id, "name": self.name, "similarity": round(self.similarity, 3)}
+
+
+def find_similar(sig, limit=5, min_similarity=MIN_SIMILARITY, exclude=None, session=None):
+    """
+    Tenders whose document is similar to the signature ``sig`` (bytes), most similar
+    first. Only tenders sharing at least one LSH bucket are compared.
+    """
+    from extensions import db
+
+    if sig is None:
+        return []
+    session = session or db.session
+    candidates = session.execute(
+        sa.select(TenderBand.tender_id).distinct()
+        .where(TenderBand.bucket.in_([bucket for _, bucket in buckets(sig)]))
+    ).scalars().all()
+    if exclude is not None:
+        candidates = [c for c in candidates if c != exclude]
+    if not candidates:
+        return []
+    rows = session.execute(
+        sa.select(Tender.id, Tender.name, Tender.minhash).where(Tender.id.in_(candidates))
+    ).all()
+    matches = [Match(row.id, row.name, similarity(sig, row.minhash)) for row in rows if row.minhash]
+    matches = [m for m in matches if m.similarity >= min_similarity]
+    matches.sort(key=lambda m: (-m.similarity, m.id))
+    return matches[:limit]
+
+
+def _replace_bands(conn, tender_id, sig):
+    conn.execute(sa.delete(TenderBand).where(TenderBand.tender_id == tender_id))
+    if sig:
+        conn.execute(sa.insert(TenderBand), [{"band": band, "bucket": bucket, "tender_id": tender_id}
+                                             for band, bucket in buckets(sig)])
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session, flush_context):
+    # session.new/dirty/deleted still describe the flush that just ran, and new rows have ids
+    conn = None
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Tender) or obj.id is None:
+            continue
+        if obj in session.deleted:
+            sig = None
+        elif obj in session.new:
+            if not obj.minhash:
+                continue
+            sig = obj.minhash
+        elif sa.inspect(obj).attrs.minhash.history.has_changes():
+            sig = obj.minhash
+        else:
+            continue
+        conn = conn or session.connection()
+        _replace_bands(conn, obj.id, sig)
+
+
+def rebuild(session=None, missing_only=False):
+    """
+    Fill in signatures of tenders that have none (from their stored signature file, or
+    from the chunks of their vector store) and rebuild the LSH table. Returns the number
+    of tenders indexed.
+    """
+    from extensions import db
+
+    session = session or db.session
+    updated = 0
+    for tender in Tender.query.filter(Tender.minhash.is_(None), Tender.index_path.isnot(None)):
+        sig = load_signature(tender.index_path) or signature_of_index(tender.index_path)
+        if sig:
+            tender.minhash = sig
+            updated += 1
+    session.flush()
+    if not missing_only:
+        conn = session.connection()
+        conn.execute(sa.delete(TenderBand))
+        for tender_id, sig in session.execute(sa.select(Tender.id, Tender.minhash)
+                                              .where(Tender.minhash.isnot(None))):
+            _replace_bands(conn, tender_id, sig)
+    session.commit()
+    return updated
+
+
+def signature_of_index(folder):
+    """
+    Signature from the chunk texts of a stored vector store, for tenders indexed before
+    signatures were computed. Chunks are preprocessed page text, so this matches the
+    signature computed at indexing closely (shingles across chunk borders are missing).
+    """
+    import chunk_store
+
+    if not chunk_store.index_exists(folder):
+        return None
+    sig = to_bytes(signature(chunk_store.texts(folder)))
+    if sig is not None:
+        save_signature(folder, from_bytes(sig))
+    return sig
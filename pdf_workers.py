@@ -0,0 +1,253 @@
+"""
+PDF parsing in isolated worker processes.
+
+A malformed or huge scanned PDF can keep pypdf busy for minutes or grow its memory
+without bound. Parsed in the web process, that stalls every other request of the worker.
+``load_pages`` therefore hands each document to a pool of worker processes and waits for
+the page texts:
+
+- At most ``POOL_SIZE`` documents are parsed at once; further callers wait for a slot.
+- A document that takes longer than ``TIMEOUT_S`` gets its worker killed.
+- Every worker limits its address space (RLIMIT_AS) to what it used after start-up plus
+  ``MEMORY_MB``. A document that needs more fails with a MemoryError in the worker (or
+  gets it killed), not the web process.
+- A worker is replaced after ``DOCS_PER_WORKER`` documents, so leaked or fragmented
+  memory is handed back to the system.
+
+Failures raise ``PDFParseError`` with a ``reason`` ("timeout", "memory", "crashed" or
+"invalid"). The watchdog counters in ``stats()`` count timeouts, memory kills and crashes.
+
+Configuration (environment): ``TENDERMIND_PDF_WORKERS`` (default 2; 0 parses in the
+calling process without limits), ``TENDERMIND_PDF_TIMEOUT_S`` (default 120),
+``TENDERMIND_PDF_MEMORY_MB`` (default 1024) and ``TENDERMIND_PDF_DOCS_PER_WORKER``
+(default 50).
+"""
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows; workers then run without a memory limit
+    resource = None
+
+POOL_SIZE = int(os.getenv("TENDERMIND_PDF_WORKERS", "2"))
+TIMEOUT_S = float(os.getenv("TENDERMIND_PDF_TIMEOUT_S", "120"))
+MEMORY_MB = int(os.getenv("TENDERMIND_PDF_MEMORY_MB", "1024"))
+DOCS_PER_WORKER = int(os.getenv("TENDERMIND_PDF_DOCS_PER_WORKER", "50"))
+
+# Time for a new worker to import the PDF loader, on top of the document's time limit
+STARTUP_TIMEOUT_S = 60
+
+REASONS = ("timeout", "memory", "crashed", "invalid")
+
+
+class PDFParseError(Exception):
+    """A document could not be parsed; ``reason`` is one of REASONS."""
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+def parse(file_path):
+    """[(page number, text)] of a PDF, numbered from 1, read in the calling process."""
+    from langchain_community.document_loaders import PyPDFLoader
+
+    pages = PyPDFLoader(file_path).load()
+    return [(page.metadata.get("page", i) + 1, page.page_content) for i, page in enumerate(pages)]
+
+
+def _address_space():
+    """Current virtual memory size of this process in bytes, or None where unknown."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmSize:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _serve(conn, memory_mb):
+    # Runs in the worker process: import the loader first, so the limit only covers parsing
+    from langchain_community.document_loaders import PyPDFLoader  # noqa: F401
+
+    used = _address_space()
+    if resource is not None and used is not None and memory_mb > 0:
+        limit = used + memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    conn.send(("ready", None))
+    while True:
+        try:
+            file_path = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if file_path is None:
+            return
+        try:
+            conn.send(("ok", parse(file_path)))
+        except MemoryError:
+            conn.send(("memory", f"{os.path.basename(file_path)} needs more than {memory_mb} MB to parse"))
+            return  # the heap may be fragmented: let the pool start a fresh worker
+        except Exception as e:
+            conn.send(("invalid", f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, context, memory_mb):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child_conn, memory_mb), name="pdf-worker", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.documents = 0
+        self.ready = False
+
+    def run(self, file_path, timeout):
+        """Parse one document. Returns (status, payload); status "timeout" or "died" on failure."""
+        if not self.ready:
+            if not self.conn.poll(STARTUP_TIMEOUT_S):
+                return "timeout", f"PDF worker did not start within {STARTUP_TIMEOUT_S} s"
+            try:
+                self.conn.recv()
+            except EOFError:
+                return "died", "PDF worker exited during start-up"
+            self.ready = True
+        self.documents += 1
+        self.conn.send(file_path)
+        if not self.conn.poll(timeout):
+            return "timeout", f"{os.path.basename(file_path)} took longer than {timeout:.3g} s to parse"
+        try:
+            return self.conn.recv()
+        except EOFError:
+            return "died", None
+
+    def alive(self):
+        return self.process.is_alive()
+
+    def exitcode(self, timeout=5):
+        self.process.join(timeout)
+        return self.process.exitcode
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(5)
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(5)
+        self.kill()
+
+
+class PDFWorkerPool:
+    def __init__(self, size=POOL_SIZE, timeout=TIMEOUT_S, memory_mb=MEMORY_MB, docs_per_worker=DOCS_PER_WORKER):
+        self.size = size
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.docs_per_worker = docs_per_worker
+        # Spawned, not forked: the web process has threads and open database connections
+        self._context = multiprocessing.get_context("spawn")
+        self._slots = threading.BoundedSemaphore(max(size, 1))
+        self._lock = threading.Lock()
+        self._idle = []
+        self._busy = 0
+        self.counts = {"documents": 0, "pages": 0, "failed": 0, "timeouts": 0, "oom_kills": 0, "crashes": 0,
+                       "invalid": 0, "workers_started": 0, "workers_recycled": 0}
+        self.parse_seconds = 0.0
+
+    def load_pages(self, file_path, timeout=None):
+        """[(page number, text)] of a PDF, parsed in a worker. Raises PDFParseError."""
+        if self.size <= 0:
+            return parse(file_path)
+        timeout = self.timeout if timeout is None else timeout
+        with self._slots:
+            worker = self._checkout()
+            started = time.perf_counter()
+            try:
+                status, payload = worker.run(file_path, timeout)
+            except BaseException:
+                worker.kill()
+                with self._lock:
+                    self._busy -= 1
+                raise
+            self._checkin(worker, status)
+        reason, message = ("ok", None) if status == "ok" else self._failure(worker, status, payload)
+        with self._lock:
+            self.parse_seconds += time.perf_counter() - started
+            self.counts["documents"] += 1
+            if status == "ok":
+                self.counts["pages"] += len(payload)
+                return payload
+            self.counts["failed"] += 1
+            self.counts[{"timeout": "timeouts", "memory": "oom_kills", "crashed": "crashes",
+                         "invalid": "invalid"}[reason]] += 1
+        print(f"Could not parse {file_path}: {message}")
+        raise PDFParseError(reason, message)
+
+    def _failure(self, worker, status, payload):
+        if status in ("timeout", "memory", "invalid"):
+            return status, payload
+        # The worker died without answering: killed by the kernel's OOM killer, or a crash in native code
+        code = worker.exitcode()
+        if code == -signal.SIGKILL:
+            return "memory", "The PDF worker was killed while parsing, most likely for running out of memory"
+        return "crashed", f"The PDF worker exited with code {code} while parsing"
+
+    def _checkout(self):
+        with self._lock:
+            self._busy += 1
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.alive():
+                    return worker
+                worker.kill()
+            self.counts["workers_started"] += 1
+        return _Worker(self._context, self.memory_mb)
+
+    def _checkin(self, worker, status):
+        with self._lock:
+            self._busy -= 1
+            if status in ("ok", "invalid") and worker.alive():
+                if worker.documents < self.docs_per_worker:
+                    self._idle.append(worker)
+                    return
+                self.counts["workers_recycled"] += 1
+                recycle = True
+            else:
+                recycle = False
+        if recycle:
+            worker.stop()
+        else:
+            worker.kill()
+
+    def shutdown(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
+
+    def stats(self):
+        with self._lock:
+            documents = self.counts["documents"]
+            return dict(self.counts, busy=self._busy, idle=len(self._idle), size=self.size,
+                        timeout_s=self.timeout, memory_mb=self.memory_mb,
+                        mean_parse_ms=round(self.parse_seconds * 1000 / documents, 1) if documents else 0.0)
+
+
+pool = PDFWorkerPool()
+
+
+def load_pages(file_path, timeout=None):
+    return pool.load_pages(file_path, timeout)
+
+
+def stats():
+    return pool.stats()
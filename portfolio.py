@@ -0,0 +1,256 @@
+"""
+Portfolio KPIs maintained incrementally.
+
+Every insert, update or delete of a ``Tender`` adjusts the aggregate tables in the same
+flush (and so the same transaction) as the tender row itself:
+
+- ``PortfolioRatingCount``: tenders per factor and rating,
+- ``PortfolioDeadlineCount``: tenders per submission deadline day,
+- ``PortfolioSummary``: tender count, revenue total and median.
+
+Reading the portfolio is then a handful of primary-key lookups instead of loading and
+parsing the metrics of every tender. The median needs a walk of the revenue index, so a
+write that changes a revenue estimate only clears it; the next ``snapshot`` computes it
+and stores it until the next such write.
+"""
+import datetime
+import json
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import PortfolioDeadlineCount, PortfolioRatingCount, PortfolioSummary, Tender
+from value_parsing import parse_amount, parse_date
+
+FACTORS = ["Complexity", "Scalability", "Integration Requirements", "Time Feasibility"]
+KNOWN_RATINGS = {r.lower(): r for r in
+                 ["Low", "Moderate", "High", "Unfeasible", "Somehow Feasible", "Feasible", "Not Available"]}
+
+# Set on a session to write tenders without touching the aggregates (used by rebuild)
+SKIP_KEY = "portfolio_skip"
+_DELTAS_KEY = "portfolio_deltas"
+
+
+def normalize_rating(value):
+    if not isinstance(value, str):
+        return "Not Available"
+    cleaned = value.strip().strip("[]").strip()
+    return KNOWN_RATINGS.get(cleaned.lower(), "Not Available")
+
+
+def _loads(value):
+    if not value:
+        return {}
+    try:
+        data = json.loads(value)
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def ratings_from_metrics(metrics_json):
+    metrics = _loads(metrics_json)
+    ratings = {}
+    for factor in FACTORS:
+        entry = metrics.get(factor)
+        ratings[factor] = normalize_rating(entry.get("Rating") if isinstance(entry, dict) else None)
+    return ratings
+
+
+def derive_fields(tender):
+    """
+    Set the columns derived from the tender's extraction (revenue potential, deadline).
+    """
+    data = _loads(tender.json_data)
+    overview = data.get("Übersicht") if isinstance(data.get("Übersicht"), dict) else {}
+    tender.revenue_potential = parse_amount(data.get("Revenue_Potential"))
+    tender.deadline = parse_date(overview.get("Abgabefrist"))
+
+
+class _Deltas:
+    def __init__(self):
+        self.tenders = 0
+        self.revenue_count = 0
+        self.revenue_total = 0.0
+        self.revenue_changed = False
+        self.ratings = {}
+        self.deadlines = {}
+
+    def add(self, contribution, sign):
+        ratings, revenue, deadline = contribution
+        self.tenders += sign
+        for factor, rating in ratings.items():
+            key = (factor, rating)
+            self.ratings[key] = self.ratings.get(key, 0) + sign
+        if revenue is not None:
+            self.revenue_changed = True
+            self.revenue_count += sign
+            self.revenue_total += sign * revenue
+        if deadline is not None:
+            self.deadlines[deadline] = self.deadlines.get(deadline, 0) + sign
+
+
+def _stored_contribution(session, tender_id):
+    """The tender's contribution as currently stored in the database (before this flush)."""
+    row = session.connection().execute(
+        text("SELECT metrics, revenue_potential, deadline FROM tender WHERE id = :id"), {"id": tender_id}
+    ).first()
+    if row is None:
+        return None
+    deadline = row[2]
+    if isinstance(deadline, str):
+        deadline = datetime.date.fromisoformat(deadline)
+    return ratings_from_metrics(row[0]), row[1], deadline
+
+
+def _contribution(tender):
+    return ratings_from_metrics(tender.metrics), tender.revenue_potential, tender.deadline
+
+
+@event.listens_for(Session, "before_flush")
+def _before_flush(session, flush_context, instances):
+    if session.info.get(SKIP_KEY):
+        return
+    deltas = session.info.setdefault(_DELTAS_KEY, _Deltas())
+    for obj in session.new:
+        if isinstance(obj, Tender):
+            derive_fields(obj)
+            deltas.add(_contribution(obj), +1)
+    for obj in session.dirty:
+        if isinstance(obj, Tender) and session.is_modified(obj) and obj.id is not None:
+            old = _stored_contribution(session, obj.id)
+            derive_fields(obj)
+            if old is not None:
+                deltas.add(old, -1)
+                deltas.add(_contribution(obj), +1)
+    for obj in session.deleted:
+        if isinstance(obj, Tender) and obj.id is not None:
+            old = _stored_contribution(session, obj.id)
+            if old is not None:
+                deltas.add(old, -1)
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session, flush_context):
+    deltas = session.info.pop(_DELTAS_KEY, None)
+    if deltas is None or session.info.get(SKIP_KEY):
+        return
+    conn = session.connection()
+    for (factor, rating), change in deltas.ratings.items():
+        if change:
+            conn.execute(text(
+                "INSERT INTO portfolio_rating_count (factor, rating, count) VALUES (:f, :r, :c) "
+                "ON CONFLICT (factor, rating) DO UPDATE SET count = count + :c"
+            ), {"f": factor, "r": rating, "c": change})
+    for day, change in deltas.deadlines.items():
+        if change:
+            conn.execute(text(
+                "INSERT INTO portfolio_deadline_count (day, count) VALUES (:d, :c) "
+                "ON CONFLICT (day) DO UPDATE SET count = count + :c"
+            ), {"d": day.isoformat(), "c": change})
+    if deltas.tenders or deltas.revenue_changed:
+        # A NULL median with estimates present means "stale": snapshot() recomputes it
+        conn.execute(text(
+            "INSERT INTO portfolio_summary (id, tender_count, revenue_count, revenue_total) "
+            "VALUES (1, :t, :n, :s) ON CONFLICT (id) DO UPDATE SET "
+            "tender_count = tender_count + :t, revenue_count = revenue_count + :n, "
+            "revenue_total = revenue_total + :s, "
+            "revenue_median = CASE WHEN :changed THEN NULL ELSE revenue_median END"
+        ), {"t": deltas.tenders, "n": deltas.revenue_count, "s": deltas.revenue_total,
+            "changed": deltas.revenue_changed})
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _after_rollback(session, previous_transaction):
+    # Deltas of a failed flush must not leak into the next one
+    session.info.pop(_DELTAS_KEY, None)
+
+
+def _update_median(conn):
+    # One statement, so the median matches the tenders at the time it runs even if a write
+    # commits between snapshot() finding it stale and recomputing it
+    conn.execute(text(
+        "UPDATE portfolio_summary SET revenue_median = ("
+        " SELECT AVG(revenue_potential) FROM (SELECT revenue_potential FROM tender"
+        " WHERE revenue_potential IS NOT NULL ORDER BY revenue_potential"
+        " LIMIT 2 - (SELECT revenue_count FROM portfolio_summary WHERE id = 1) % 2"
+        " OFFSET ((SELECT revenue_count FROM portfolio_summary WHERE id = 1) - 1) / 2)"
+        ") WHERE id = 1"
+    ))
+
+
+def rebuild():
+    """
+    Recompute every aggregate from the tender table, e.g. after an upgrade or a manual edit.
+    Must run inside an application context.
+    """
+    session = db.session
+    session.info[SKIP_KEY] = True
+    try:
+        deltas = _Deltas()
+        for tender in Tender.query.yield_per(500):
+            derive_fields(tender)
+            deltas.add(_contribution(tender), +1)
+        session.flush()
+
+        PortfolioRatingCount.query.delete()
+        PortfolioDeadlineCount.query.delete()
+        PortfolioSummary.query.delete()
+        for (factor, rating), count in deltas.ratings.items():
+            session.add(PortfolioRatingCount(factor=factor, rating=rating, count=count))
+        for day, count in deltas.deadlines.items():
+            session.add(PortfolioDeadlineCount(day=day, count=count))
+        session.add(PortfolioSummary(id=1, tender_count=deltas.tenders, revenue_count=deltas.revenue_count,
+                                     revenue_total=deltas.revenue_total))
+        session.flush()
+        _update_median(session.connection())
+        session.commit()
+    finally:
+        session.info.pop(SKIP_KEY, None)
+
+
+def ensure_aggregates():
+    """Build the aggregates once if they have never been built for this database."""
+    if db.session.get(PortfolioSummary, 1) is None:
+        rebuild()
+
+
+def snapshot(today=None):
+    """
+    Current portfolio KPIs. Reads one summary row, the rating counts (at most factors x
+    ratings rows) and the deadline counts of the seven days of the current week; the
+    revenue median is recomputed first if a write has cleared it.
+    """
+    today = today or datetime.date.today()
+    week_start = today - datetime.timedelta(days=today.weekday())
+    week_end = week_start + datetime.timedelta(days=6)
+
+    summary = db.session.get(PortfolioSummary, 1)
+    if summary is not None and summary.revenue_median is None and summary.revenue_count:
+        with db.engine.begin() as conn:
+            _update_median(conn)
+        db.session.refresh(summary)
+    ratings = {factor: {} for factor in FACTORS}
+    for row in PortfolioRatingCount.query.all():
+        if row.count:
+            ratings.setdefault(row.factor, {})[row.rating] = row.count
+    due = PortfolioDeadlineCount.query.filter(
+        PortfolioDeadlineCount.day >= week_start, PortfolioDeadlineCount.day <= week_end
+    ).all()
+
+    return {
+        "tender_count": summary.tender_count if summary else 0,
+        "ratings": ratings,
+        "revenue_potential": {
+            "total": summary.revenue_total if summary else 0.0,
+            "median": summary.revenue_median if summary else None,
+            "tenders_with_estimate": summary.revenue_count if summary else 0,
+        },
+        "deadlines_this_week": {
+            "week_start": week_start.isoformat(),
+            "week_end": week_end.isoformat(),
+            "count": sum(row.count for row in due),
+            "remaining": sum(row.count for row in due if row.day >= today),
+        },
+    }
@@ -0,0 +1,209 @@
+"""
+Field-driven retrieval planning for the structured extraction.
+
+Instead of one generic query, every schema section gets its own query. All section
+queries are embedded in a single batched call (and cached across tenders, since the
+queries never change), scored against the tender's whole chunk matrix in one matrix
+multiply, and the best chunks per section are assembled into a deduplicated context
+that stays under a token budget.
+
+Retrieved contexts can be stored next to the vector store (``save_context``), so a
+changed prompt can be re-run against a tender without loading its index again.
+"""
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from chunk_store import index_exists, index_mtime
+from tender_schema import SECTION_QUERIES
+
+QUERY_CACHE_PATH = "store/query_embeddings.json"
+
+# Rough size of the retrieved context handed to the extraction prompt
+CONTEXT_TOKEN_BUDGET = 3500
+MAX_CHUNKS_PER_SECTION = 3
+
+_query_cache = {}
+_query_cache_lock = threading.Lock()
+_query_cache_loaded = False
+
+
+def estimate_tokens(text):
+    # About four characters per token for German prose
+    return max(1, len(text) // 4)
+
+
+def _embedding_model_name(embedding):
+    return getattr(embedding, "model", None) or type(embedding).__name__
+
+
+def _load_query_cache():
+    global _query_cache_loaded
+    if _query_cache_loaded:
+        return
+    _query_cache_loaded = True
+    if os.path.exists(QUERY_CACHE_PATH):
+        try:
+            with open(QUERY_CACHE_PATH, "r", encoding="utf-8") as f:
+                _query_cache.update(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable query embedding cache: {e}")
+
+
+def load_query_cache():
+    """Read the cached query embeddings from disk now rather than on the first search."""
+    with _query_cache_lock:
+        _load_query_cache()
+
+
+def _save_query_cache():
+    os.makedirs(os.path.dirname(QUERY_CACHE_PATH), exist_ok=True)
+    tmp_path = QUERY_CACHE_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(_query_cache, f)
+    os.replace(tmp_path, QUERY_CACHE_PATH)
+
+
+def _embed_batch(embedding, texts):
+    # Cohere distinguishes query and document embeddings; other backends only have embed_documents
+    if hasattr(embedding, "embed"):
+        try:
+            return embedding.embed(texts, input_type="search_query")
+        except TypeError:
+            pass
+    return embedding.embed_documents(texts)
+
+
+def embed_queries(embedding, queries):
+    """
+    Return a (len(queries), dim) matrix of query embeddings.
+
+    Queries not yet in the cache are embedded together in one batched call.
+    """
+    model = _embedding_model_name(embedding)
+    with _query_cache_lock:
+        _load_query_cache()
+        cache = _query_cache.setdefault(model, {})
+        todo = [q for q in dict.fromkeys(queries) if q not in cache]
+        if todo:
+            for query, vector in zip(todo, _embed_batch(embedding, todo)):
+                cache[query] = [float(x) for x in vector]
+            _save_query_cache()
+        return np.asarray([cache[q] for q in queries], dtype=np.float32)
+
+
+def chunk_matrix(db):
+    """
+    Return (vectors, documents) for every chunk in a FAISS vector store.
+    """
+    index = db.index
+    vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else np.zeros((0, index.d), dtype=np.float32)
+    documents = [db.docstore.search(db.index_to_docstore_id[i]) for i in range(index.ntotal)]
+    return np.asarray(vectors, dtype=np.float32), documents
+
+
+def score_matrix(query_vectors, chunk_vectors):
+    """
+    Similarity of every query to every chunk, higher is better.
+
+    Uses the negated squared L2 distance so the ranking matches FAISS's default index;
+    the ||q||^2 term is constant per query and dropped.
+    """
+    chunk_norms = np.einsum("ij,ij->i", chunk_vectors, chunk_vectors)
+    return 2.0 * (query_vectors @ chunk_vectors.T) - chunk_norms[None, :]
+
+
+def plan_sections(db, embedding, sections=None, token_budget=CONTEXT_TOKEN_BUDGET,
+                  max_chunks_per_section=MAX_CHUNKS_PER_SECTION):
+    """
+    Pick the chunks to show the model for each section.
+
+    Sections take turns choosing their next best chunk that has not been used yet, so
+    every section gets evidence before any section gets a second chunk, and the total
+    stays under ``token_budget``. Returns {section: [document, ...]} in section order.
+    """
+    sections = list(sections or SECTION_QUERIES)
+    vectors, documents = chunk_matrix(db)
+    plan = {section: [] for section in sections}
+    if not documents:
+        return plan
+
+    queries = embed_queries(embedding, [SECTION_QUERIES[s] for s in sections])
+    scores = score_matrix(queries, vectors)
+    depth = min(max_chunks_per_section, len(documents))
+    ranked = np.argsort(-scores, axis=1)
+
+    used = set()
+    spent = 0
+    cursors = [0] * len(sections)
+    for _ in range(depth):
+        for row, section in enumerate(sections):
+            # Advance to this section's best unused chunk
+            while cursors[row] < len(documents) and int(ranked[row, cursors[row]]) in used:
+                cursors[row] += 1
+            if cursors[row] >= len(documents):
+                continue
+            chunk_id = int(ranked[row, cursors[row]])
+            cost = estimate_tokens(documents[chunk_id].page_content)
+            if spent + cost > token_budget:
+                continue
+            used.add(chunk_id)
+            spent += cost
+            plan[section].append(documents[chunk_id])
+    return plan
+
+
+def build_context(plan):
+    """
+    Format a section plan as the "retrieved text" block of the extraction prompt.
+    """
+    blocks = []
+    for section, docs in plan.items():
+        if docs:
+            blocks.append(f"## {section}\n" + "\n---\n".join(doc.page_content for doc in docs))
+    return "\n\n".join(blocks)
+
+
+# --- Retrieved context, stored next to the vector store ------------------------------
+
+def context_key(folder, embedding, *settings):
+    """
+    Identifies a retrieval result: the index it ran against (by mtime), the embedding
+    model and the retrieval settings. None while the folder has no index yet.
+    """
+    if not index_exists(folder):
+        return None
+    payload = json.dumps([index_mtime(folder), _embedding_model_name(embedding), settings],
+                         ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _context_path(folder, name):
+    return os.path.join(folder, f"context_{name}.json")
+
+
+def load_context(folder, name, key):
+    """The context stored under ``name`` if it was retrieved with the same ``key``, else None."""
+    path = _context_path(folder, name)
+    if key is None or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return stored["text"] if stored.get("key") == key else None
+
+
+def save_context(folder, name, key, text):
+    """Store a retrieved context so re-running a prompt does not repeat the retrieval."""
+    if key is None:
+        return
+    path = _context_path(folder, name)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"key": key, "text": text}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
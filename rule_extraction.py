@@ -0,0 +1,169 @@
+"""
+Rule-based extraction of the fields that can be read off the document text directly:
+submission deadline, reference number, contact e-mail and phone number.
+
+All chunks of a document are joined into one corpus and each pattern runs over it once;
+match offsets are mapped back to their chunk to record the pages a value was found on.
+When a field matches several times, the value mentioned most often wins (ties go to the
+earliest mention). The findings are stored next to the vector store at ingestion, so the
+model is only asked for the remaining fields.
+"""
+import json
+import os
+import re
+from bisect import bisect_right
+
+from tender_schema import set_field
+from value_parsing import find_dates
+
+RULE_FIELDS_FILE = "rule_fields.json"
+
+DEADLINE = ("Übersicht", "Abgabefrist")
+REFERENCE = ("Übersicht", "Referenznummer")
+EMAIL = ("Kontaktinformationen", "E-Mail")
+PHONE = ("Kontaktinformationen", "Telefon")
+
+# Separates chunks in the corpus so no match can span two of them
+SEPARATOR = "\n\x00\n"
+DEADLINE_WINDOW = 120
+
+DEADLINE_CUE = re.compile(
+    r'\b(?:Abgabefrist|Angebotsfrist|Einreichungsfrist|Teilnahmefrist|Schlusstermin|Abgabetermin'
+    r'|Ablauf der (?:Angebots|Abgabe)frist|Frist (?:zur|für die) (?:Angebotsabgabe|Abgabe|Einreichung)'
+    r'|Angebote? (?:sind|ist|muss|müssen) bis|(?:einzureichen|abzugeben|eingereicht werden) bis|Einreichung bis)',
+    re.IGNORECASE)
+TIME_OF_DAY = re.compile(r'^\s*(?:,|um)?\s*(\d{1,2})[:.](\d{2})\s*Uhr')
+REFERENCE_PATTERN = re.compile(
+    r'\b(?:Vergabenummer|Vergabe-?Nr\.?|Referenznummer|Referenz-?Nr\.?|Aktenzeichen|Az\.'
+    r'|Ausschreibungsnummer|Ausschreibungs-?Nr\.?|Verfahrensnummer|Kennziffer|Vorgangsnummer)'
+    r'\s*[:.]?\s*([A-Z0-9][A-Za-z0-9\-/_.]{2,40})')
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+\-]+@[A-Za-z0-9\-]+(?:\.[A-Za-z0-9\-]+)*\.[A-Za-z]{2,}\b')
+PHONE_PATTERN = re.compile(r'\b(?:Tel(?:efon)?\.?|Fon|Phone|Rufnummer)\s*[:.]?\s*(\+?\(?\d[\d\s()/\-–]{5,24}\d)')
+
+
+class _Corpus:
+    def __init__(self, documents):
+        texts, self.pages, self.starts = [], [], []
+        offset = 0
+        for doc in documents:
+            metadata = doc.metadata or {}
+            self.starts.append(offset)
+            self.pages.append((metadata.get("page_start"), metadata.get("page_end")))
+            texts.append(doc.page_content)
+            offset += len(doc.page_content) + len(SEPARATOR)
+        self.text = SEPARATOR.join(texts)
+
+    def pages_at(self, position):
+        start, end = self.pages[bisect_right(self.starts, position) - 1]
+        if start is None:
+            return []
+        return list(range(start, (end or start) + 1))
+
+    def snippet(self, start, end, margin=60):
+        # Context around a match, without crossing into the neighbouring chunks
+        left = self.text.rfind("\x00", max(0, start - margin), start) + 1 or max(0, start - margin)
+        right = self.text.find("\x00", end, end + margin)
+        text = self.text[left:right if right != -1 else end + margin]
+        return " ".join(text.split())
+
+
+def _pick(candidates):
+    """
+    Choose among (value, position, pages, snippet) candidates: most mentions, then earliest.
+    Returns a finding dict with the pages of every mention of the chosen value.
+    """
+    if not candidates:
+        return None
+    grouped = {}
+    for value, position, pages, snippet in candidates:
+        entry = grouped.setdefault(value, {"value": value, "position": position, "pages": set(),
+                                           "snippet": snippet, "mentions": 0})
+        entry["mentions"] += 1
+        entry["pages"].update(pages)
+    best = min(grouped.values(), key=lambda e: (-e["mentions"], e["position"]))
+    return {"value": best["value"], "pages": sorted(best["pages"]), "snippet": best["snippet"],
+            "mentions": best["mentions"]}
+
+
+def _deadlines(corpus):
+    candidates = []
+    for cue in DEADLINE_CUE.finditer(corpus.text):
+        window = corpus.text[cue.end():cue.end() + DEADLINE_WINDOW].split("\x00", 1)[0]
+        dates = sorted(find_dates(window), key=lambda item: item[1])
+        if not dates:
+            continue
+        date, _, date_end = dates[0]
+        value = date.strftime("%d.%m.%Y")
+        time_match = TIME_OF_DAY.match(window[date_end:])
+        if time_match:
+            value += f", {int(time_match.group(1)):02d}:{time_match.group(2)} Uhr"
+        end = cue.end() + date_end
+        candidates.append((value, cue.start(), corpus.pages_at(cue.start()), corpus.snippet(cue.start(), end)))
+    return candidates
+
+
+def _matches(corpus, pattern, group=0, clean=None, valid=None):
+    candidates = []
+    for match in pattern.finditer(corpus.text):
+        value = match.group(group)
+        if clean:
+            value = clean(value)
+        if not value or (valid and not valid(value)):
+            continue
+        candidates.append((value, match.start(), corpus.pages_at(match.start()),
+                           corpus.snippet(match.start(), match.end())))
+    return candidates
+
+
+def extract_fields(documents):
+    """
+    Extract the rule-based fields from a document's chunks (objects with ``page_content``
+    and ``metadata``). Returns {field path: {"value", "pages", "snippet", "mentions"}} for
+    the fields that were found.
+    """
+    corpus = _Corpus(documents)
+    candidates = {
+        DEADLINE: _deadlines(corpus),
+        REFERENCE: _matches(corpus, REFERENCE_PATTERN, 1, clean=lambda v: v.rstrip("./-"),
+                            valid=lambda v: any(c.isdigit() for c in v)),
+        EMAIL: _matches(corpus, EMAIL_PATTERN, clean=str.lower),
+        PHONE: _matches(corpus, PHONE_PATTERN, 1, clean=lambda v: " ".join(v.split()),
+                        valid=lambda v: sum(c.isdigit() for c in v) >= 6),
+    }
+    findings = {}
+    for path, found in candidates.items():
+        finding = _pick(found)
+        if finding:
+            findings[path] = finding
+    return findings
+
+
+def documents_of(db):
+    """The chunks of a FAISS vector store in index order."""
+    return [db.docstore.search(db.index_to_docstore_id[i]) for i in range(db.index.ntotal)]
+
+
+def apply_findings(data, findings):
+    """Write the found values into extracted tender ``data`` (in place) and return it."""
+    for path, finding in findings.items():
+        set_field(data, path, finding["value"])
+    return data
+
+
+def save_findings(folder, findings):
+    payload = [dict(finding, path=list(path)) for path, finding in findings.items()]
+    os.makedirs(folder, exist_ok=True)
+    tmp_path = os.path.join(folder, RULE_FIELDS_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(folder, RULE_FIELDS_FILE))
+
+
+def load_findings(folder):
+    """Findings stored for a vector store folder, or None if it has none yet."""
+    path = os.path.join(folder, RULE_FIELDS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        payload = json.load(f)
+    return {tuple(entry.pop("path")): entry for entry in payload}
@@ -0,0 +1,68 @@
+"""
+Content-addressed storage for uploaded tender documents and their vector stores.
+
+Uploads are hashed while they stream to disk and stored under their SHA-256 digest, so
+two different files with the same name can never overwrite each other and an identical
+document always maps to the same file and the same vector store.
+"""
+import hashlib
+import os
+import tempfile
+
+from werkzeug.utils import secure_filename
+
+STORE_FOLDER = "store"
+CHUNK_SIZE = 1024 * 1024
+
+
+def save_upload(file, upload_folder):
+    """
+    Stream an uploaded file to ``upload_folder`` while hashing it.
+
+    Returns (digest, path). The file ends up at ``<upload_folder>/<aa>/<digest><ext>``;
+    if that file already exists the new copy is discarded.
+    """
+    _, ext = os.path.splitext(secure_filename(file.filename or ""))
+    return _store_stream(file.stream, ext.lower(), upload_folder)
+
+
+def store_file(source_path, upload_folder):
+    """
+    Copy a local file into the content-addressed upload folder, like ``save_upload``.
+    """
+    _, ext = os.path.splitext(source_path)
+    with open(source_path, "rb") as stream:
+        return _store_stream(stream, ext.lower(), upload_folder)
+
+
+def _store_stream(stream, ext, upload_folder):
+    os.makedirs(upload_folder, exist_ok=True)
+    sha256 = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=upload_folder, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                sha256.update(chunk)
+                out.write(chunk)
+        digest = sha256.hexdigest()
+
+        target_dir = os.path.join(upload_folder, digest[:2])
+        os.makedirs(target_dir, exist_ok=True)
+        path = os.path.join(target_dir, digest + ext)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return digest, path
+
+
+def index_path_for(digest):
+    """Folder of the vector store built from the document with this digest."""
+    return os.path.join(STORE_FOLDER, digest)
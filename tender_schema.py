@@ -0,0 +1,183 @@
+"""
+The structure every extracted tender is expected to follow.
+
+Sections map to ``None`` for plain text fields or to a dict of sub-fields. The order is
+the order the dashboard shows the sections in (the first four become the overview cards).
+"""
+import copy
+import json
+
+NOT_PROVIDED = "Not Provided"
+
+# Values the model uses to say "the document does not contain this"; these count as
+# answered and are not re-requested.
+UNAVAILABLE_MARKERS = {"nicht angegeben", "not provided", "not available", "n/a"}
+
+# Bump when TENDER_SCHEMA changes, so stored extractions are re-run (see backfill.py)
+SCHEMA_VERSION = 1
+
+TENDER_SCHEMA = {
+    "Übersicht": {
+        "Ausschreibungstitel": None,
+        "Ausschreibende Firma": None,
+        "Abgabefrist": None,
+        "Referenznummer": None,
+    },
+    "Kosteninformationen": {
+        "Budgetinformationen": None,
+        "Zahlungsbedingungen": None,
+        "Kostenaufgliederung": None,
+    },
+    "Hauptziele": None,
+    "Allgemeine Anforderungen": None,
+    "Besondere Anforderungen": None,
+    "Phasen und Meilensteine": None,
+    "Einreichungsrichtlinien": None,
+    "Technische Spezifikationen": None,
+    "Rechtliche und Compliance-Anforderungen": None,
+    "Support und Wartung": None,
+    "Erfahrung und Qualifikationen": None,
+    "Kontaktinformationen": {
+        "Name": None,
+        "E-Mail": None,
+        "Telefon": None,
+        "Adresse": None,
+    },
+    "Revenue_Potential": None,
+}
+
+# Retrieval query used to find the evidence for each section
+SECTION_QUERIES = {
+    "Übersicht": "Titel der Ausschreibung, ausschreibende Firma oder Vergabestelle, Abgabefrist und Referenznummer",
+    "Kosteninformationen": "Budget, Kosten, Preise, Vergütung und Zahlungsbedingungen",
+    "Hauptziele": "Ziele und Zweck des Projekts, was soll erreicht werden",
+    "Allgemeine Anforderungen": "Allgemeine Anforderungen an den Auftragnehmer und die Lösung",
+    "Besondere Anforderungen": "Besondere oder spezielle Anforderungen, Muss-Kriterien",
+    "Phasen und Meilensteine": "Projektphasen, Zeitplan, Meilensteine und Termine",
+    "Einreichungsrichtlinien": "Form und Inhalt des Angebots, Einreichung, Fristen und Zuschlagskriterien",
+    "Technische Spezifikationen": "Technische Spezifikationen, Systeme, Schnittstellen und Architektur",
+    "Rechtliche und Compliance-Anforderungen": "Rechtliche Bedingungen, Vertragsbedingungen, Datenschutz und Compliance",
+    "Support und Wartung": "Support, Wartung, Service-Level und Betrieb",
+    "Erfahrung und Qualifikationen": "Erfahrung, Referenzen und Qualifikationen des Bieters",
+    "Kontaktinformationen": "Ansprechpartner, E-Mail, Telefon und Adresse",
+    "Revenue_Potential": "Auftragswert, Umfang, Laufzeit und Budget des Projekts",
+}
+
+# Words that identify a section heading belonging to a schema section; used to restrict a
+# topic chat to the relevant parts of the document
+SECTION_KEYWORDS = {
+    "Übersicht": ["übersicht", "allgemein", "einleitung", "ausgangslage", "gegenstand", "vergabe"],
+    "Kosteninformationen": ["kosten", "preis", "budget", "vergütung", "zahlung", "honorar"],
+    "Hauptziele": ["ziel", "zweck", "ausgangslage", "gegenstand"],
+    "Allgemeine Anforderungen": ["anforderung", "leistung"],
+    "Besondere Anforderungen": ["anforderung", "besondere", "muss", "kriterien"],
+    "Phasen und Meilensteine": ["phase", "meilenstein", "zeitplan", "termin", "projektplan", "laufzeit"],
+    "Einreichungsrichtlinien": ["angebot", "einreichung", "abgabe", "frist", "zuschlag", "eignung", "formalien"],
+    "Technische Spezifikationen": ["technisch", "spezifikation", "schnittstelle", "architektur", "system", "funktional"],
+    "Rechtliche und Compliance-Anforderungen": ["recht", "vertrag", "compliance", "datenschutz", "haftung", "§", "geschäftsbedingungen"],
+    "Support und Wartung": ["support", "wartung", "pflege", "betrieb", "service"],
+    "Erfahrung und Qualifikationen": ["erfahrung", "referenz", "qualifikation", "eignung"],
+    "Kontaktinformationen": ["kontakt", "ansprechpartner", "vergabestelle", "adresse"],
+    "Revenue_Potential": ["kosten", "preis", "budget", "auftragswert", "umfang"],
+}
+
+
+def iter_field_paths(schema=TENDER_SCHEMA):
+    """
+    Yield every leaf field as a tuple path, e.g. ("Übersicht", "Abgabefrist").
+    """
+    for section, fields in schema.items():
+        if isinstance(fields, dict):
+            for field in fields:
+                yield (section, field)
+        else:
+            yield (section,)
+
+
+def schema_template(paths=None):
+    """
+    Build the JSON skeleton shown to the model, optionally restricted to some field paths.
+    """
+    wanted = set(paths) if paths is not None else None
+    template = {}
+    for path in iter_field_paths():
+        if wanted is not None and path not in wanted:
+            continue
+        if len(path) == 1:
+            template[path[0]] = "string"
+        else:
+            template.setdefault(path[0], {})[path[1]] = "string"
+    return json.dumps(template, ensure_ascii=False, indent=2)
+
+
+def get_field(data, path):
+    value = data
+    for key in path:
+        if is_unavailable(value):
+            # A whole section marked unavailable covers all of its fields
+            return value
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def set_field(data, path, value):
+    target = data
+    for key in path[:-1]:
+        if not isinstance(target.get(key), dict):
+            target[key] = {}
+        target = target[key]
+    target[path[-1]] = value
+
+
+def _is_missing(value):
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return not value.strip()
+    if isinstance(value, (list, dict)):
+        return len(value) == 0
+    return False
+
+
+def missing_fields(data):
+    """
+    Return the field paths that are absent or empty in ``data``.
+
+    Fields the model explicitly marked as unavailable are not listed.
+    """
+    return [path for path in iter_field_paths() if _is_missing(get_field(data, path))]
+
+
+def is_unavailable(value):
+    return isinstance(value, str) and value.strip().lower() in UNAVAILABLE_MARKERS
+
+
+def conform(data):
+    """
+    Return a copy of ``data`` laid out exactly like the schema: known sections in schema
+    order, missing fields set to ``NOT_PROVIDED``, unknown keys appended at the end.
+    """
+    data = data if isinstance(data, dict) else {}
+    result = {}
+    for path in iter_field_paths():
+        value = get_field(data, path)
+        set_field(result, path, NOT_PROVIDED if _is_missing(value) else copy.deepcopy(value))
+    for key, value in data.items():
+        if key not in result:
+            result[key] = NOT_PROVIDED if value is None else copy.deepcopy(value)
+    return result
+
+
+def fill_nulls(value):
+    """
+    Recursively replace ``None`` with ``NOT_PROVIDED`` in parsed model output.
+    """
+    if value is None:
+        return NOT_PROVIDED
+    if isinstance(value, dict):
+        return {key: fill_nulls(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill_nulls(item) for item in value]
+    return value
@@ -0,0 +1,99 @@
+"""
+Reference counting, tombstones and compaction of the shared chunk store: these decide
+which chunks are deleted from disk.
+
+    python -m pytest tests
+"""
+import numpy as np
+import pytest
+
+from chunk_store import ChunkStore, chunk_id, read_manifest
+
+
+def _chunks(*texts):
+    ids = [chunk_id("test-model", text) for text in texts]
+    vectors = [np.full(4, i, dtype=np.float32) for i in range(len(texts))]
+    return list(texts), vectors, ids, [{"page": i + 1} for i in range(len(texts))]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ChunkStore(str(tmp_path / "chunks.db"))
+
+
+def _refcounts(store):
+    return dict(store._conn().execute("SELECT id, refcount FROM chunk"))
+
+
+def test_shared_chunk_survives_releasing_one_folder(store, tmp_path):
+    texts, vectors, ids, metadatas = _chunks("Allgemeine Geschäftsbedingungen", "Leistungsbeschreibung A")
+    store.put(str(tmp_path / "a"), texts, vectors, ids, metadatas)
+    texts_b, vectors_b, ids_b, metadatas_b = _chunks("Allgemeine Geschäftsbedingungen", "Leistungsbeschreibung B")
+    store.put(str(tmp_path / "b"), texts_b, vectors_b, ids_b, metadatas_b)
+    shared = ids[0]
+    assert _refcounts(store)[shared] == 2
+
+    assert store.release(str(tmp_path / "a")) == 1  # only A's own chunk is left unreferenced
+    assert read_manifest(str(tmp_path / "a")) is None
+    counts = _refcounts(store)
+    assert counts[shared] == 1
+    assert counts[ids[1]] == 0
+    assert set(store.vectors([shared])) == {shared}
+
+
+def test_releasing_every_folder_tombstones_the_chunk(store, tmp_path):
+    texts, vectors, ids, metadatas = _chunks("Allgemeine Geschäftsbedingungen")
+    store.put(str(tmp_path / "a"), texts, vectors, ids, metadatas)
+    store.put(str(tmp_path / "b"), texts, vectors, ids, metadatas)
+
+    assert store.release(str(tmp_path / "a")) == 0
+    assert store.release(str(tmp_path / "b")) == 1
+    assert _refcounts(store) == {ids[0]: 0}
+    tombstones, tombstone_bytes, total_bytes = store.tombstones()
+    assert tombstones == 1
+    assert tombstone_bytes == total_bytes > 0
+    # A tombstone is kept (and reusable) until the store is compacted
+    assert set(store.vectors(ids)) == set(ids)
+
+
+def test_release_of_an_unknown_folder_does_nothing(store, tmp_path):
+    assert store.release(str(tmp_path / "missing")) == 0
+
+
+def test_compact_deletes_only_tombstones(store, tmp_path):
+    texts, vectors, ids, metadatas = _chunks("kept", "dropped")
+    store.put(str(tmp_path / "a"), texts[:1], vectors[:1], ids[:1], metadatas[:1])
+    store.put(str(tmp_path / "b"), texts[1:], vectors[1:], ids[1:], metadatas[1:])
+    store.release(str(tmp_path / "b"))
+
+    deleted, _ = store.compact()
+    assert deleted == 1
+    assert _refcounts(store) == {ids[0]: 1}
+    assert store.tombstones()[0] == 0
+
+    # Nothing left to delete: a second compaction keeps the referenced chunk
+    assert store.compact()[0] == 0
+    assert set(store.vectors(ids)) == {ids[0]}
+
+
+def test_put_replaces_the_folder_references(store, tmp_path):
+    texts, vectors, ids, metadatas = _chunks("old", "new")
+    folder = str(tmp_path / "a")
+    store.put(folder, texts[:1], vectors[:1], ids[:1], metadatas[:1])
+    store.put(folder, texts[1:], vectors[1:], ids[1:], metadatas[1:])
+    assert _refcounts(store) == {ids[0]: 0, ids[1]: 1}
+
+
+def test_recount_repairs_drifted_refcounts(store, tmp_path):
+    texts, vectors, ids, metadatas = _chunks("shared", "only a", "orphan")
+    store.put(str(tmp_path / "a"), texts[:2], vectors[:2], ids[:2], metadatas[:2])
+    store.put(str(tmp_path / "b"), texts[:1], vectors[:1], ids[:1], metadatas[:1])
+    store.put(str(tmp_path / "c"), texts[2:], vectors[2:], ids[2:], metadatas[2:])
+    # Drift, e.g. from a crash between a folder's removal and its release
+    conn = store._conn()
+    conn.execute("UPDATE chunk SET refcount = 7 WHERE id = ?", (ids[0],))
+    conn.execute("UPDATE chunk SET refcount = 0 WHERE id = ?", (ids[1],))
+
+    manifests = [read_manifest(str(tmp_path / name)) for name in ("a", "b")]  # folder c is gone
+    assert store.recount(manifests) == 1
+    assert _refcounts(store) == {ids[0]: 2, ids[1]: 1}
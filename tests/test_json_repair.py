@@ -0,0 +1,85 @@
+"""
+Repairs ``parse_json_lenient`` makes to model output, and ``conform`` on the result.
+
+    python -m pytest tests
+"""
+from json_repair import parse_json_lenient
+from tender_schema import NOT_PROVIDED, TENDER_SCHEMA, conform, missing_fields
+
+
+def test_valid_json_is_not_marked_repaired():
+    result = parse_json_lenient('{"a": 1, "b": [true, null, "x"]}')
+    assert result.value == {"a": 1, "b": [True, None, "x"]}
+    assert not result.repaired
+
+
+def test_truncated_string_and_containers_are_closed():
+    result = parse_json_lenient('{"a": {"b": [1, 2, "thr')
+    assert result.value == {"a": {"b": [1, 2, "thr"]}}
+    assert result.repaired
+
+
+def test_truncated_key_without_value_is_dropped():
+    result = parse_json_lenient('{"a": 1, "b":')
+    assert result.value == {"a": 1}
+    assert result.repaired
+
+    assert parse_json_lenient('{"a": 1, "b"').value == {"a": 1}
+
+
+def test_code_fence_is_stripped():
+    result = parse_json_lenient('```json\n{"a": [1, 2]}\n```')
+    assert result.value == {"a": [1, 2]}
+
+
+def test_prose_around_the_value_is_ignored():
+    result = parse_json_lenient('Here is the result:\n{"a": 1}\nLet me know if you need more.')
+    assert result.value == {"a": 1}
+    assert result.repaired
+
+
+def test_single_quotes_and_python_literals():
+    result = parse_json_lenient("{'a': 'x', 'b': True, 'c': None}")
+    assert result.value == {"a": "x", "b": True, "c": None}
+    assert result.repaired
+
+
+def test_missing_colon():
+    result = parse_json_lenient('{"a" 1, "b": 2}')
+    assert result.value == {"a": 1, "b": 2}
+    assert result.repaired
+
+
+def test_trailing_comma_and_unquoted_key():
+    assert parse_json_lenient('{"a": [1, 2,], "b": 3,}').value == {"a": [1, 2], "b": 3}
+    assert parse_json_lenient('{a: 1}').value == {"a": 1}
+
+
+def test_no_json_value():
+    assert parse_json_lenient("").value is None
+    assert parse_json_lenient("Sorry, I cannot help with that.").value is None
+
+
+def test_conform_fills_a_truncated_extraction():
+    parsed = parse_json_lenient('{"Übersicht": {"Ausschreibungstitel": "Portal", "Abgabefrist": null}, '
+                                '"Extra": "kept", "Hauptziele": "Migr').value
+    data = conform(parsed)
+
+    assert list(data)[:len(TENDER_SCHEMA)] == list(TENDER_SCHEMA)
+    assert list(data)[-1] == "Extra"
+    assert data["Übersicht"]["Ausschreibungstitel"] == "Portal"
+    assert data["Übersicht"]["Abgabefrist"] == NOT_PROVIDED
+    assert data["Hauptziele"] == "Migr"
+    assert data["Kontaktinformationen"] == {field: NOT_PROVIDED for field in TENDER_SCHEMA["Kontaktinformationen"]}
+    assert ("Übersicht", "Abgabefrist") in missing_fields(parsed)
+
+
+def test_conform_does_not_modify_its_input():
+    parsed = {"Übersicht": {"Ausschreibungstitel": "Portal"}}
+    conform(parsed)
+    assert parsed == {"Übersicht": {"Ausschreibungstitel": "Portal"}}
+
+
+def test_conform_of_a_non_object():
+    assert conform(None)["Hauptziele"] == NOT_PROVIDED
+    assert conform(["not", "an", "object"])["Übersicht"]["Referenznummer"] == NOT_PROVIDED
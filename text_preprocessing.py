@@ -0,0 +1,37 @@
+"""
+Cleanup of page text extracted from tender PDFs.
+
+``preprocess_text`` gives the same result as the per-module versions it replaces, but
+compiles its patterns once and skips passes that cannot match: after whitespace is
+collapsed there are no line breaks left, so the old line-break passes were no-ops, and
+the header, footer and hyphenation passes only run when their literal prefix occurs.
+"""
+import re
+
+WHITESPACE = re.compile(r'\s+')
+PAGE_HEADER = re.compile(r'Page \d+')
+FOOTER_MARKER = "Ausschreibungsdokument"
+HYPHEN_BREAK = re.compile(r'([a-z])-\s+([a-z])')
+HYPHEN_SPACE = re.compile(r'(\S)- (\S)')
+
+
+def preprocess_text(text):
+    """
+    Preprocess text to remove unnecessary line breaks and improve context understanding.
+    """
+    # Collapse line breaks and runs of whitespace into single spaces
+    text = WHITESPACE.sub(' ', text).strip()
+
+    # Remove common headers or footers (e.g., "Page 1", "Ausschreibungsdokument ...")
+    if 'Page ' in text:
+        text = PAGE_HEADER.sub('', text)
+    footer = text.find(FOOTER_MARKER)
+    if footer != -1:
+        text = text[:footer]
+
+    # Join words hyphenated across a line break ("Anfor- derung")
+    if '- ' in text:
+        text = HYPHEN_BREAK.sub(r'\1\2', text)
+        text = HYPHEN_SPACE.sub(r'\1\2', text)
+
+    return text
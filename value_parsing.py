@@ -0,0 +1,115 @@
+"""
+Parsing of dates and amounts as they appear in German tender documents and model output.
+"""
+import datetime
+import re
+
+GERMAN_MONTHS = {
+    "januar": 1, "jan": 1, "jänner": 1, "februar": 2, "feb": 2, "märz": 3, "maerz": 3, "mär": 3,
+    "april": 4, "apr": 4, "mai": 5, "juni": 6, "jun": 6, "juli": 7, "jul": 7, "august": 8,
+    "aug": 8, "september": 9, "sep": 9, "sept": 9, "oktober": 10, "okt": 10, "november": 11,
+    "nov": 11, "dezember": 12, "dez": 12,
+    # English month names show up in model output
+    "january": 1, "february": 2, "march": 3, "may": 5, "june": 6, "july": 7, "october": 10,
+    "december": 12,
+}
+
+NUMERIC_DATE = re.compile(r'\b(\d{1,2})\.\s?(\d{1,2})\.\s?(\d{4}|\d{2})\b')
+ISO_DATE = re.compile(r'\b(\d{4})-(\d{2})-(\d{2})\b')
+WORD_DATE = re.compile(r'\b(\d{1,2})\.?\s+([A-Za-zÄÖÜäöü]{3,9})\.?\s+(\d{4})\b')
+
+AMOUNT = re.compile(r'(\d{1,3}(?:[.,\u00a0\u202f]\d{3})+(?:[.,]\d+)?|\d+(?:[.,]\d+)?)\s*'
+                    r'(mrd\.?|milliarden?|billion|mio\.?|millionen?|million|tsd\.?|tausend|k\b|m\b)?',
+                    re.IGNORECASE)
+MULTIPLIERS = {
+    "mrd": 1e9, "milliarde": 1e9, "milliarden": 1e9, "billion": 1e9,
+    "mio": 1e6, "million": 1e6, "millionen": 1e6, "m": 1e6,
+    "tsd": 1e3, "tausend": 1e3, "k": 1e3,
+}
+
+
+def _make_date(year, month, day):
+    year = int(year)
+    if year < 100:
+        year += 2000
+    try:
+        return datetime.date(year, int(month), int(day))
+    except ValueError:
+        return None
+
+
+def find_dates(text):
+    """
+    Yield (date, start, end) for every date in ``text``: 31.03.2025, 31.3.25, 2025-03-31
+    and 31. März 2025.
+    """
+    if not text:
+        return
+    for match in NUMERIC_DATE.finditer(text):
+        date = _make_date(match.group(3), match.group(2), match.group(1))
+        if date:
+            yield date, match.start(), match.end()
+    for match in ISO_DATE.finditer(text):
+        date = _make_date(match.group(1), match.group(2), match.group(3))
+        if date:
+            yield date, match.start(), match.end()
+    for match in WORD_DATE.finditer(text):
+        month = GERMAN_MONTHS.get(match.group(2).lower())
+        if month:
+            date = _make_date(match.group(3), month, match.group(1))
+            if date:
+                yield date, match.start(), match.end()
+
+
+def parse_date(text):
+    """
+    Return the first date mentioned in ``text`` (by position), or None.
+    """
+    if isinstance(text, datetime.date):
+        return text
+    if not isinstance(text, str):
+        return None
+    found = sorted(find_dates(text), key=lambda item: item[1])
+    return found[0][0] if found else None
+
+
+def _to_number(digits):
+    digits = digits.replace("\u00a0", "").replace("\u202f", "")
+    if "," in digits and "." in digits:
+        # Whichever separator comes last is the decimal separator
+        if digits.rfind(",") > digits.rfind("."):
+            digits = digits.replace(".", "").replace(",", ".")
+        else:
+            digits = digits.replace(",", "")
+    elif "," in digits or "." in digits:
+        sep = "," if "," in digits else "."
+        groups = digits.split(sep)
+        if len(groups) > 2 or all(len(g) == 3 for g in groups[1:]):
+            digits = digits.replace(sep, "")  # thousands separators
+        else:
+            digits = digits.replace(sep, ".")
+    try:
+        return float(digits)
+    except ValueError:
+        return None
+
+
+def parse_amount(text):
+    """
+    Parse a money amount like "USD 1,2 Mio.", "$500,000" or "250.000 EUR" into a float.
+
+    Returns the largest amount mentioned (ranges report their upper bound), or None.
+    """
+    if isinstance(text, (int, float)):
+        return float(text)
+    if not isinstance(text, str):
+        return None
+    amounts = []
+    for match in AMOUNT.finditer(text):
+        value = _to_number(match.group(1))
+        if value is None:
+            continue
+        unit = (match.group(2) or "").lower().rstrip(".")
+        value *= MULTIPLIERS.get(unit, 1)
+        amounts.append(value)
+    return max(amounts) if amounts else None
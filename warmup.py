@@ -0,0 +1,160 @@
+"""
+Background warm-up of a tender's chat state.
+
+Opening a tender card on the dashboard is usually followed by a chat about it. The
+dashboard therefore asks for a warm-up (on hover and when the card data is loaded), and
+a small worker pool loads the tender's vector store, builds its ``ChatManager`` with the
+stored extraction as topic data, and reads the chunk matrix and cached query
+embeddings. ``/start_conversation`` then picks the ready manager from an LRU cache.
+
+Concurrency is bounded by the pool size. Requests for a tender that is already queued,
+running or cached are ignored, and when too many are queued the oldest queued ones are
+cancelled, since the user has moved on to other cards.
+"""
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = 2
+MAX_QUEUED = 4
+CACHE_SIZE = 8
+
+
+def chat_key(tender_id, index_path, json_data):
+    # A new extraction or index for the tender gives a new key, so stale managers are never used
+    return tender_id, index_path, hash(json_data)
+
+
+class WarmupScheduler:
+    def __init__(self, max_workers=MAX_WORKERS, max_queued=MAX_QUEUED, cache_size=CACHE_SIZE):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="warmup")
+        self.max_queued = max_queued
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._futures = OrderedDict()  # key -> Future, oldest first
+        self._ready = OrderedDict()    # key -> result, least recently used first
+        self.counts = {"scheduled": 0, "deduplicated": 0, "cancelled": 0, "completed": 0, "failed": 0,
+                       "hits": 0, "waits": 0, "misses": 0}
+
+    def schedule(self, key, fn):
+        """Run ``fn()`` in the background and cache its result under ``key``."""
+        with self._lock:
+            if key in self._ready or key in self._futures:
+                self.counts["deduplicated"] += 1
+                return False
+            future = self._pool.submit(self._run, key, fn)
+            self._futures[key] = future
+            self.counts["scheduled"] += 1
+            self._cancel_overflow()
+            return True
+
+    def _cancel_overflow(self):
+        queued = [k for k, f in self._futures.items() if not f.running() and not f.done()]
+        for key in queued[:max(0, len(queued) - self.max_queued)]:
+            if self._futures[key].cancel():
+                del self._futures[key]
+                self.counts["cancelled"] += 1
+
+    def cancel(self, key):
+        """Cancel a warm-up that has not started yet."""
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None and future.cancel():
+                del self._futures[key]
+                self.counts["cancelled"] += 1
+                return True
+        return False
+
+    def _run(self, key, fn):
+        try:
+            result = fn()
+        except Exception as e:
+            with self._lock:
+                self._futures.pop(key, None)
+                self.counts["failed"] += 1
+            print(f"Warm-up of {key[:2]} failed: {e}")
+            raise
+        self.put(key, result, completed=True)
+        return result
+
+    def put(self, key, result, completed=False):
+        with self._lock:
+            self._futures.pop(key, None)
+            self._ready[key] = result
+            self._ready.move_to_end(key)
+            while len(self._ready) > self.cache_size:
+                self._ready.popitem(last=False)
+            if completed:
+                self.counts["completed"] += 1
+
+    def get(self, key, timeout=None):
+        """
+        The cached result for ``key``. A warm-up that is already running is waited for; one
+        that is still queued is cancelled. Returns None when the caller should build it.
+        """
+        with self._lock:
+            if key in self._ready:
+                self._ready.move_to_end(key)
+                self.counts["hits"] += 1
+                return self._ready[key]
+            future = self._futures.get(key)
+            if future is not None and future.cancel():
+                del self._futures[key]
+                future = None
+            if future is None:
+                self.counts["misses"] += 1
+                return None
+            self.counts["waits"] += 1
+        try:
+            return future.result(timeout)
+        except Exception:  # failed or cancelled meanwhile: the caller builds it instead
+            return None
+
+    def evict(self, tender_id):
+        """
+        Forget the cached and queued warm-ups of a tender (e.g. it was deleted). Returns
+        the number of cached results dropped.
+        """
+        with self._lock:
+            for key in [k for k in self._futures if k[0] == tender_id]:
+                if self._futures[key].cancel():
+                    del self._futures[key]
+                    self.counts["cancelled"] += 1
+            cached = [k for k in self._ready if k[0] == tender_id]
+            for key in cached:
+                del self._ready[key]
+            return len(cached)
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for f in self._futures.values() if f.running())
+            return dict(self.counts, running=running, queued=len(self._futures) - running,
+                        cached=len(self._ready))
+
+
+scheduler = WarmupScheduler()
+
+
+def _build_chat_manager(index_path, embedding_model, yaml_data):
+    from Conv_RAG import ChatManager
+
+    return ChatManager(index_path, embedding_model, yaml_data=yaml_data).prepare()
+
+
+def warm_chat(tender_id, index_path, json_data, embedding_model):
+    """Schedule building the chat manager of a tender (no-op if it is cached or queued)."""
+    if not index_path:
+        return False
+    return scheduler.schedule(chat_key(tender_id, index_path, json_data),
+                              lambda: _build_chat_manager(index_path, embedding_model, json.loads(json_data)))
+
+
+def chat_manager(tender_id, index_path, json_data, embedding_model):
+    """The tender's chat manager: warmed if possible, otherwise built now and cached."""
+    key = chat_key(tender_id, index_path, json_data)
+    manager = scheduler.get(key)
+    if manager is None:
+        manager = _build_chat_manager(index_path, embedding_model, json.loads(json_data))
+        scheduler.put(key, manager)
+    return manager